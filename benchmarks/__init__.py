@@ -0,0 +1,5 @@
+"""
+Offline benchmarks for the Telegram Summary Bot.
+
+Run with `python -m benchmarks.run_benchmarks`; see that module for options.
+"""
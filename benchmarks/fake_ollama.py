@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+"""
+Stand-in for Ollama's /api/generate for load and latency testing.
+
+Answers streaming and non-streaming generate requests with text derived
+from the prompt, after a latency drawn from a configurable distribution
+and at a configurable token rate. A share of requests can be made to fail
+with HTTP 500, hang past the client's timeout, or return malformed JSON,
+which exercises the client's retries and its raw-text fallback parser.
+With a fixed seed the sequence of injected faults is reproducible.
+
+Usage:
+    python -m benchmarks.fake_ollama --port 11434 --latency lognormal:0,0.5 --tokens-per-second 15
+    python -m benchmarks.fake_ollama --error-rate 0.1 --timeout-rate 0.05 --malformed-rate 0.05
+
+Then point the bot at it with OLLAMA_HOST/OLLAMA_PORT. GET /_fake/stats
+returns request and fault counters.
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_distribution(spec):
+    """
+    Parse a latency distribution.
+
+    Args:
+        spec (str): "fixed:S", "uniform:LOW,HIGH", "normal:MEAN,SD",
+            "lognormal:MU,SIGMA" or "exponential:MEAN", in seconds
+
+    Returns:
+        Callable taking a random.Random and returning a non-negative delay in seconds
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+    samplers = {
+        "fixed": (1, lambda rng: values[0]),
+        "uniform": (2, lambda rng: rng.uniform(values[0], values[1])),
+        "normal": (2, lambda rng: rng.gauss(values[0], values[1])),
+        "lognormal": (2, lambda rng: rng.lognormvariate(values[0], values[1])),
+        "exponential": (1, lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0),
+    }
+    if kind not in samplers or len(values) != samplers[kind][0]:
+        raise ValueError(f"Invalid latency distribution: {spec}")
+    sampler = samplers[kind][1]
+    return lambda rng: max(0.0, sampler(rng))
+
+
+class FakeOllamaBehavior:
+    """How the fake server answers; shared by all request threads."""
+
+    def __init__(self, latency="fixed:0", tokens_per_second=0, response_tokens=40, error_rate=0.0,
+                 timeout_rate=0.0, malformed_rate=0.0, hang_seconds=600, seed=None):
+        """
+        Args:
+            latency (str): Distribution of the delay before the first token, see parse_distribution
+            tokens_per_second (float): Generation speed; 0 answers without pacing
+            response_tokens (int): Words in each response
+            error_rate (float): Share of requests answered with HTTP 500
+            timeout_rate (float): Share of requests that hang for hang_seconds
+            malformed_rate (float): Share of requests answered with malformed JSON
+            hang_seconds (float): How long a timed-out request hangs
+            seed (int): Random seed; None is not reproducible
+        """
+        self.latency = parse_distribution(latency)
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.malformed_rate = malformed_rate
+        self.hang_seconds = hang_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "streamed": 0, "errors": 0, "timeouts": 0, "malformed": 0}
+
+    def plan(self, stream):
+        """
+        Decide how to answer the next request.
+
+        Returns:
+            tuple: (fault or None, delay before the first token in seconds)
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+            if stream:
+                self.stats["streamed"] += 1
+            roll = self._rng.random()
+            delay = self.latency(self._rng)
+
+            fault = None
+            for name, rate in (("errors", self.error_rate), ("timeouts", self.timeout_rate),
+                               ("malformed", self.malformed_rate)):
+                if roll < rate:
+                    fault = name
+                    self.stats[name] += 1
+                    break
+                roll -= rate
+            return fault, delay
+
+    def response_words(self, prompt):
+        """Build a deterministic response from the words of the prompt."""
+        # Quotes and backslashes would need escaping in the hand-built malformed bodies
+        words = [word.replace('"', "").replace("\\", "") for word in prompt.split()]
+        words = [word for word in words if word] or ["summary"]
+        return [words[index % len(words)] for index in range(self.response_tokens)]
+
+    def token_delay(self):
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Serves /api/generate and /_fake/stats."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, keep-alive requests stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path != "/_fake/stats":
+            self.send_error(404)
+            return
+        self._send(200, json.dumps(self.server.behavior.stats).encode("utf-8"))
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        behavior = self.server.behavior
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        stream = body.get("stream", True)
+        model = body.get("model", "fake")
+
+        fault, delay = behavior.plan(stream)
+        if fault == "timeouts":
+            time.sleep(behavior.hang_seconds)
+            self.close_connection = True
+            return
+        time.sleep(delay)
+        if fault == "errors":
+            self._send(500, json.dumps({"error": "injected failure"}).encode("utf-8"))
+            return
+
+        words = behavior.response_words(body.get("prompt", ""))
+        if stream:
+            self._stream(model, words, malformed=fault == "malformed")
+            return
+
+        time.sleep(behavior.token_delay() * len(words))
+        text = " ".join(words)
+        if fault == "malformed":
+            # Cut off before the closing brace, as a proxy dropping the end of the body would
+            payload = f'{{"model": "{model}", "response": "{text}", "done": true'
+        else:
+            payload = json.dumps({"model": model, "response": text, "done": True})
+        self._send(200, payload.encode("utf-8"))
+
+    def _stream(self, model, words, malformed=False):
+        """Send the response as NDJSON chunks, one word each, at the configured token rate."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for index, word in enumerate(words):
+                line = json.dumps({"model": model, "response": word + " ", "done": False}) + "\n"
+                if malformed and index == len(words) // 2:
+                    line = '{"model": "' + model + '", "response": ' + "\n"
+                self._write_chunk(line.encode("utf-8"))
+                time.sleep(self.server.behavior.token_delay())
+            self._write_chunk((json.dumps({"model": model, "response": "", "done": True}) + "\n").encode("utf-8"))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. on its own timeout
+            pass
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send(self, status, data):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(behavior=None, host="127.0.0.1", port=0):
+    """
+    Create the fake server without starting it.
+
+    Args:
+        behavior (FakeOllamaBehavior): How to answer; the default answers at once
+        host (str): Address to listen on
+        port (int): Port to listen on; 0 picks a free one
+
+    Returns:
+        ThreadingHTTPServer: The server; its server_address holds the port
+            and its behavior attribute the counters
+    """
+    server = ThreadingHTTPServer((host, port), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.behavior = behavior or FakeOllamaBehavior()
+    return server
+
+
+def start_fake_ollama(behavior=None, host="127.0.0.1", port=0):
+    """Start the fake server in a background thread; arguments as for create_server."""
+    server = create_server(behavior, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", default="fixed:0",
+                        help="delay before the first token: fixed:S, uniform:LOW,HIGH, normal:MEAN,SD, "
+                             "lognormal:MU,SIGMA or exponential:MEAN")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="generation speed; 0 for no pacing")
+    parser.add_argument("--response-tokens", type=int, default=40, help="words in each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of requests that hang")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of responses with malformed JSON")
+    parser.add_argument("--hang-seconds", type=float, default=600, help="how long a hanging request hangs")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible faults and latencies")
+    args = parser.parse_args()
+
+    behavior = FakeOllamaBehavior(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        malformed_rate=args.malformed_rate,
+        hang_seconds=args.hang_seconds,
+        seed=args.seed
+    )
+    server = create_server(behavior, args.host, args.port)
+    print(f"Fake Ollama listening on http://{args.host}:{args.port}/api/generate")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(behavior.stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+"""
+Offline benchmark harness.
+
+Generates a synthetic group (N users, M topics, K messages a day) in a
+throwaway SQLite database and measures:
+
+- add_message throughput, including writing the queue out to the database
+- get_messages_in_range latency and peak memory for several window sizes
+- build_summary_prompt time for the last 24 hours
+- end-to-end /summary latency against the fake Ollama server: cold (no
+  chunk summaries stored yet, so the raw messages are summarized),
+  incremental (one new message after the background tick has stored the
+  chunk summaries) and warm (cached)
+
+Results are compared with the stored baseline. Timings depend on the
+machine, so compare runs made on the same one.
+
+Usage:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --check            # exit 1 on regressions
+    python -m benchmarks.run_benchmarks --update-baseline  # store these results
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+
+from benchmarks.fake_ollama import start_fake_ollama
+from benchmarks.synthetic import generate_messages
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+CHAT_ID = -1009000000001
+WINDOW_HOURS = (1, 6, 24, 168)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks.")
+    parser.add_argument("--users", type=int, default=20, help="group members")
+    parser.add_argument("--topics", type=int, default=5, help="forum topics, including the main chat")
+    parser.add_argument("--messages-per-day", type=int, default=2000, help="messages a day across all topics")
+    parser.add_argument("--days", type=int, default=7, help="days of history")
+    parser.add_argument("--seed", type=int, default=42, help="random seed of the synthetic messages")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions of each latency measurement")
+    parser.add_argument("--baseline", default=BASELINE_FILE, type=os.path.abspath, help="baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative change from the baseline reported as a regression")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results to the baseline file")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if any metric regressed")
+    parser.add_argument("--output", type=os.path.abspath, help="also write the results to this JSON file")
+    return parser.parse_args()
+
+
+def prepare_environment(ollama_port):
+    """Point the bot at a throwaway database and the fake Ollama; must run before importing it."""
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    # Run in the scratch directory so a local secret.env or group_members.json is not picked up
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+    os.environ["DB_TYPE"] = "sqlite"
+    os.environ["DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["LOGS_DIR"] = os.path.join(workdir, "logs")
+    os.environ["GROUP_CHAT_ID"] = str(CHAT_ID)
+    os.environ["ACTUAL_GROUP_CHAT_ID"] = str(CHAT_ID)
+    os.environ["OLLAMA_HOST"] = "127.0.0.1"
+    os.environ["OLLAMA_PORT"] = str(ollama_port)
+    os.environ["SUMMARY_EDIT_INTERVAL"] = "0"
+
+
+def median_ms(func, repeat):
+    """Run func repeat times and return the median wall time in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def metric(value, unit, better):
+    return {"value": round(value, 3), "unit": unit, "better": better}
+
+
+class BenchMessage:
+    """Stands in for the Telegram message a /summary command replies to."""
+
+    def __init__(self):
+        self.text = None
+
+    async def reply_text(self, text):
+        self.text = text
+        return self
+
+    async def edit_text(self, text):
+        self.text = text
+        return self
+
+
+def run(args):
+    from telegram_summary_bot.config import TEHRAN_TZ
+    from telegram_summary_bot.utils.storage import add_message, get_messages_in_range
+    from telegram_summary_bot.utils.ingestion import ingestion_queue
+    from telegram_summary_bot.services.summarizer import build_summary_prompt
+    from telegram_summary_bot.services.chunk_summarizer import refresh_chunk_summaries
+    from telegram_summary_bot.services.ai_generator import close_async_client
+    from telegram_summary_bot.handlers.message_handlers import manual_summary
+    from telegram_summary_bot.utils.executors import shutdown_executors
+
+    # Keep the bot's INFO logging out of the timings
+    logging.getLogger("telegram_summary_bot.config").setLevel(logging.WARNING)
+
+    metrics = {}
+    end = datetime.now(TEHRAN_TZ)
+    messages = generate_messages(
+        args.seed, args.users, args.topics, args.messages_per_day, args.days, end, CHAT_ID
+    )
+
+    # Ingestion: queue every message and wait until all are written
+    started = time.perf_counter()
+    for message in messages:
+        add_message(**message)
+    ingestion_queue.flush()
+    elapsed = time.perf_counter() - started
+    metrics["ingest_messages_per_second"] = metric(len(messages) / elapsed, "msg/s", "higher")
+
+    # Range queries over growing windows
+    for hours in WINDOW_HOURS:
+        start = end - timedelta(hours=hours)
+        metrics[f"range_query_{hours}h_ms"] = metric(
+            median_ms(lambda: get_messages_in_range(start, end, CHAT_ID), args.repeat), "ms", "lower"
+        )
+        tracemalloc.start()
+        get_messages_in_range(start, end, CHAT_ID)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        metrics[f"range_query_{hours}h_peak_kib"] = metric(peak / 1024, "KiB", "lower")
+
+    # Prompt construction for a day of messages
+    day = get_messages_in_range(end - timedelta(hours=24), end, CHAT_ID)
+    metrics["build_summary_prompt_24h_ms"] = metric(
+        median_ms(lambda: build_summary_prompt(day, CHAT_ID), args.repeat), "ms", "lower"
+    )
+
+    async def summary_latency_ms():
+        update = SimpleNamespace(
+            effective_user=SimpleNamespace(id=1000),
+            effective_chat=SimpleNamespace(id=CHAT_ID, type="supergroup"),
+            message=BenchMessage()
+        )
+        started = time.perf_counter()
+        await manual_summary(update, SimpleNamespace())
+        elapsed = (time.perf_counter() - started) * 1000
+        if not update.message.text or "Summary" not in update.message.text:
+            raise RuntimeError(f"/summary did not produce a summary: {update.message.text!r}")
+        return elapsed
+
+    async def summaries():
+        try:
+            cold = await summary_latency_ms()
+            # Catch up on the chunk summaries as the background tick does
+            now = datetime.now(TEHRAN_TZ)
+            await refresh_chunk_summaries(now - timedelta(hours=24), now, CHAT_ID)
+            add_message(
+                thread_id=0, user_id=1000, display_name="user0", text="one more message after the summary",
+                timestamp=datetime.now(TEHRAN_TZ), chat_id=CHAT_ID, message_id=len(messages) + 1
+            )
+            incremental = await summary_latency_ms()
+            warm = statistics.median([await summary_latency_ms() for _ in range(args.repeat)])
+            return cold, incremental, warm
+        finally:
+            await close_async_client()
+
+    cold, incremental, warm = asyncio.run(summaries())
+    metrics["summary_cold_ms"] = metric(cold, "ms", "lower")
+    metrics["summary_incremental_ms"] = metric(incremental, "ms", "lower")
+    metrics["summary_warm_ms"] = metric(warm, "ms", "lower")
+
+    ingestion_queue.stop()
+    shutdown_executors()
+    return metrics
+
+
+def compare(metrics, baseline, tolerance):
+    """
+    Compare results with a baseline.
+
+    Returns:
+        list: Names of the metrics that got worse by more than tolerance
+    """
+    regressions = []
+    print(f"{'metric':34} {'value':>12} {'baseline':>12} {'change':>8}")
+    for name, current in metrics.items():
+        previous = baseline.get("metrics", {}).get(name)
+        line = f"{name:34} {current['value']:>12.2f}"
+        if previous and previous["value"]:
+            change = (current["value"] - previous["value"]) / previous["value"]
+            worse = change > tolerance if current["better"] == "lower" else change < -tolerance
+            line += f" {previous['value']:>12.2f} {change:>+8.0%}"
+            if worse:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(f"{line}  {current['unit']}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    server = start_fake_ollama()
+    prepare_environment(server.server_address[1])
+
+    metrics = run(args)
+    server.shutdown()
+
+    results = {
+        "config": {
+            "users": args.users,
+            "topics": args.topics,
+            "messages_per_day": args.messages_per_day,
+            "days": args.days,
+            "seed": args.seed,
+            "repeat": args.repeat
+        },
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "metrics": metrics
+    }
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print("Baseline was recorded with a different configuration; changes are not comparable")
+    regressions = compare(metrics, baseline, args.tolerance)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+
+    if regressions and args.check:
+        print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Ingestion throughput with and without the SQLite performance profile.
+
+Each combination of profile, batch size and reader count runs in a fresh
+process with its own database, since the profile is read when the bot is
+imported. Messages go through add_message and the ingestion queue, which
+is flushed every --batch-sizes messages; batches of one are the commit per
+message of a quiet chat, larger ones a busy chat. Reader threads meanwhile
+query the last day of messages, as summaries and chunk refreshes do.
+
+Usage:
+    python -m benchmarks.sqlite_profile
+    python -m benchmarks.sqlite_profile --messages 20000 --batch-sizes 1,10,100 --readers 0,2
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timedelta
+
+from benchmarks.run_benchmarks import CHAT_ID, REPO_ROOT, prepare_environment
+from benchmarks.synthetic import generate_messages
+
+PROFILES = {"default": "false", "tuned": "true"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare ingestion with and without the SQLite profile.")
+    parser.add_argument("--messages", type=int, default=3000, help="messages ingested in each run")
+    parser.add_argument("--batch-sizes", default="1,100", help="comma-separated messages per commit")
+    parser.add_argument("--readers", default="0,2", help="comma-separated numbers of concurrent reader threads")
+    parser.add_argument("--seed", type=int, default=42, help="random seed of the synthetic messages")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def run_worker(messages_count, batch_size, readers, seed):
+    """Ingest messages in this process and return the throughput figures."""
+    prepare_environment(0)
+
+    import logging
+    from telegram_summary_bot.config import TEHRAN_TZ
+    from telegram_summary_bot.utils.storage import add_message
+    from telegram_summary_bot.utils.ingestion import ingestion_queue
+    from telegram_summary_bot.utils.database import get_messages_in_range
+
+    logging.getLogger("telegram_summary_bot.config").setLevel(logging.WARNING)
+
+    end = datetime.now(TEHRAN_TZ)
+    # One day of traffic in a group of 20 members and 5 topics
+    messages = generate_messages(seed, 20, 5, messages_count, 1, end, CHAT_ID)
+
+    stop = threading.Event()
+    reads = []
+
+    def read_loop():
+        count = 0
+        while not stop.is_set():
+            get_messages_in_range(end - timedelta(hours=24), end, CHAT_ID)
+            count += 1
+        reads.append(count)
+
+    threads = [threading.Thread(target=read_loop, daemon=True) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+
+    started = time.perf_counter()
+    for index, message in enumerate(messages, 1):
+        add_message(**message)
+        if index % batch_size == 0:
+            ingestion_queue.flush()
+    ingestion_queue.flush()
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    ingestion_queue.stop()
+    return {
+        "messages_per_second": len(messages) / elapsed,
+        "reads_per_second": sum(reads) / elapsed
+    }
+
+
+def run_profile(profile, batch_size, readers, args):
+    """Run one combination in a fresh process."""
+    env = dict(os.environ, SQLITE_TUNING=PROFILES[profile])
+    command = [
+        sys.executable, "-m", "benchmarks.sqlite_profile", "--worker", f"{batch_size},{readers}",
+        "--messages", str(args.messages), "--seed", str(args.seed)
+    ]
+    output = subprocess.run(command, env=env, cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        batch_size, readers = (int(value) for value in args.worker.split(","))
+        print(json.dumps(run_worker(args.messages, batch_size, readers, args.seed)))
+        return 0
+
+    print(f"{'batch':>6} {'readers':>8} {'default msg/s':>14} {'tuned msg/s':>12} {'speedup':>8} "
+          f"{'default reads/s':>16} {'tuned reads/s':>14}")
+    for batch_size in (int(value) for value in args.batch_sizes.split(",")):
+        for readers in (int(value) for value in args.readers.split(",")):
+            results = {profile: run_profile(profile, batch_size, readers, args) for profile in PROFILES}
+            default, tuned = results["default"], results["tuned"]
+            print(f"{batch_size:>6} {readers:>8} {default['messages_per_second']:>14.0f} "
+                  f"{tuned['messages_per_second']:>12.0f} "
+                  f"{tuned['messages_per_second'] / default['messages_per_second']:>7.1f}x "
+                  f"{default['reads_per_second']:>16.1f} {tuned['reads_per_second']:>14.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Synthetic group chat traffic for the benchmarks.
+"""
+
+import random
+from datetime import timedelta
+
+WORDS = (
+    "the release deploy staging database migration review pull request login page meeting "
+    "tomorrow today friday lunch pizza coffee bug fix test server crash log error timeout "
+    "design mockup color button api endpoint schema index query slow fast cache memory cpu "
+    "ticket sprint planning estimate demo customer feedback invoice budget holiday weekend"
+).split()
+SHORT_REPLIES = ["ok", "yes", "no", "thanks!", "👍", "lol", "sure", "done", "on it"]
+
+
+def generate_messages(seed, users, topics, messages_per_day, days, end, chat_id):
+    """
+    Generate a reproducible stream of group messages.
+
+    Args:
+        seed (int): Random seed; equal seeds give equal messages
+        users (int): Number of group members
+        topics (int): Number of forum topics, including the main chat
+        messages_per_day (int): Messages sent per day across all topics
+        days (int): Number of days of history ending at end
+        end (datetime): Time of the last message
+        chat_id (int): The chat the messages belong to
+
+    Returns:
+        list: Keyword arguments for add_message, ordered by time
+    """
+    rng = random.Random(seed)
+    count = messages_per_day * days
+    step = timedelta(days=days) / count
+    start = end - timedelta(days=days)
+
+    messages = []
+    for i in range(count):
+        # A few members write most of the messages, as in real groups
+        user = min(int(rng.paretovariate(1.2)) - 1, users - 1)
+        topic = rng.randrange(topics)
+        if rng.random() < 0.2:
+            text = rng.choice(SHORT_REPLIES)
+        else:
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 40)))
+        messages.append({
+            "thread_id": topic,
+            "user_id": 1000 + user,
+            "display_name": f"user{user}",
+            "text": text,
+            "timestamp": start + step * (i + 1),
+            "thread_title": "Main Group Chat" if topic == 0 else f"Topic {topic}",
+            "chat_id": chat_id,
+            "message_id": i + 1
+        })
+    return messages
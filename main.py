@@ -5,7 +5,6 @@ Main entry point for the Telegram Summary Bot.
 
 import asyncio
 import atexit
-import json
 import logging
 import os
 from telegram import Update
@@ -13,10 +12,19 @@ from telegram import Update
 # Get the logger from the config module
 logger = logging.getLogger("telegram_summary_bot.config")
 
-from telegram_summary_bot.bot_init import create_bot, create_application, application_startup
-from telegram_summary_bot.services.scheduler import setup_scheduler
+from telegram_summary_bot.bot_init import create_application, application_startup, application_shutdown
 from telegram_summary_bot.utils.storage import save_message_history
-from telegram_summary_bot.utils.database import migrate_from_json
+from telegram_summary_bot.utils.json_import import import_json_file
+
+# "polling" for a single worker, "webhook" for workers behind a load balancer
+BOT_MODE = os.environ.get("BOT_MODE", "polling").lower()
+# Public HTTPS URL Telegram posts updates to, e.g. https://bot.example.com/telegram
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "telegram")
+# Checked against the X-Telegram-Bot-Api-Secret-Token header of every request
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or None
 
 
 def migrate_existing_data():
@@ -25,11 +33,9 @@ def migrate_existing_data():
     if os.path.exists(json_file):
         try:
             logger.info(f"Found existing message history file: {json_file}")
-            with open(json_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
             
-            # Migrate data to database
-            migrate_from_json(data)
+            # Stream data into the database in batches; resumes if interrupted
+            import_json_file(json_file)
             
             # Backup the JSON file
             backup_file = f"{json_file}.bak"
@@ -37,6 +43,7 @@ def migrate_existing_data():
             logger.info(f"Data migration complete. Original file backed up as {backup_file}")
         except Exception as e:
             logger.error(f"Error migrating existing data: {e}")
+            logger.error("The import will resume from its checkpoint on the next start")
     else:
         logger.info("No existing message history file found. Starting with empty database.")
 
@@ -48,24 +55,33 @@ def main():
     # Migrate existing data
     migrate_existing_data()
     
-    # Create bot instance
-    bot = create_bot()
-    
     # Create the application
     application = create_application()
     
     # Register the startup handler
     application.post_init = application_startup
+    application.post_shutdown = application_shutdown
     
-    # Register shutdown handler to save messages (kept for compatibility)
+    # Register shutdown handler to drain buffered messages
     atexit.register(save_message_history)
     
-    # Setup the scheduler
-    setup_scheduler(bot)
-    
     # Run the bot
     logger.info("Bot is running! Press Ctrl+C to stop.")
-    application.run_polling(allowed_updates=Update.ALL_TYPES, close_loop=False)
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL:
+            raise ValueError("WEBHOOK_URL is required when BOT_MODE is webhook")
+        # Every worker registers the same URL, so the load balancer can send an update to any of them
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+            close_loop=False
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES, close_loop=False)
 
 
 if __name__ == "__main__":
@@ -3,7 +3,7 @@ Telegram bot initialization module.
 """
 
 import logging
-from telegram import Bot, Update
+from telegram import Update
 from telegram.ext import (
     Application, MessageHandler, filters, 
     CommandHandler, CallbackContext
@@ -15,13 +15,13 @@ from telegram_summary_bot.config import TELEGRAM_TOKEN, GROUP_CHAT_ID, ACTUAL_GR
 logger = logging.getLogger("telegram_summary_bot.config")
 
 from telegram_summary_bot.handlers.message_handlers import (
-    save_message, manual_summary, process_all_messages, handle_error
+    save_message, manual_summary, process_all_messages, stats_command, handle_error
 )
-
-
-def create_bot():
-    """Create a Telegram bot instance."""
-    return Bot(token=TELEGRAM_TOKEN)
+from telegram_summary_bot.services.ai_generator import close_async_client
+from telegram_summary_bot.services.scheduler import setup_scheduler
+from telegram_summary_bot.utils.leadership import LeaderElection
+from telegram_summary_bot.utils.executors import shutdown_executors
+from telegram_summary_bot.utils.metrics import start_metrics_server
 
 
 def create_application():
@@ -36,6 +36,9 @@ def create_application():
     # Add a command handler for the summary
     application.add_handler(CommandHandler("summary", manual_summary))
     
+    # Add a command handler for the admin metrics
+    application.add_handler(CommandHandler("stats", stats_command))
+    
     # Add a catch-all handler with lower priority to make sure we don't miss any messages
     application.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, process_all_messages), group=1)
     
@@ -93,9 +96,54 @@ async def application_startup(app):
     """
     logger.info("Application startup handler called")
     
-    # Check group access
-    success = await check_group_access(app.bot)
-    if not success:
-        logger.error("Failed to verify group access at startup - messages may not be captured correctly")
+    # Expose the metrics to Prometheus if METRICS_PORT is set
+    app.bot_data["metrics_server"] = start_metrics_server()
+    
+    # Workers sharing the database elect one to run the scheduled jobs
+    leader = LeaderElection()
+    await leader.start()
+    app.bot_data["leader"] = leader
+    
+    # Check group access; only the leader posts the startup message
+    if leader.is_leader:
+        success = await check_group_access(app.bot)
+        if not success:
+            logger.error("Failed to verify group access at startup - messages may not be captured correctly")
+    
+    # Run scheduled jobs on this event loop with the application's bot
+    scheduler = setup_scheduler(app.bot, leader)
+    scheduler.start()
+    app.bot_data["scheduler"] = scheduler
+    
+    return
+
+
+async def application_shutdown(app):
+    """
+    Function called at application shutdown.
+    
+    Args:
+        app: The Telegram application
+    """
+    logger.info("Application shutdown handler called")
+    
+    # Stop scheduled jobs before the resources they use are released
+    scheduler = app.bot_data.get("scheduler")
+    if scheduler:
+        await scheduler.stop()
+    
+    # Hand the scheduler lease to another worker right away
+    leader = app.bot_data.get("leader")
+    if leader:
+        await leader.stop()
+    
+    # Release pooled connections to Ollama
+    await close_async_client()
+    
+    # Let in-flight database work finish
+    shutdown_executors()
     
-    return 
\ No newline at end of file
+    metrics_server = app.bot_data.get("metrics_server")
+    if metrics_server:
+        metrics_server.shutdown()
+        metrics_server.server_close()
\ No newline at end of file
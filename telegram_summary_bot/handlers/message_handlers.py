@@ -2,21 +2,110 @@
 Message handlers for the Telegram bot.
 """
 
+import os
+import time
 import logging
 from datetime import datetime, timedelta
 
 from telegram import Update
 from telegram.ext import CallbackContext
 
-from telegram_summary_bot.config import is_monitored_chat, TEHRAN_TZ, GROUP_CHAT_ID, ACTUAL_GROUP_CHAT_ID
+from telegram_summary_bot.config import TEHRAN_TZ
 
 # Get the logger from the config module
 logger = logging.getLogger("telegram_summary_bot.config")
 
-from telegram_summary_bot.utils.storage import add_message, get_messages_in_range, group_members
-from telegram_summary_bot.services.summarizer import summarize_messages
+from telegram_summary_bot.utils.storage import add_message
+from telegram_summary_bot.utils.chat_registry import (
+    is_monitored_chat, register_chat, AUTO_REGISTER_CHATS
+)
+from telegram_summary_bot.utils.executors import run_db
+from telegram_summary_bot.utils.metrics import HANDLER_SECONDS, timed, format_stats
+from telegram_summary_bot.utils.log_pipeline import sampled
+from telegram_summary_bot.services.summarizer import summarize_range_async, summarize_period_async, SUMMARY_PERIODS
+from telegram_summary_bot.services.scheduler import schedule_chat
 
+# Minimum seconds between progressive edits (Telegram allows about 20 messages a minute in groups)
+SUMMARY_EDIT_INTERVAL = float(os.environ.get("SUMMARY_EDIT_INTERVAL", "3"))
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Users allowed to run /stats anywhere, besides group administrators
+ADMIN_USER_IDS = {int(user_id) for user_id in os.environ.get("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
 
+
+class ProgressiveReply:
+    """
+    A reply that is sent on first use and then edited in place.
+    
+    Partial updates are rate-limited to SUMMARY_EDIT_INTERVAL; status
+    messages and the final text are always shown.
+    """
+
+    def __init__(self, message, header=""):
+        """
+        Args:
+            message: The Telegram message to reply to
+            header (str): Text shown above partial updates
+        """
+        self._message = message
+        self._header = header
+        self._reply = None
+        self._last_edit = 0.0
+
+    async def notify(self, text):
+        """Show a status message."""
+        await self._show(text, force=True)
+
+    async def update(self, partial_text):
+        """Show the text generated so far, if the rate limit allows."""
+        await self._show(f"{self._header}{partial_text} ▌")
+
+    async def finish(self, text):
+        """Show the final text."""
+        await self._show(text, force=True)
+
+    async def _show(self, text, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_edit < SUMMARY_EDIT_INTERVAL:
+            return
+        self._last_edit = now
+        
+        text = text[:TELEGRAM_MESSAGE_LIMIT]
+        try:
+            if self._reply is None:
+                self._reply = await self._message.reply_text(text)
+            else:
+                await self._reply.edit_text(text)
+        except Exception as e:
+            logger.warning(f"Failed to update summary reply: {e}")
+
+
+async def ensure_registered(update: Update, context: CallbackContext):
+    """
+    Check whether a chat is monitored, registering new groups if AUTO_REGISTER_CHATS is set.
+    
+    Args:
+        update: The Telegram update
+        context: The callback context
+        
+    Returns:
+        bool: True if messages from the chat should be stored
+    """
+    chat = update.effective_chat
+    if is_monitored_chat(chat.id):
+        return True
+    if not AUTO_REGISTER_CHATS or chat.type not in ("group", "supergroup"):
+        return False
+    
+    await run_db(register_chat, chat.id, chat.title)
+    
+    # Give the new chat its scheduled summaries
+    scheduler = context.application.bot_data.get("scheduler")
+    if scheduler:
+        schedule_chat(scheduler, context.bot, chat.id)
+    return is_monitored_chat(chat.id)
+
+
+@timed(HANDLER_SECONDS, handler="save_message")
 async def save_message(update: Update, context: CallbackContext):
     """
     Handler for saving messages.
@@ -25,20 +114,31 @@ async def save_message(update: Update, context: CallbackContext):
         update: The Telegram update
         context: The callback context
     """
-    # Log all incoming messages for debugging
-    logger.info(f"Received message in chat {update.effective_chat.id}")
-    logger.info(f"From user: {update.effective_user.id} - {update.effective_user.username or update.effective_user.first_name}")
-    logger.info(f"Message text: {update.message.text}")
+    await store_message(update, context)
+
+
+async def store_message(update: Update, context: CallbackContext):
+    """
+    Queue a text message for storage.
+    
+    Shared by the handlers that save messages, so their latency is only
+    recorded by the handler Telegram invoked.
     
-    # Check if the message is from the configured group
-    if not is_monitored_chat(update.effective_chat.id):
-        logger.warning(f"Ignoring message from chat {update.effective_chat.id} - not the target group")
+    Args:
+        update: The Telegram update
+        context: The callback context
+    """
+    # Check if the message is from a registered group
+    if not await ensure_registered(update, context):
+        logger.warning(f"Ignoring message from chat {update.effective_chat.id} - not a registered group",
+                       extra=sampled("unregistered_chat", chat_id=update.effective_chat.id))
         return
 
     user_id = update.effective_user.id
     display_name = update.effective_user.username or update.effective_user.first_name
     text = update.message.text
-    timestamp = datetime.now(TEHRAN_TZ)
+    # Use Telegram's send time so repeated deliveries carry the same timestamp
+    timestamp = update.message.date.astimezone(TEHRAN_TZ) if update.message.date else datetime.now(TEHRAN_TZ)
     
     # For non-topic groups or main thread, use thread_id 0
     thread_id = getattr(update.message, 'message_thread_id', None) or 0
@@ -49,37 +149,62 @@ async def save_message(update: Update, context: CallbackContext):
     else:
         thread_title = "Main Group Chat"
 
-    # Check if this user is known in our group_members list
-    user_id_str = str(user_id)
-    if user_id_str not in group_members:
-        logger.info(f"User {user_id} ({display_name}) not in group_members.json")
-
-    # Save the message
-    logger.info(f"Saving message from {display_name} in thread {thread_id}: {text[:30]}...")
+    # Per-message lines are rate-limited and never carry the message text
+    logger.info(f"Saving message {update.message.message_id} from user {user_id} in chat "
+                f"{update.effective_chat.id}, thread {thread_id} ({len(text)} chars)",
+                extra=sampled("message_received", chat_id=update.effective_chat.id, thread_id=thread_id,
+                              user_id=user_id, message_id=update.message.message_id, text_length=len(text)))
     
-    # Add message to storage
-    total_messages = add_message(
+    # Queue message for storage
+    pending_messages = add_message(
         thread_id=thread_id,
         user_id=user_id,
         display_name=display_name,
         text=text,
         timestamp=timestamp,
-        thread_title=thread_title
+        thread_title=thread_title,
+        chat_id=update.effective_chat.id,
+        message_id=update.message.message_id
     )
     
-    logger.info(f"Message saved. Total messages in logs: {total_messages}")
+    if pending_messages is None:
+        logger.debug(f"Ignoring duplicate delivery of message {update.message.message_id}",
+                     extra=sampled("message_duplicate", message_id=update.message.message_id))
+        return
+    
+    logger.debug(f"Message queued. Pending writes: {pending_messages}",
+                 extra=sampled("message_queued", pending_messages=pending_messages))
 
 
+@timed(HANDLER_SECONDS, handler="manual_summary")
 async def manual_summary(update: Update, context: CallbackContext):
     """
     Handler for generating a summary on demand.
     
+    "/summary" covers the last 24 hours; "/summary week" and "/summary month"
+    the last 7 and 30 days, built from the stored daily summaries.
+    
     Args:
         update: The Telegram update
         context: The callback context
     """
     logger.info(f"Summary requested by user {update.effective_user.id} in chat {update.effective_chat.id}")
     
+    # Each chat can only summarize its own messages
+    chat_id = update.effective_chat.id
+    if not is_monitored_chat(chat_id):
+        await update.message.reply_text("This chat is not registered for summaries.")
+        return
+    
+    args = getattr(context, "args", None) or []
+    period = args[0].lower() if args else "day"
+    if period not in SUMMARY_PERIODS:
+        await update.message.reply_text("Usage: /summary [day|week|month]")
+        return
+    if period != "day":
+        await period_summary(update, chat_id, SUMMARY_PERIODS[period])
+        return
+    
     # Log current state of message storage for debugging
     logger.info("Getting messages from the last 24 hours")
     
@@ -87,36 +212,47 @@ async def manual_summary(update: Update, context: CallbackContext):
     start = now - timedelta(hours=24)
     end = now
     
-    logger.info(f"Getting messages from {start} to {end}")
-    messages = get_messages_in_range(start, end)
+    header = "📊 Summary of the last 24 hours:\n\n"
+    reply = ProgressiveReply(update.message, header=header)
     
-    logger.info(f"Found {sum(len(msgs) for msgs in messages.values())} messages in time range")
+    logger.info(f"Summarizing messages from {start} to {end}")
+    summary = await summarize_range_async(start, end, chat_id, notify=reply.notify, on_progress=reply.update)
     
-    if not any(messages.values()):
-        await update.message.reply_text("No messages found in the last 24 hours.")
+    if summary is None:
+        await reply.finish("No messages found in the last 24 hours.")
         return
         
-    summary = summarize_messages(messages)
-    formatted_summary = f"📊 Summary of the last 24 hours:\n\n{summary}"
+    formatted_summary = f"{header}{summary}"
     
     # Reply to the message that requested the summary
-    await update.message.reply_text(formatted_summary)
+    await reply.finish(formatted_summary)
+
+
+async def period_summary(update: Update, chat_id, days):
+    """
+    Reply with the summary of the last days of a chat.
     
-    # If the request came from a different chat than the monitored ones,
-    # also send the summary to the monitored chats as a courtesy
-    request_chat_id = update.effective_chat.id
-    if request_chat_id != GROUP_CHAT_ID and request_chat_id != ACTUAL_GROUP_CHAT_ID:
-        logger.info(f"Summary requested from non-monitored chat {request_chat_id}, also sending to monitored chats")
-        
-        for chat_id in [GROUP_CHAT_ID, ACTUAL_GROUP_CHAT_ID]:
-            if chat_id != request_chat_id:  # Don't send twice to the same chat
-                try:
-                    await context.bot.send_message(chat_id=chat_id, text=formatted_summary)
-                    logger.info(f"Summary also sent to chat {chat_id}")
-                except Exception as e:
-                    logger.error(f"Failed to send summary to chat {chat_id}: {e}")
+    Args:
+        update: The Telegram update
+        chat_id (int): The chat to summarize
+        days (int): Number of days, including today
+    """
+    header = f"📊 Summary of the last {days} days:\n\n"
+    reply = ProgressiveReply(update.message, header=header)
+    
+    logger.info(f"Summarizing the last {days} days of chat {chat_id}")
+    summary = await summarize_period_async(
+        days, datetime.now(TEHRAN_TZ), chat_id, notify=reply.notify, on_progress=reply.update
+    )
+    
+    if summary is None:
+        await reply.finish(f"No messages found in the last {days} days.")
+        return
+    
+    await reply.finish(f"{header}{summary}")
 
 
+@timed(HANDLER_SECONDS, handler="process_all_messages")
 async def process_all_messages(update: Update, context: CallbackContext):
     """
     General handler for all incoming messages.
@@ -130,26 +266,68 @@ async def process_all_messages(update: Update, context: CallbackContext):
     if not update.effective_message:
         return
         
-    # Check if the message is from our target group
-    if not is_monitored_chat(update.effective_chat.id):
+    # Check if the message is from a registered group
+    if not await ensure_registered(update, context):
         return
         
     # Handle edited messages
     if update.edited_message:
-        logger.info(f"Received edited message in group from {update.effective_user.username or update.effective_user.first_name}")
+        logger.info(f"Received edited message {update.effective_message.message_id} in chat {update.effective_chat.id}",
+                    extra=sampled("message_edited", chat_id=update.effective_chat.id))
         # We don't process edited messages for now
         return
         
     # For non-text messages that we don't want to save, just log them
     if not update.effective_message.text:
-        logger.info(f"Received non-text message in group from {update.effective_user.username or update.effective_user.first_name}")
+        logger.info(f"Received non-text message {update.effective_message.message_id} in chat {update.effective_chat.id}",
+                    extra=sampled("message_non_text", chat_id=update.effective_chat.id))
         return
         
     # We've received a text message from the target group, call our regular handler
-    logger.info(f"process_all_messages caught a message: {update.effective_message.text[:30]}...")
+    # Store it like our main handler does; if save_message already stored it, this is a no-op
+    await store_message(update, context)
+
+
+async def is_admin(update: Update, context: CallbackContext):
+    """
+    Check whether the sender is a configured admin or an administrator of the group.
+    
+    Args:
+        update: The Telegram update
+        context: The callback context
+        
+    Returns:
+        bool: True if the sender may see the bot's internals
+    """
+    user_id = update.effective_user.id
+    if user_id in ADMIN_USER_IDS:
+        return True
+    
+    chat = update.effective_chat
+    if chat.type not in ("group", "supergroup"):
+        return False
+    try:
+        member = await context.bot.get_chat_member(chat.id, user_id)
+    except Exception as e:
+        logger.warning(f"Failed to check admin rights of user {user_id} in chat {chat.id}: {e}")
+        return False
+    return member.status in ("administrator", "creator")
+
+
+async def stats_command(update: Update, context: CallbackContext):
+    """
+    Handler for showing the bot's latency and throughput metrics to admins.
+    
+    Args:
+        update: The Telegram update
+        context: The callback context
+    """
+    if not await is_admin(update, context):
+        logger.info(f"Ignoring /stats from non-admin user {update.effective_user.id}")
+        return
     
-    # Forward to our main handler
-    await save_message(update, context)
+    stats = format_stats() or "No metrics recorded yet."
+    await update.message.reply_text(stats[:TELEGRAM_MESSAGE_LIMIT])
 
 
 async def handle_error(update: Update, context: CallbackContext):
@@ -2,15 +2,22 @@
 AI integration for text generation using Ollama with simple fallback.
 """
 
-import time
+import asyncio
 import json
 import logging
-import requests
 import os
+import time
+import weakref
+
+import httpx
 
 # Get the logger from the config module
 logger = logging.getLogger("telegram_summary_bot.config")
 
+from telegram_summary_bot.utils.metrics import (
+    OLLAMA_FIRST_TOKEN_SECONDS, OLLAMA_GENERATION_SECONDS, OLLAMA_RETRIES, OLLAMA_FALLBACKS
+)
+
 # Default to mistral, but allow override via environment variable
 DEFAULT_MODEL = "mistral"
 MODEL_NAME = os.environ.get("OLLAMA_MODEL", DEFAULT_MODEL)
@@ -22,6 +29,25 @@ OLLAMA_URL = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}/api/generate"
 
 # Performance parameters
 DEFAULT_TIMEOUT = int(os.environ.get("OLLAMA_TIMEOUT", "90"))
+CONNECT_TIMEOUT = 10  # seconds
+MAX_CONNECTIONS = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "4"))
+MAX_RETRIES = 3
+INITIAL_RETRY_DELAY = 1  # seconds
+
+# Appended to a streamed summary that was cut off by the timeout
+TRUNCATED_NOTE = "\n\n⚠️ Summary truncated: generation timed out."
+
+# Generation options sent with every request
+OLLAMA_OPTIONS = {
+    "num_ctx": int(os.environ.get("OLLAMA_NUM_CTX", "2048")),  # Small context window for speed
+    "num_thread": 4,        # Parallel threads
+    "temperature": 0.1,     # Lower temperature for more deterministic responses
+    "top_p": 0.95,          # Nucleus sampling
+    "repeat_penalty": 1.1   # Slight penalty for repeating
+}
+
+# Pooled async clients, one per event loop (httpx pools cannot be shared across loops)
+_async_clients = weakref.WeakKeyDictionary()
 
 
 def generate_simple_summary(prompt):
@@ -64,92 +90,215 @@ def generate_simple_summary(prompt):
     return "\n".join(lines)
 
 
-def generate_with_ollama(prompt):
+def build_request_params(prompt, stream=False):
+    """
+    Build the JSON body for an Ollama generate request.
+    
+    Args:
+        prompt (str): The text prompt to send to Ollama
+        stream (bool): Whether Ollama should stream the response as NDJSON
+        
+    Returns:
+        dict: The request parameters
+    """
+    return {
+        "model": MODEL_NAME,
+        "prompt": prompt,
+        "stream": stream,
+        "options": dict(OLLAMA_OPTIONS)
+    }
+
+
+def parse_response_text(raw_text):
+    """
+    Extract the generated text from an Ollama response body.
+    
+    Args:
+        raw_text (str): The raw HTTP response body
+        
+    Returns:
+        str: The generated text, or the raw output if it could not be parsed
+    """
+    try:
+        # Parse the response as JSON
+        result = json.loads(raw_text)
+        generated_text = result.get("response", "")
+        logger.info(f"Generated text length: {len(generated_text)} characters")
+        return generated_text
+    except json.JSONDecodeError as e:
+        # If JSON parsing fails, try to extract text directly
+        logger.warning(f"Failed to parse JSON response: {e}")
+        logger.info("Attempting to use raw response text")
+        logger.info(f"Raw response length: {len(raw_text)} characters")
+        
+        # Fallback: take the text between the first set of quotes if present
+        if '"response": "' in raw_text:
+            start_idx = raw_text.find('"response": "') + 13
+            end_idx = raw_text.find('",', start_idx)
+            if end_idx > start_idx:
+                extracted_text = raw_text[start_idx:end_idx]
+                logger.info(f"Extracted text using string search, length: {len(extracted_text)}")
+                return extracted_text
+        
+        # If all else fails, return the raw text with a warning
+        return "NOTE: Response format error. Raw output:\n\n" + raw_text[:500]
+
+
+def get_async_client():
+    """
+    Get the pooled HTTP client for the running event loop.
+    
+    Returns:
+        httpx.AsyncClient: A client whose connections are reused between requests
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS
+            )
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    """Close the pooled HTTP client of the running event loop, if any."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def stream_with_ollama(client, prompt, on_progress):
+    """
+    Generate text using Ollama's streaming mode.
+    
+    Ollama sends one JSON object per line; each carries the next piece of
+    the response. If the stream times out or breaks after some text has
+    arrived, the partial text is returned instead of failing.
+    
+    Args:
+        client (httpx.AsyncClient): The HTTP client
+        prompt (str): The text prompt to send to Ollama
+        on_progress: Coroutine function called with the text generated so far
+        
+    Returns:
+        str: The generated text, or None if Ollama returned an error status
     """
-    Generate text using Ollama API.
+    generated_text = ""
+    started = time.perf_counter()
+    try:
+        async with asyncio.timeout(DEFAULT_TIMEOUT):
+            async with client.stream("POST", OLLAMA_URL, json=build_request_params(prompt, stream=True)) as response:
+                if response.status_code != 200:
+                    logger.warning(f"Ollama API returned status {response.status_code}")
+                    return None
+                
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping malformed stream line: {line[:100]}")
+                        continue
+                    
+                    piece = chunk.get("response", "")
+                    if piece:
+                        if not generated_text:
+                            OLLAMA_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                        generated_text += piece
+                        await on_progress(generated_text)
+                    if chunk.get("done"):
+                        break
+    except (TimeoutError, httpx.HTTPError) as e:
+        if not generated_text:
+            raise
+        logger.warning(f"Stream interrupted after {len(generated_text)} characters: {e!r}")
+        return generated_text + TRUNCATED_NOTE
+    
+    logger.info(f"Generated text length: {len(generated_text)} characters")
+    return generated_text
+
+
+async def generate_with_ollama_async(prompt, fallback=generate_simple_summary, on_progress=None):
+    """
+    Generate text using Ollama API without blocking the event loop.
+    
+    Cancelling the awaiting task aborts the in-flight request and any
+    pending retry.
     
     Args:
         prompt (str): The text prompt to send to Ollama
+        fallback: Called with the prompt when all retries fail; its return
+            value is returned instead
+        on_progress: Optional coroutine function; if given, the response is
+            streamed and it is called with the text generated so far
         
     Returns:
         str: The generated text response
     """
-    # No initial delay needed with proper startup script
-    max_retries = 3
-    retry_delay = 1  # seconds
+    client = get_async_client()
+    retry_delay = INITIAL_RETRY_DELAY
+    mode = "stream" if on_progress is not None else "plain"
+    started = time.perf_counter()
     
-    for attempt in range(max_retries):
+    for attempt in range(MAX_RETRIES):
+        logger.info(f"Attempt {attempt+1}/{MAX_RETRIES} to connect to Ollama")
+        
         try:
-            logger.info(f"Attempt {attempt+1}/{max_retries} to connect to Ollama")
-            
-            # Try to generate text using ollama with optimized parameters
-            try:
-                # Performance optimization parameters
-                params = {
-                    "model": MODEL_NAME,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "num_ctx": 2048,        # Reduce context window for speed
-                        "num_thread": 4,        # Parallel threads
-                        "temperature": 0.1,     # Lower temperature for more deterministic responses
-                        "top_p": 0.95,          # Nucleus sampling
-                        "repeat_penalty": 1.1   # Slight penalty for repeating
-                    }
-                }
-                
-                response = requests.post(
-                    OLLAMA_URL,
-                    json=params,
-                    timeout=DEFAULT_TIMEOUT
-                )
+            if on_progress is not None:
+                generated_text = await stream_with_ollama(client, prompt, on_progress)
+                if generated_text is not None:
+                    OLLAMA_GENERATION_SECONDS.observe(time.perf_counter() - started, mode=mode)
+                    return generated_text
+            else:
+                response = await client.post(OLLAMA_URL, json=build_request_params(prompt))
                 
                 if response.status_code == 200:
                     logger.info("Successfully received response from Ollama")
-                    
-                    try:
-                        # Parse the response as JSON
-                        result = response.json()
-                        generated_text = result.get("response", "")
-                        logger.info(f"Generated text length: {len(generated_text)} characters")
-                        return generated_text
-                    except json.JSONDecodeError as e:
-                        # If JSON parsing fails, try to extract text directly
-                        logger.warning(f"Failed to parse JSON response: {e}")
-                        logger.info("Attempting to use raw response text")
-                        
-                        # Get raw text from response and clean it up
-                        raw_text = response.text
-                        logger.info(f"Raw response length: {len(raw_text)} characters")
-                        
-                        # Fallback: take the text between the first set of quotes if present
-                        if '"response": "' in raw_text:
-                            start_idx = raw_text.find('"response": "') + 13
-                            end_idx = raw_text.find('",', start_idx)
-                            if end_idx > start_idx:
-                                extracted_text = raw_text[start_idx:end_idx]
-                                logger.info(f"Extracted text using string search, length: {len(extracted_text)}")
-                                return extracted_text
-                        
-                        # If all else fails, return the raw text with a warning
-                        return "NOTE: Response format error. Raw output:\n\n" + raw_text[:500]
-                else:
-                    logger.warning(f"Ollama API returned status {response.status_code}")
-            except Exception as e:
-                logger.warning(f"Error connecting to Ollama: {str(e)}")
-            
-            # If we're here, the request failed
-            if attempt < max_retries - 1:
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-                retry_delay *= 2  # Exponential backoff
-            
+                    OLLAMA_GENERATION_SECONDS.observe(time.perf_counter() - started, mode=mode)
+                    return parse_response_text(response.text)
+                
+                logger.warning(f"Ollama API returned status {response.status_code}")
         except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-                retry_delay *= 2
-    
-    # If we exhausted all retries, use simple summary
-    logger.info("Ollama failed after multiple retries, using simple summary instead")
-    return generate_simple_summary(prompt) 
\ No newline at end of file
+            # asyncio.CancelledError is not an Exception, so cancellation propagates
+            logger.warning(f"Error connecting to Ollama: {str(e)}")
+        
+        # If we're here, the request failed
+        if attempt < MAX_RETRIES - 1:
+            OLLAMA_RETRIES.inc()
+            logger.info(f"Retrying in {retry_delay} seconds...")
+            await asyncio.sleep(retry_delay)
+            retry_delay *= 2  # Exponential backoff
+    
+    # If we exhausted all retries, use the fallback
+    logger.info("Ollama failed after multiple retries, using fallback instead")
+    OLLAMA_FALLBACKS.inc()
+    return fallback(prompt)
+
+
+def generate_with_ollama(prompt):
+    """
+    Generate text using Ollama API from synchronous code.
+    
+    Thin wrapper around generate_with_ollama_async for callers that do not
+    run an event loop, such as the scheduler thread. Must not be called
+    from a coroutine.
+    
+    Args:
+        prompt (str): The text prompt to send to Ollama
+        
+    Returns:
+        str: The generated text response
+    """
+    async def run():
+        try:
+            return await generate_with_ollama_async(prompt)
+        finally:
+            await close_async_client()
+    
+    return asyncio.run(run())
@@ -0,0 +1,193 @@
+"""
+Incremental summarization of messages in fixed time buckets.
+
+Messages of each thread are summarized per bucket (one hour by default) once
+the bucket has closed, and the partial summaries are stored in the database.
+Daily and on-demand summaries are then built from these partials instead of
+the full message history.
+"""
+
+import os
+import logging
+from datetime import timedelta
+
+from telegram_summary_bot.config import DEFAULT_CHAT_ID
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+from telegram_summary_bot.utils.storage import get_messages_in_range, thread_titles
+from telegram_summary_bot.utils.database import get_chunk_summaries, save_chunk_summary, to_stored_time
+from telegram_summary_bot.services.ai_generator import generate_with_ollama_async
+from telegram_summary_bot.services.prompt_builder import fit_prompt
+from telegram_summary_bot.services.summary_jobs import get_summary_jobs
+from telegram_summary_bot.utils.executors import run_db, run_generation
+
+# Size of a summarization bucket
+CHUNK_MINUTES = int(os.environ.get("CHUNK_SUMMARY_MINUTES", "60"))
+# How often the background tick summarizes newly closed buckets
+CHUNK_REFRESH_MINUTES = int(os.environ.get("CHUNK_REFRESH_MINUTES", "10"))
+# Buckets an on-demand summary may summarize itself; the tick catches up on the rest
+INLINE_CHUNK_LIMIT = int(os.environ.get("INLINE_CHUNK_SUMMARIES", "2"))
+# Buckets of one chat the background tick summarizes per run, so a backlog is worked off over several ticks
+TICK_CHUNK_LIMIT = int(os.environ.get("CHUNK_SUMMARIES_PER_TICK", "12"))
+
+
+def bucket_start(timestamp):
+    """
+    Get the start of the bucket containing a timestamp.
+
+    Args:
+        timestamp (datetime): The timestamp
+
+    Returns:
+        datetime: The naive local start of its bucket
+    """
+    timestamp = to_stored_time(timestamp)
+    midnight = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    elapsed = int((timestamp - midnight).total_seconds() // 60)
+    return midnight + timedelta(minutes=elapsed - elapsed % CHUNK_MINUTES)
+
+
+def get_thread_title(thread_id, chat_id=DEFAULT_CHAT_ID):
+    """Get the display title of a thread in a chat."""
+    thread_title = thread_titles.get((chat_id, thread_id), f"Thread {thread_id}")
+    if thread_id == 0 and thread_title == "Thread 0":
+        thread_title = "Main Group Chat"
+    return thread_title
+
+
+def format_message_lines(messages, omitted=0):
+    """Format messages as one "[HH:MM] name: text" line each, noting how many were left out."""
+    lines = [f"[{m['time'].strftime('%H:%M')}] {m['display_name']}: {m['text']}" for m in messages]
+    if omitted:
+        lines.append(f"({omitted} more messages left out for length)")
+    return "\n".join(lines)
+
+
+def build_chunk_prompt(thread_id, window_start, window_end, messages, chat_id=DEFAULT_CHAT_ID):
+    """
+    Build the prompt that summarizes one bucket of a thread.
+
+    Args:
+        thread_id (int): The Telegram thread ID
+        window_start (datetime): Start of the bucket
+        window_end (datetime): End of the bucket
+        messages (list): The bucket's messages
+        chat_id (int): The chat the thread belongs to
+
+    Returns:
+        str: The prompt to send to the model
+    """
+    def render(fitted_messages, omitted):
+        return (
+            f"These are chat messages from the topic \"{get_thread_title(thread_id, chat_id)}\" of a Telegram group, "
+            f"sent between {window_start.strftime('%H:%M')} and {window_end.strftime('%H:%M')}.\n\n"
+            "Briefly summarize what each person said, naming them. Do not add anything else.\n\n"
+            + format_message_lines(fitted_messages[thread_id], omitted.get(thread_id, 0))
+        )
+
+    return fit_prompt(render, {thread_id: messages}, kind="chunk")
+
+
+def group_into_buckets(messages):
+    """
+    Group a thread's messages by bucket.
+
+    Args:
+        messages (list): Messages ordered by time
+
+    Returns:
+        dict: Bucket start -> list of messages
+    """
+    buckets = {}
+    for msg in messages:
+        buckets.setdefault(bucket_start(msg["time"]), []).append(msg)
+    return buckets
+
+
+async def refresh_chunk_summaries(start, end, chat_id, max_generations=None, use_job_slots=False):
+    """
+    Summarize every closed bucket of a chat in a time range that lacks an up-to-date summary.
+
+    The range is widened to bucket boundaries so partial buckets are never
+    stored. A stored summary is regenerated when messages were added to its
+    bucket after it was written.
+
+    With max_generations set, at most that many buckets are summarized and
+    none after the first failure; the others are left for the background
+    tick, so a user waiting on a summary never waits on a whole backlog or
+    on repeated retries while the model is down.
+
+    With use_job_slots, every generation waits for a slot of the summary
+    jobs, so background work shares the concurrency limit and the
+    round-robin across chats with user requests. Callers that already run
+    in a slot, like an on-demand summary, must leave it off.
+
+    Args:
+        start (datetime): Start of the range
+        end (datetime): End of the range; the bucket containing it is still open
+        chat_id (int): The chat to summarize
+        max_generations (int): Most buckets to summarize; None for no limit
+        use_job_slots (bool): Run each generation in a summary job slot
+
+    Returns:
+        dict: Thread ID -> messages of closed buckets that were not
+            summarized, so callers can fall back to the raw text
+    """
+    range_start = bucket_start(start)
+    open_bucket = bucket_start(end)
+    if range_start >= open_bucket:
+        return {}
+
+    messages = await run_db(get_messages_in_range, range_start, open_bucket, chat_id)
+    existing = {
+        (chunk["thread_id"], chunk["window_start"]): chunk
+        for chunk in await run_db(get_chunk_summaries, range_start, open_bucket, chat_id)
+    }
+
+    generated = 0
+    attempts_left = max_generations
+    unsummarized = {}
+    for thread_id, thread_messages in messages.items():
+        for window_start, bucket_messages in sorted(group_into_buckets(thread_messages).items()):
+            if window_start >= open_bucket:
+                continue
+
+            last_message_id = bucket_messages[-1]["id"]
+            chunk = existing.get((thread_id, window_start))
+            if chunk and chunk["message_count"] == len(bucket_messages) and chunk["last_message_id"] == last_message_id:
+                continue
+            if attempts_left is not None:
+                if attempts_left <= 0:
+                    unsummarized.setdefault(thread_id, []).extend(bucket_messages)
+                    continue
+                attempts_left -= 1
+
+            window_end = window_start + timedelta(minutes=CHUNK_MINUTES)
+            prompt = await run_generation(
+                build_chunk_prompt, thread_id, window_start, window_end, bucket_messages, chat_id
+            )
+            # Don't persist fallback text; the bucket is retried on the next tick
+            generate = lambda: generate_with_ollama_async(prompt, fallback=lambda _prompt: None)
+            if use_job_slots:
+                key = f"chunk:{chat_id}:{thread_id}:{window_start:%Y%m%d%H%M}:{last_message_id}"
+                summary = await get_summary_jobs().run(key, generate, chat_id=chat_id)
+            else:
+                summary = await generate()
+            if summary is None:
+                logger.warning(f"Could not summarize thread {thread_id} bucket {window_start}, will retry")
+                unsummarized.setdefault(thread_id, []).extend(bucket_messages)
+                if attempts_left is not None:
+                    attempts_left = 0
+                continue
+
+            await run_db(
+                save_chunk_summary, thread_id, window_start, window_end, len(bucket_messages), last_message_id, summary,
+                chat_id
+            )
+            generated += 1
+
+    if generated:
+        logger.info(f"Generated {generated} chunk summaries for chat {chat_id} between {range_start} and {open_bucket}")
+    return unsummarized
@@ -0,0 +1,163 @@
+"""
+Extractive selection of the most representative chat messages.
+
+Messages are scored with TextRank over the cosine similarities of their
+TF-IDF vectors, computed with NumPy. Sending the model only the top
+messages of each user in each thread cuts generation time on CPU-only
+hosts roughly in proportion to the text left out. The same picks make up
+the fallback summary when the model is unavailable.
+"""
+
+import os
+import re
+import math
+import logging
+
+import numpy as np
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+# Whether prompts carry only the most representative messages
+EXTRACTIVE_SUMMARY = os.environ.get("EXTRACTIVE_SUMMARY", "false").lower() in ("1", "true", "yes")
+# Share of each user's messages in a thread that is kept
+EXTRACTIVE_RATIO = float(os.environ.get("EXTRACTIVE_RATIO", "0.15"))
+# Threads with fewer messages are kept whole
+EXTRACTIVE_MIN_MESSAGES = int(os.environ.get("EXTRACTIVE_MIN_MESSAGES", "30"))
+# Most frequent words used as TF-IDF features, bounding the matrix size
+MAX_FEATURES = 2000
+# Larger threads are scored by similarity to their centroid instead of with TextRank
+TEXTRANK_MAX_MESSAGES = 1500
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 30
+
+WORD = re.compile(r"\w+")
+
+
+def tfidf_vectors(texts):
+    """
+    Build L2-normalized TF-IDF vectors of texts.
+
+    Args:
+        texts (list): The texts
+
+    Returns:
+        numpy.ndarray: One row per text
+    """
+    docs = [WORD.findall(text.casefold()) for text in texts]
+
+    document_frequency = {}
+    for words in docs:
+        for word in set(words):
+            document_frequency[word] = document_frequency.get(word, 0) + 1
+    features = sorted(document_frequency, key=document_frequency.get, reverse=True)[:MAX_FEATURES]
+    columns = {word: column for column, word in enumerate(features)}
+
+    counts = np.zeros((len(docs), max(len(features), 1)), dtype=np.float32)
+    for row, words in enumerate(docs):
+        for word in words:
+            column = columns.get(word)
+            if column is not None:
+                counts[row, column] += 1
+
+    df = np.array([document_frequency[word] for word in features] or [1], dtype=np.float32)
+    idf = np.log((1 + len(docs)) / (1 + df)) + 1
+    vectors = counts * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def textrank(vectors):
+    """
+    Rank texts by TextRank over their cosine similarities.
+
+    Args:
+        vectors (numpy.ndarray): Normalized text vectors, one row per text
+
+    Returns:
+        numpy.ndarray: One score per text; higher is more central
+    """
+    count = len(vectors)
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, 0)
+    row_sums = similarity.sum(axis=1, keepdims=True)
+    # Texts sharing no words with any other link to all texts evenly
+    transition = np.where(row_sums > 0, similarity / np.where(row_sums == 0, 1, row_sums), 1 / count)
+
+    scores = np.full(count, 1 / count, dtype=np.float32)
+    for _ in range(TEXTRANK_ITERATIONS):
+        scores = (1 - TEXTRANK_DAMPING) / count + TEXTRANK_DAMPING * (transition.T @ scores)
+    return scores
+
+
+def score_messages(messages):
+    """
+    Score how representative each message is of its thread.
+
+    Args:
+        messages (list): A thread's messages
+
+    Returns:
+        numpy.ndarray: One score per message
+    """
+    vectors = tfidf_vectors([msg["text"] for msg in messages])
+    if len(messages) > TEXTRANK_MAX_MESSAGES:
+        return vectors @ vectors.mean(axis=0)
+    return textrank(vectors)
+
+
+def pick_representative(messages, ratio=EXTRACTIVE_RATIO, max_per_user=None):
+    """
+    Pick the most representative messages of each user in a thread.
+
+    Every user keeps at least one message.
+
+    Args:
+        messages (list): A thread's messages ordered by time
+        ratio (float): Share of each user's messages to keep
+        max_per_user (int): Optional cap on the messages kept per user
+
+    Returns:
+        list: The picked messages in time order
+    """
+    if not messages:
+        return []
+
+    scores = score_messages(messages)
+    by_user = {}
+    for index, msg in enumerate(messages):
+        by_user.setdefault(str(msg["user_id"]), []).append(index)
+
+    picked = []
+    for indexes in by_user.values():
+        keep = max(1, math.ceil(len(indexes) * ratio))
+        if max_per_user is not None:
+            keep = min(keep, max_per_user)
+        picked.extend(sorted(indexes, key=lambda index: scores[index], reverse=True)[:keep])
+    return [messages[index] for index in sorted(picked)]
+
+
+def extract_messages(threaded_messages, ratio=EXTRACTIVE_RATIO):
+    """
+    Reduce every large thread to its most representative messages.
+
+    Args:
+        threaded_messages (dict): Thread ID -> messages ordered by time
+        ratio (float): Share of each user's messages to keep
+
+    Returns:
+        tuple: (thread ID -> picked messages, thread ID -> number of left out messages)
+    """
+    picked = {}
+    omitted = {}
+    for thread_id, messages in threaded_messages.items():
+        if len(messages) < EXTRACTIVE_MIN_MESSAGES:
+            picked[thread_id] = messages
+            continue
+        picked[thread_id] = pick_representative(messages, ratio)
+        omitted[thread_id] = len(messages) - len(picked[thread_id])
+
+    if omitted:
+        total = sum(len(messages) for messages in threaded_messages.values())
+        logger.info(f"Extractive stage kept {total - sum(omitted.values())} of {total} messages")
+    return picked, omitted
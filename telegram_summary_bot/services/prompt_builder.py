@@ -0,0 +1,371 @@
+"""
+Fitting chat messages into the model's context window.
+
+Ollama silently drops the start of a prompt that is longer than its context
+window (num_ctx), so the model would summarize a conversation with its
+beginning missing. Prompts are measured with a character heuristic and the
+messages are shrunk until the prompt fits PROMPT_TOKEN_BUDGET:
+
+1. Repeated and forwarded texts are kept once, with a repeat count.
+2. Long messages are trimmed to PROMPT_MAX_MESSAGE_CHARS.
+3. Short low-signal replies ("ok", "👍") are sampled.
+4. Messages are trimmed further, down to PROMPT_MIN_MESSAGE_CHARS.
+5. Messages are thinned evenly over time, always keeping the last one.
+
+Stages 1 and 2 always apply; the others only as far as needed. With
+EXTRACTIVE_SUMMARY set, large threads are first reduced to their most
+representative messages (see extractive.py).
+"""
+
+import os
+import re
+import logging
+from functools import lru_cache
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+from telegram_summary_bot.services.ai_generator import OLLAMA_OPTIONS
+from telegram_summary_bot.services.extractive import EXTRACTIVE_SUMMARY, extract_messages
+from telegram_summary_bot.utils.metrics import PROMPT_CHARS, PROMPT_TOKENS, PROMPT_BUILD_SECONDS
+
+# Characters per token of Latin-script text, measured against the Mistral tokenizer
+CHARS_PER_TOKEN = float(os.environ.get("PROMPT_CHARS_PER_TOKEN", "4"))
+# Characters per token of other scripts and emoji, which split into more tokens
+NON_ASCII_CHARS_PER_TOKEN = float(os.environ.get("PROMPT_NON_ASCII_CHARS_PER_TOKEN", "1.5"))
+# Tokens of the context window left free for the generated summary
+RESPONSE_TOKENS = int(os.environ.get("OLLAMA_RESPONSE_TOKENS", "512"))
+# Tokens a prompt may use
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", str(OLLAMA_OPTIONS["num_ctx"] - RESPONSE_TOKENS)))
+# Longest message kept whole
+MAX_MESSAGE_CHARS = int(os.environ.get("PROMPT_MAX_MESSAGE_CHARS", "600"))
+# Messages are never trimmed below this many characters
+MIN_MESSAGE_CHARS = int(os.environ.get("PROMPT_MIN_MESSAGE_CHARS", "120"))
+# Shorter texts are too generic to treat repeats as forwards
+DUPLICATE_MIN_CHARS = 20
+# Messages with fewer words than this are low-signal
+LOW_SIGNAL_WORDS = 3
+# Tokens of the time, name and line break around each message
+MESSAGE_OVERHEAD_TOKENS = 6
+
+WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=65536)
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens the model splits a text into.
+
+    Args:
+        text (str): The text
+
+    Returns:
+        int: The estimated token count
+    """
+    if text.isascii():
+        return int(len(text) / CHARS_PER_TOKEN) + 1
+    other_chars = sum(1 for char in text if not char.isascii())
+    ascii_chars = len(text) - other_chars
+    return int(ascii_chars / CHARS_PER_TOKEN + other_chars / NON_ASCII_CHARS_PER_TOKEN) + 1
+
+
+def normalize_text(text):
+    """Normalize a text for comparing repeats: case-folded with collapsed whitespace."""
+    return WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def is_low_signal(text):
+    """Check whether a message is a short reply that adds little to a summary."""
+    return len(text.split()) < LOW_SIGNAL_WORDS
+
+
+def trim_text(text, max_chars):
+    """
+    Shorten a text to at most max_chars characters, cutting at a word boundary.
+
+    Args:
+        text (str): The text
+        max_chars (int): The maximum length
+
+    Returns:
+        str: The text, trimmed and ending in "…" if it was too long
+    """
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars - 1]
+    if " " in cut[max_chars // 2:]:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip() + "…"
+
+
+def with_text(msg, text):
+    """Copy a message, a dict or a stored MessageRecord, with different text."""
+    return {
+        "id": msg["id"],
+        "time": msg["time"],
+        "user_id": msg["user_id"],
+        "display_name": msg["display_name"],
+        "text": text
+    }
+
+
+def message_tokens(messages):
+    """Estimate the tokens a list of messages takes up in a prompt."""
+    return sum(estimate_tokens(msg["text"]) + MESSAGE_OVERHEAD_TOKENS for msg in messages)
+
+
+def total_tokens(threaded_messages):
+    """Estimate the tokens all threads' messages take up in a prompt."""
+    return sum(message_tokens(messages) for messages in threaded_messages.values())
+
+
+def drop_repeats(threaded_messages):
+    """
+    Keep only the first copy of texts that were sent more than once.
+
+    Args:
+        threaded_messages (dict): Thread ID -> messages
+
+    Returns:
+        dict: Thread ID -> messages; a kept copy notes how often it was sent
+    """
+    counts = {}
+    for messages in threaded_messages.values():
+        for msg in messages:
+            if len(msg["text"]) >= DUPLICATE_MIN_CHARS:
+                key = normalize_text(msg["text"])
+                counts[key] = counts.get(key, 0) + 1
+
+    seen = set()
+    result = {}
+    for thread_id, messages in threaded_messages.items():
+        kept = []
+        for msg in messages:
+            if len(msg["text"]) < DUPLICATE_MIN_CHARS:
+                kept.append(msg)
+                continue
+            key = normalize_text(msg["text"])
+            if key in seen:
+                continue
+            seen.add(key)
+            if counts[key] > 1:
+                msg = with_text(msg, f"{msg['text']} (sent {counts[key]} times)")
+            kept.append(msg)
+        result[thread_id] = kept
+    return result
+
+
+def trim_messages(threaded_messages, max_chars):
+    """Trim every message to at most max_chars characters."""
+    return {
+        thread_id: [
+            msg if len(msg["text"]) <= max_chars else with_text(msg, trim_text(msg["text"], max_chars))
+            for msg in messages
+        ]
+        for thread_id, messages in threaded_messages.items()
+    }
+
+
+def sample_low_signal(messages, step):
+    """Keep every step-th low-signal message of a thread and all others."""
+    kept = []
+    low_signal_seen = 0
+    for msg in messages:
+        if is_low_signal(msg["text"]):
+            low_signal_seen += 1
+            if (low_signal_seen - 1) % step:
+                continue
+        kept.append(msg)
+    return kept
+
+
+def thin_evenly(messages, step):
+    """Keep every step-th message of a thread, counted back from the last one."""
+    last = len(messages) - 1
+    return [msg for index, msg in enumerate(messages) if (last - index) % step == 0]
+
+
+def fit_messages(threaded_messages, budget):
+    """
+    Shrink messages until they fit in a number of tokens.
+
+    Args:
+        threaded_messages (dict): Thread ID -> messages ordered by time
+        budget (int): Tokens the messages may use
+
+    Returns:
+        tuple: (thread ID -> fitted messages, thread ID -> number of omitted messages)
+    """
+    original_counts = {thread_id: len(messages) for thread_id, messages in threaded_messages.items()}
+    original_tokens = total_tokens(threaded_messages)
+
+    fitted = trim_messages(drop_repeats(threaded_messages), MAX_MESSAGE_CHARS)
+    tokens = total_tokens(fitted)
+
+    unsampled = fitted
+    step = 2
+    while tokens > budget:
+        sampled = {thread_id: sample_low_signal(messages, step) for thread_id, messages in unsampled.items()}
+        sampled_tokens = total_tokens(sampled)
+        if sampled_tokens == tokens:
+            break
+        fitted, tokens = sampled, sampled_tokens
+        step *= 2
+
+    max_chars = MAX_MESSAGE_CHARS // 2
+    while tokens > budget and max_chars >= MIN_MESSAGE_CHARS:
+        fitted = trim_messages(fitted, max_chars)
+        tokens = total_tokens(fitted)
+        max_chars //= 2
+
+    if tokens > budget:
+        # Thin every thread by the same factor so none loses its whole history
+        longest = max(map(len, fitted.values()), default=1)
+        step = max(2, -(-tokens // budget)) if budget > 0 else longest
+        while True:
+            thinned = {thread_id: thin_evenly(messages, step) for thread_id, messages in fitted.items()}
+            thinned_tokens = total_tokens(thinned)
+            if thinned_tokens <= budget or step >= longest:
+                break
+            step += 1
+        fitted, tokens = thinned, thinned_tokens
+
+    omitted = {
+        thread_id: original_counts[thread_id] - len(messages)
+        for thread_id, messages in fitted.items()
+        if original_counts[thread_id] > len(messages)
+    }
+    if tokens < original_tokens:
+        logger.info(f"Fitted messages from ~{original_tokens} to ~{tokens} tokens "
+                    f"(budget {budget}), omitting {sum(omitted.values())} messages")
+    if tokens > budget:
+        logger.warning(f"Messages still take ~{tokens} tokens, over the budget of {budget}")
+    return fitted, omitted
+
+
+def fit_prompt(render, threaded_messages, budget=PROMPT_TOKEN_BUDGET, kind="summary"):
+    """
+    Render a prompt with its messages shrunk to fit the token budget.
+
+    Args:
+        render: Called with (thread ID -> messages, thread ID -> omitted count)
+            and returns the prompt; called once without messages to measure
+            the fixed part of the prompt
+        threaded_messages (dict): Thread ID -> messages ordered by time
+        budget (int): Tokens the whole prompt may use
+        kind (str): The kind of prompt, for the metrics
+
+    Returns:
+        str: The prompt
+    """
+    with PROMPT_BUILD_SECONDS.time(kind=kind):
+        prompt = _fit_prompt(render, threaded_messages, budget)
+    observe_prompt(prompt, kind)
+    return prompt
+
+
+def observe_prompt(prompt, kind):
+    """Record the size of a prompt in the metrics."""
+    PROMPT_CHARS.observe(len(prompt), kind=kind)
+    # Bypass the cache; whole prompts would only evict message texts
+    PROMPT_TOKENS.observe(estimate_tokens.__wrapped__(prompt), kind=kind)
+
+
+def _fit_prompt(render, threaded_messages, budget):
+    fixed_tokens = estimate_tokens(render({thread_id: [] for thread_id in threaded_messages}, {}))
+    if fixed_tokens >= budget:
+        logger.warning(f"Prompt takes ~{fixed_tokens} tokens without any messages, over the budget of {budget}")
+
+    fitted, omitted = shrink_messages(threaded_messages, budget - fixed_tokens)
+    return render(fitted, omitted)
+
+
+def shrink_messages(threaded_messages, budget):
+    """
+    Shrink messages to fit in a number of tokens, first reducing large threads
+    to their most representative messages when EXTRACTIVE_SUMMARY is set.
+
+    Args:
+        threaded_messages (dict): Thread ID -> messages ordered by time
+        budget (int): Tokens the messages may use
+
+    Returns:
+        tuple: (thread ID -> fitted messages, thread ID -> number of omitted messages)
+    """
+    extracted = {}
+    if EXTRACTIVE_SUMMARY:
+        threaded_messages, extracted = extract_messages(threaded_messages)
+
+    fitted, omitted = fit_messages(threaded_messages, budget)
+    for thread_id, count in extracted.items():
+        omitted[thread_id] = omitted.get(thread_id, 0) + count
+    return fitted, omitted
+
+
+def trim_sections(render, sections, budget):
+    """
+    Trim the longest texts of labelled sections to fit the budget.
+
+    Returns:
+        list: The sections' texts, trimmed where needed
+    """
+    available = budget - estimate_tokens(render([(label, "") for label, _text in sections]))
+    sizes = [estimate_tokens(text) for _label, text in sections]
+
+    texts = [text for _label, text in sections]
+    remaining = available
+    by_size = sorted(range(len(sections)), key=sizes.__getitem__)
+    for position, index in enumerate(by_size):
+        share = max(remaining // (len(sections) - position), 0)
+        if sizes[index] > share:
+            chars_per_token = len(texts[index]) / sizes[index]
+            texts[index] = trim_text(texts[index], max(int(share * chars_per_token), MIN_MESSAGE_CHARS))
+            sizes[index] = estimate_tokens(texts[index])
+        remaining -= sizes[index]
+    return texts
+
+
+def fit_sections(render, sections, budget=PROMPT_TOKEN_BUDGET, kind="period", drop_oldest=False):
+    """
+    Render a prompt of labelled texts, such as daily summaries, trimming the longest to fit the budget.
+
+    Every text gets an equal share of the budget; texts shorter than their
+    share pass the rest on to the longer ones. Texts are never trimmed below
+    PROMPT_MIN_MESSAGE_CHARS, so with drop_oldest the first sections are left
+    out as well, as few as possible, when trimming alone is not enough.
+
+    Args:
+        render: Called with a list of (label, text) pairs and returns the prompt
+        sections (list): (label, text) pairs, oldest first
+        budget (int): Tokens the whole prompt may use
+        kind (str): The kind of prompt, for the metrics
+        drop_oldest (bool): Leave out the oldest sections if the trimmed prompt is still too long
+
+    Returns:
+        str: The prompt
+    """
+    def attempt(dropped):
+        kept = sections[dropped:]
+        texts = trim_sections(render, kept, budget)
+        prompt = render([(label, text) for (label, _text), text in zip(kept, texts)])
+        # Bypass the cache; whole prompts would only evict message texts
+        return prompt, estimate_tokens.__wrapped__(prompt)
+
+    with PROMPT_BUILD_SECONDS.time(kind=kind):
+        prompt, tokens = attempt(0)
+        if drop_oldest and tokens > budget and len(sections) > 1:
+            # Binary search for the fewest sections to leave out
+            low, high = 1, len(sections) - 1
+            prompt, tokens = attempt(high)
+            while low < high:
+                middle = (low + high) // 2
+                candidate, candidate_tokens = attempt(middle)
+                if candidate_tokens <= budget:
+                    prompt, tokens, high = candidate, candidate_tokens, middle
+                else:
+                    low = middle + 1
+
+    if tokens > budget:
+        logger.warning(f"Prompt with {len(sections)} sections takes ~{tokens} tokens, over the budget of {budget}")
+    observe_prompt(prompt, kind)
+    return prompt
@@ -1,82 +1,443 @@
 """
 Scheduler service for running periodic tasks.
+
+Jobs run as tasks on the application's event loop, so they share the bot's
+HTTP connection pool and the Ollama client with the update handlers. Cron
+jobs record their last run in the database and run once on startup when a
+run was missed while the bot was down. Every registered chat gets its own
+summary job on its own schedule, and optionally weekly and monthly ones
+built from the daily summaries stored each night. Each scheduled summary is pre-warmed
+SUMMARY_PREWARM_MINUTES ahead, so at the deadline only the late messages
+remain to be summarized.
+
+When several workers share the database, only the one holding the
+scheduler lease runs the jobs that post or write; every worker keeps
+syncing its caches with the changes the others make.
 """
 
-import threading
-import schedule
-import time
+import os
+import random
 import asyncio
 import logging
 from datetime import datetime, timedelta
 
-from telegram_summary_bot.config import TEHRAN_TZ, GROUP_CHAT_ID, ACTUAL_GROUP_CHAT_ID
+import pytz
+
+from telegram_summary_bot.config import TEHRAN_TZ
 
 # Get the logger from the config module
 logger = logging.getLogger("telegram_summary_bot.config")
 
-from telegram_summary_bot.utils.storage import get_messages_in_range
-from telegram_summary_bot.services.summarizer import summarize_messages
+from telegram_summary_bot.services.summarizer import (
+    prewarm_summary, summarize_prewarmed_async, summarize_period_async, persist_daily_summary, local_midnight,
+    SUMMARY_PERIODS
+)
+from telegram_summary_bot.services.chunk_summarizer import (
+    refresh_chunk_summaries, CHUNK_REFRESH_MINUTES, TICK_CHUNK_LIMIT
+)
+from telegram_summary_bot.utils.cron import CronSchedule
+from telegram_summary_bot.utils.chat_registry import chats, is_monitored_chat, get_summary_cron
+from telegram_summary_bot.utils.executors import run_db
+from telegram_summary_bot.utils.storage import sync_shared_caches
+from telegram_summary_bot.utils.migrations import ensure_message_partitions
+from telegram_summary_bot.utils.database import (
+    DB_PARTITIONING, get_last_job_run, record_job_run, get_daily_summaries, get_window_fingerprint
+)
+from telegram_summary_bot.utils.retention import RETENTION_DAYS, RETENTION_CRON, apply_retention
+
+# Random delay added to every run so jobs do not fire in lockstep
+SCHEDULER_JITTER_SECONDS = float(os.environ.get("SCHEDULER_JITTER_SECONDS", "30"))
+# Missed runs older than this are skipped instead of caught up
+SCHEDULER_CATCHUP_HOURS = float(os.environ.get("SCHEDULER_CATCHUP_HOURS", "6"))
+# Minutes before each scheduled summary to generate its bulk; 0 disables pre-warming
+SUMMARY_PREWARM_MINUTES = float(os.environ.get("SUMMARY_PREWARM_MINUTES", "30"))
+# Length of the range covered by a scheduled summary
+SUMMARY_WINDOW = timedelta(hours=24)
+# When the previous day's summary of every chat is stored, for the weekly and monthly summaries
+DAILY_SUMMARY_CRON = os.environ.get("DAILY_SUMMARY_CRON", "10 0 * * *")
+# Older days of the last month without a stored summary that each daily run fills in
+DAILY_SUMMARY_BACKFILL = int(os.environ.get("DAILY_SUMMARY_BACKFILL_DAYS", "3"))
+# When weekly and monthly summaries are posted; empty disables them
+PERIOD_SUMMARY_CRONS = {
+    "week": os.environ.get("WEEKLY_SUMMARY_CRON", ""),
+    "month": os.environ.get("MONTHLY_SUMMARY_CRON", "")
+}
+# Seconds between checks for cache changes made by other workers; 0 disables
+CACHE_SYNC_SECONDS = float(os.environ.get("CACHE_SYNC_SECONDS", "30"))
+
+
+class ScheduledJob:
+    """A coroutine function run on a cron schedule or at a fixed interval."""
+
+    def __init__(self, name, func, cron=None, interval=None, jitter=SCHEDULER_JITTER_SECONDS, catch_up=False,
+                 offset=timedelta(0), leader_only=True):
+        """
+        Args:
+            name (str): Unique job name, also the key of its recorded runs
+            func: Zero-argument coroutine function to run
+            cron (CronSchedule): When to run; mutually exclusive with interval
+            interval (float): Seconds between runs
+            jitter (float): Maximum random delay added to each run in seconds
+            catch_up (bool): Whether a run missed while stopped is made up on start
+            offset (timedelta): Shift applied to every cron time, e.g. negative to run ahead of it
+            leader_only (bool): Whether only the leader worker runs the job
+        """
+        if (cron is None) == (interval is None):
+            raise ValueError(f"Job {name} needs either a cron schedule or an interval")
+        self.name = name
+        self.func = func
+        self.cron = cron
+        self.interval = interval
+        self.jitter = jitter
+        self.catch_up = catch_up
+        self.offset = offset
+        self.leader_only = leader_only
+
+    def next_run(self, now):
+        """Get the next time the job is due after now, without jitter."""
+        if self.cron is not None:
+            return self.cron.next_after(now - self.offset) + self.offset
+        return now + timedelta(seconds=self.interval)
+
+
+class AsyncScheduler:
+    """Runs scheduled jobs as tasks on the running event loop."""
+
+    def __init__(self, leader=None):
+        """
+        Args:
+            leader (LeaderElection): Gates the leader-only jobs; None runs every job
+        """
+        self._leader = leader
+        self._jobs = []
+        self._tasks = []
+        self._started = False
+
+    @property
+    def jobs(self):
+        """The registered jobs."""
+        return list(self._jobs)
+
+    def has_job(self, name):
+        """Check whether a job with the given name is registered."""
+        return any(job.name == name for job in self._jobs)
+
+    def _add(self, job):
+        """Register a job, starting it right away if the scheduler is running."""
+        self._jobs.append(job)
+        if self._started:
+            self._tasks.append(asyncio.create_task(self._run_job(job), name=f"scheduler:{job.name}"))
+        return job
+
+    def add_cron_job(self, name, expression, func, tz=TEHRAN_TZ, jitter=SCHEDULER_JITTER_SECONDS, catch_up=True,
+                     offset=timedelta(0), leader_only=True):
+        """
+        Run a job on a cron schedule.
+
+        Args:
+            name (str): Unique job name
+            expression (str): Five-field cron expression
+            func: Zero-argument coroutine function to run
+            tz: Timezone the expression is evaluated in
+            jitter (float): Maximum random delay added to each run in seconds
+            catch_up (bool): Whether a run missed while stopped is made up on start
+            offset (timedelta): Shift applied to every cron time
+            leader_only (bool): Whether only the leader worker runs the job
+
+        Returns:
+            ScheduledJob: The registered job
+        """
+        return self._add(ScheduledJob(
+            name, func, cron=CronSchedule(expression, tz), jitter=jitter, catch_up=catch_up, offset=offset,
+            leader_only=leader_only
+        ))
+
+    def add_interval_job(self, name, seconds, func, jitter=SCHEDULER_JITTER_SECONDS, leader_only=True):
+        """
+        Run a job every given number of seconds.
+
+        Args:
+            name (str): Unique job name
+            seconds (float): Seconds between runs
+            func: Zero-argument coroutine function to run
+            jitter (float): Maximum random delay added to each run in seconds
+            leader_only (bool): Whether only the leader worker runs the job
+
+        Returns:
+            ScheduledJob: The registered job
+        """
+        return self._add(ScheduledJob(name, func, interval=seconds, jitter=jitter, leader_only=leader_only))
+
+    def start(self):
+        """Start a task per job on the running event loop."""
+        self._started = True
+        for job in self._jobs:
+            self._tasks.append(asyncio.create_task(self._run_job(job), name=f"scheduler:{job.name}"))
+        logger.info(f"Scheduler started with {len(self._jobs)} jobs")
+
+    async def stop(self):
+        """Cancel all job tasks and wait for them to finish."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._started = False
+        logger.info("Scheduler stopped")
+
+    def _may_run(self, job):
+        """Check whether this worker runs the job now."""
+        return not job.leader_only or self._leader is None or self._leader.is_leader
+
+    async def _missed_run(self, job, now):
+        """Get the run missed since the job last completed, or None."""
+        last_run = await run_db(get_last_job_run, job.name)
+        if last_run is None:
+            # First start: remember it, so runs missed from now on are noticed
+            await run_db(record_job_run, job.name, now.astimezone(pytz.utc).replace(tzinfo=None))
+            return None
+
+        missed = job.next_run(pytz.utc.localize(last_run))
+        if missed > now:
+            return None
+        if now - missed > timedelta(hours=SCHEDULER_CATCHUP_HOURS):
+            logger.info(f"Skipping run of {job.name} missed at {missed}, too old to catch up")
+            return None
+        return missed
 
+    async def _run_job(self, job):
+        """Wait for each due time of a job and run it."""
+        if job.catch_up and self._may_run(job):
+            missed = await self._missed_run(job, datetime.now(TEHRAN_TZ))
+            if missed is not None:
+                logger.info(f"Catching up on run of {job.name} missed at {missed}")
+                await self._execute(job)
 
-async def scheduled_summary(bot):
+        due = None
+        while True:
+            now = datetime.now(TEHRAN_TZ)
+            # The clock may read slightly before the last due time after waking up
+            due = job.next_run(max(now, due) if due else now)
+            delay = (due - now).total_seconds() + random.uniform(0, job.jitter)
+            await asyncio.sleep(delay)
+            await self._execute(job)
+
+    async def _execute(self, job):
+        """Run a job once, logging instead of raising its errors."""
+        if not self._may_run(job):
+            return
+
+        started = datetime.now(TEHRAN_TZ)
+        try:
+            await job.func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Scheduled job {job.name} failed: {e}")
+            return
+
+        if job.catch_up:
+            await run_db(record_job_run, job.name, started.astimezone(pytz.utc).replace(tzinfo=None))
+
+
+async def scheduled_summary(bot, name, chat_id):
     """
-    Generate and send a scheduled summary.
-    
+    Generate and send a chat's scheduled summary.
+
     Args:
         bot: The Telegram bot instance
+        name (str): The job's name, under which its pre-warmed summary is stored
+        chat_id (int): The chat to summarize and send the summary to
     """
+    if not is_monitored_chat(chat_id):
+        logger.info(f"Skipping scheduled summary of disabled chat {chat_id}")
+        return
+
     now = datetime.now(TEHRAN_TZ)
-    start = now - timedelta(hours=24)
+    start = now - SUMMARY_WINDOW
     end = now
-    messages = get_messages_in_range(start, end)
-    
-    if not any(messages.values()):
-        logger.info("No messages to summarize in scheduled summary")
+    summary = await summarize_prewarmed_async(name, start, end, chat_id)
+
+    if summary is None:
+        logger.info(f"No messages to summarize in scheduled summary of chat {chat_id}")
         return
-    
-    summary = summarize_messages(messages)
-    
+
     # Format the summary with emojis and formatting
     formatted_summary = f"📊 Daily Summary:\n\n{summary}"
-    
-    # Try sending to both chat IDs to ensure delivery
-    sent = False
-    for chat_id in [GROUP_CHAT_ID, ACTUAL_GROUP_CHAT_ID]:
+
+    try:
+        await bot.send_message(chat_id=chat_id, text=formatted_summary)
+        logger.info(f"Successfully sent daily summary to chat {chat_id}")
+    except Exception as e:
+        logger.error(f"Failed to send daily summary to chat {chat_id}: {e}")
+
+
+async def scheduled_period_summary(bot, chat_id, period):
+    """
+    Generate and send a chat's scheduled weekly or monthly summary.
+
+    Args:
+        bot: The Telegram bot instance
+        chat_id (int): The chat to summarize and send the summary to
+        period (str): "week" or "month"
+    """
+    if not is_monitored_chat(chat_id):
+        return
+
+    days = SUMMARY_PERIODS[period]
+    summary = await summarize_period_async(days, datetime.now(TEHRAN_TZ), chat_id)
+    if summary is None:
+        logger.info(f"Nothing to summarize in the {period}ly summary of chat {chat_id}")
+        return
+
+    try:
+        await bot.send_message(chat_id=chat_id, text=f"📊 Summary of the last {days} days:\n\n{summary}"[:4096])
+        logger.info(f"Successfully sent {period}ly summary to chat {chat_id}")
+    except Exception as e:
+        logger.error(f"Failed to send {period}ly summary to chat {chat_id}: {e}")
+
+
+async def store_daily_summaries():
+    """
+    Store yesterday's summary of every chat, the input of its weekly and monthly summaries.
+
+    Up to DAILY_SUMMARY_BACKFILL older days of the last month that have
+    messages but no stored summary, e.g. from before an upgrade, are stored
+    as well, newest first, so a backlog is worked off over several nights.
+    """
+    today = local_midnight(datetime.now(TEHRAN_TZ))
+    longest = max(SUMMARY_PERIODS.values())
+    for chat_id in [chat_id for chat_id in chats if is_monitored_chat(chat_id)]:
+        try:
+            await persist_daily_summary(today - timedelta(days=1), chat_id)
+
+            stored = await run_db(get_daily_summaries, today - timedelta(days=longest), today, chat_id)
+            attempts = 0
+            for offset in range(2, longest + 1):
+                if attempts >= DAILY_SUMMARY_BACKFILL:
+                    break
+                day = today - timedelta(days=offset)
+                if day in stored or not await run_db(get_window_fingerprint, day, day + timedelta(days=1), chat_id):
+                    continue
+                attempts += 1
+                await persist_daily_summary(day, chat_id)
+        except Exception as e:
+            logger.error(f"Failed to store daily summary of chat {chat_id}: {e}")
+
+
+async def prewarm_scheduled_summary(name, expression, chat_id):
+    """
+    Generate the bulk of a chat's scheduled summary ahead of its next run.
+
+    Args:
+        name (str): The summary job's name
+        expression (str): The summary job's cron expression
+        chat_id (int): The chat to summarize
+    """
+    if not is_monitored_chat(chat_id):
+        return
+
+    now = datetime.now(TEHRAN_TZ)
+    due = CronSchedule(expression, TEHRAN_TZ).next_after(now)
+    await prewarm_summary(name, due - SUMMARY_WINDOW, now, chat_id)
+
+
+async def refresh_chunks():
+    """
+    Summarize the buckets of the last 24 hours that have closed since the last tick.
+
+    Chats are refreshed side by side, each generation taking a summary job
+    slot, so chats take turns with each other and with user requests, and
+    each chat summarizes at most TICK_CHUNK_LIMIT buckets per tick.
+    """
+    now = datetime.now(TEHRAN_TZ)
+
+    async def refresh(chat_id):
         try:
-            await bot.send_message(chat_id=chat_id, text=formatted_summary)
-            logger.info(f"Successfully sent daily summary to chat {chat_id}")
-            sent = True
+            await refresh_chunk_summaries(
+                now - timedelta(hours=24), now, chat_id, max_generations=TICK_CHUNK_LIMIT, use_job_slots=True
+            )
         except Exception as e:
-            logger.error(f"Failed to send daily summary to chat {chat_id}: {e}")
-    
-    if not sent:
-        logger.error("Failed to send daily summary to any chat")
+            logger.error(f"Failed to refresh chunk summaries of chat {chat_id}: {e}")
+
+    await asyncio.gather(*(refresh(chat_id) for chat_id in chats if is_monitored_chat(chat_id)))
+
+
+async def maintain_partitions():
+    """Create upcoming message partitions before they are needed."""
+    await run_db(ensure_message_partitions)
+
+
+async def sync_caches(scheduler, bot):
+    """Pick up chats, members and threads changed by other workers, scheduling any new chats."""
+    changed = await run_db(sync_shared_caches)
+    if "chats" in changed:
+        for chat_id in list(chats):
+            schedule_chat(scheduler, bot, chat_id)
+
+
+def schedule_chat(scheduler, bot, chat_id):
+    """
+    Add the summary jobs of a chat, unless it already has them.
+
+    Args:
+        scheduler (AsyncScheduler): The scheduler
+        bot: The application's bot
+        chat_id (int): The chat to schedule summaries for
+    """
+    name = f"summary:{chat_id}"
+    if scheduler.has_job(name):
+        return
 
+    expression = get_summary_cron(chat_id)
+    scheduler.add_cron_job(name, expression, lambda: scheduled_summary(bot, name, chat_id))
+    if SUMMARY_PREWARM_MINUTES > 0:
+        # Summarize most of the day ahead of time so the post only has to fold in the last messages
+        scheduler.add_cron_job(
+            f"prewarm:{name}", expression, lambda: prewarm_scheduled_summary(name, expression, chat_id),
+            catch_up=False, offset=-timedelta(minutes=SUMMARY_PREWARM_MINUTES)
+        )
 
-# Helper function to run the async scheduled_summary function
-def run_scheduled_summary(bot):
-    """Run the scheduled summary task."""
-    asyncio.run(scheduled_summary(bot))
+    for period, period_expression in PERIOD_SUMMARY_CRONS.items():
+        if period_expression:
+            scheduler.add_cron_job(
+                f"summary-{period}:{chat_id}", period_expression,
+                lambda period=period: scheduled_period_summary(bot, chat_id, period)
+            )
 
 
-def setup_scheduler(bot):
+def setup_scheduler(bot, leader=None):
     """
     Set up the scheduler to run tasks periodically.
-    
+
     Args:
-        bot: The Telegram bot instance
+        bot: The application's bot, whose connection pool the jobs reuse
+        leader (LeaderElection): Decides whether this worker runs the leader-only jobs
+
+    Returns:
+        AsyncScheduler: The scheduler; call start() from the running event loop
     """
-    # Configure the scheduled task
-    schedule.every().day.at("20:25").do(lambda: run_scheduled_summary(bot))  # UTC 20:25 = 23:55 Tehran time
-    
-    # Function to run the scheduler in a background thread
-    def schedule_task():
-        while True:
-            schedule.run_pending()
-            threading.Event().wait(30)
-    
-    # Start the scheduler thread
-    scheduler_thread = threading.Thread(target=schedule_task, daemon=True)
-    scheduler_thread.start()
-    
-    return scheduler_thread 
\ No newline at end of file
+    scheduler = AsyncScheduler(leader)
+
+    for chat_id in list(chats):
+        schedule_chat(scheduler, bot, chat_id)
+
+    # Store each day's summary so weekly and monthly summaries never re-read the messages
+    if DAILY_SUMMARY_CRON:
+        scheduler.add_cron_job("daily_summaries", DAILY_SUMMARY_CRON, store_daily_summaries)
+
+    # Keep chunk summaries current so the daily summary only has to combine them
+    scheduler.add_interval_job("chunk_refresh", CHUNK_REFRESH_MINUTES * 60, refresh_chunks)
+
+    if DB_PARTITIONING:
+        scheduler.add_cron_job("partitions", "0 3 * * *", maintain_partitions)
+
+    # Archive and roll up old messages so the messages table stays small
+    if RETENTION_DAYS > 0:
+        scheduler.add_cron_job("retention", RETENTION_CRON, apply_retention)
+
+    if CACHE_SYNC_SECONDS > 0:
+        scheduler.add_interval_job(
+            "cache_sync", CACHE_SYNC_SECONDS, lambda: sync_caches(scheduler, bot), jitter=0, leader_only=False
+        )
+
+    return scheduler
@@ -2,82 +2,120 @@
 Message summarization service.
 """
 
+import os
+import json
+import hashlib
 import logging
+from datetime import datetime, timedelta
+
+from telegram_summary_bot.config import DEFAULT_CHAT_ID
 
 # Get the logger from the config module
 logger = logging.getLogger("telegram_summary_bot.config")
 
-from telegram_summary_bot.utils.storage import group_members, thread_titles
-from telegram_summary_bot.services.ai_generator import generate_with_ollama
+from telegram_summary_bot.utils.storage import get_messages_in_range, get_window_fingerprint
+from telegram_summary_bot.utils.chat_registry import get_chat_members
+from telegram_summary_bot.utils.database import (
+    get_chunk_summaries, get_cached_summary, save_cached_summary, get_daily_summaries, save_daily_summary,
+    to_stored_time
+)
+from telegram_summary_bot.services.ai_generator import (
+    generate_with_ollama, generate_with_ollama_async, generate_simple_summary,
+    MODEL_NAME, OLLAMA_OPTIONS, TRUNCATED_NOTE
+)
+from telegram_summary_bot.services.chunk_summarizer import (
+    refresh_chunk_summaries, bucket_start, INLINE_CHUNK_LIMIT, get_thread_title, format_message_lines
+)
+from telegram_summary_bot.services.summary_jobs import get_summary_jobs
+from telegram_summary_bot.services.prompt_builder import (
+    fit_prompt, fit_sections, shrink_messages, trim_text, PROMPT_TOKEN_BUDGET
+)
+from telegram_summary_bot.services.extractive import pick_representative
+from telegram_summary_bot.utils.executors import run_db, run_generation
+from telegram_summary_bot.utils.metrics import SUMMARY_CACHE_LOOKUPS
+
+# How long a generated summary is reused for an unchanged message window
+SUMMARY_CACHE_TTL = int(os.environ.get("SUMMARY_CACHE_TTL_SECONDS", "1800"))
+# How long a pre-warmed summary stays usable for its scheduled run
+PREWARM_TTL = int(os.environ.get("SUMMARY_PREWARM_TTL_SECONDS", "7200"))
+# Days covered by each kind of summary
+SUMMARY_PERIODS = {"day": 1, "week": 7, "month": 30}
+# Daily summaries combined in one prompt; longer periods combine each calendar week's first
+PERIOD_GROUP_DAYS = 7
+# Stands in for a day whose summary has not been stored
+NO_DAILY_SUMMARY = "No summary available."
+# Combined summaries of closed days never change, so they are reused for a whole month
+PERIOD_CACHE_TTL = 35 * 24 * 3600
+# Characters of each daily summary shown when the model is unavailable
+FALLBACK_SECTION_CHARS = 400
+# Messages quoted per member and topic when the model is unavailable
+FALLBACK_MESSAGES_PER_USER = 2
+FALLBACK_MESSAGE_CHARS = 200
 
 
-def summarize_messages(threaded_messages):
+def build_summary_prompt(threaded_messages, chat_id=DEFAULT_CHAT_ID):
     """
-    Summarize messages from different threads.
+    Build the summarization prompt for messages from different threads.
+    
+    Members who did not write in a thread are listed on one line, and the
+    messages are shrunk to fit the prompt token budget.
     
     Args:
         threaded_messages (dict): A dictionary of thread IDs to message lists
+        chat_id (int): The chat the messages come from
         
     Returns:
-        str: The generated summary
+        str: The prompt to send to the model
     """
-    if not threaded_messages:
-        return "No messages in the selected timeframe."
-
+    group_members = get_chat_members(chat_id)
     member_list = ", ".join(group_members.values())
-    prompt_sections = []
-
-    for thread_id, messages in threaded_messages.items():
-        # Group messages by user for this thread
-        user_messages = {}
-        # Initialize with all group members to ensure everyone is included
-        for user_id, display_name in group_members.items():
-            user_messages[user_id] = []
-        
-        # Now add the actual messages
-        for msg in messages:
-            user_id = str(msg["user_id"])  # Ensure user_id is a string to match group_members keys
-            if user_id in user_messages:
-                user_messages[user_id].append(msg)
-            else:
-                # Handle messages from users not in group_members
-                user_messages[user_id] = [msg]
-        
-        # Format messages by user
-        user_conversations = []
-        for user_id, msgs in user_messages.items():
-            display_name = group_members.get(user_id, "Unknown User")
-            if msgs:
+    
+    def render(fitted_messages, omitted):
+        prompt_sections = []
+        
+        for thread_id, messages in fitted_messages.items():
+            # Group messages by user for this thread
+            user_messages = {}
+            for msg in messages:
+                user_id = str(msg["user_id"])  # Ensure user_id is a string to match group_members keys
+                user_messages.setdefault(user_id, []).append(msg)
+            
+            # Format messages by user
+            user_conversations = []
+            for user_id, msgs in user_messages.items():
+                display_name = group_members.get(user_id, "Unknown User")
                 messages_text = "\n".join([
                     f"[{m['time'].strftime('%H:%M')}]: {m['text']}"
                     for m in msgs
                 ])
                 user_conversations.append(f"{display_name}:\n{messages_text}")
-            else:
-                user_conversations.append(f"{display_name}: No messages in this timeframe.")
+            
+            # One line for everyone who stayed silent instead of a line each
+            silent = [name for user_id, name in group_members.items() if user_id not in user_messages]
+            if silent:
+                user_conversations.append(f"Did not participate: {', '.join(silent)}")
+            if omitted.get(thread_id):
+                user_conversations.append(f"({omitted[thread_id]} more messages left out for length)")
+            
+            conversation = "\n\n".join(user_conversations)
+            thread_title = get_thread_title(thread_id, chat_id)
+            
+            prompt_sections.append(
+                f"[Topic: {thread_title}]\n"
+                f"Messages:\n{conversation}"
+            )
         
-        conversation = "\n\n".join(user_conversations)
-        thread_title = thread_titles.get(thread_id, f"Thread {thread_id}")
-        if thread_id == 0 and thread_title == "Thread 0":
-            thread_title = "Main Group Chat"
-
-        prompt_sections.append(
-            f"[Topic: {thread_title}]\n"
-            f"Messages:\n{conversation}"
-        )
-
-    # If there's only one section and it's the main group chat, simplify the prompt
-    if len(prompt_sections) == 1 and "Main Group Chat" in prompt_sections[0]:
-        full_prompt = (
-            "These are chat messages from a Telegram group.\n\n"
-            "For each member of the group:\n\n"
-            "- If they spoke in the chat, summarize their messages.\n"
-            "- If they didn't speak, write: 'Did not participate.'\n\n"
-            f"Group members: {member_list}\n\n"
-            + prompt_sections[0]
-        )
-    else:
-        full_prompt = (
+        # If there's only one section and it's the main group chat, simplify the prompt
+        if len(prompt_sections) == 1 and "Main Group Chat" in prompt_sections[0]:
+            return (
+                "These are chat messages from a Telegram group.\n\n"
+                "For each member of the group:\n\n"
+                "- If they spoke in the chat, summarize their messages.\n"
+                "- If they didn't speak, write: 'Did not participate.'\n\n"
+                f"Group members: {member_list}\n\n"
+                + prompt_sections[0]
+            )
+        return (
             "These are categorized chat messages from a Telegram group.\n\n"
             "For each topic, list all group members by name. For each member:\n\n"
             "- If they spoke in that topic, summarize their message.\n"
@@ -86,6 +124,603 @@ def summarize_messages(threaded_messages):
             + "\n".join(prompt_sections)
         )
     
+    return fit_prompt(render, threaded_messages)
+
+
+def summarize_messages(threaded_messages, chat_id=DEFAULT_CHAT_ID):
+    """
+    Summarize messages from different threads.
+    
+    Args:
+        threaded_messages (dict): A dictionary of thread IDs to message lists
+        chat_id (int): The chat the messages come from
+        
+    Returns:
+        str: The generated summary
+    """
+    if not threaded_messages:
+        return "No messages in the selected timeframe."
+    
     # Use Ollama directly
     logger.info("Generating summary using Ollama")
-    return generate_with_ollama(full_prompt) 
\ No newline at end of file
+    return generate_with_ollama(build_summary_prompt(threaded_messages, chat_id))
+
+
+async def summarize_messages_async(threaded_messages, fallback=generate_simple_summary, on_progress=None,
+                                   chat_id=DEFAULT_CHAT_ID):
+    """
+    Summarize messages from different threads without blocking the event loop.
+    
+    Args:
+        threaded_messages (dict): A dictionary of thread IDs to message lists
+        fallback: Called with the prompt if generation fails
+        on_progress: Optional coroutine function called with the partial summary
+        chat_id (int): The chat the messages come from
+        
+    Returns:
+        str: The generated summary
+    """
+    if not threaded_messages:
+        return "No messages in the selected timeframe."
+    
+    logger.info("Generating summary using Ollama")
+    prompt = await run_generation(build_summary_prompt, threaded_messages, chat_id)
+    return await generate_with_ollama_async(prompt, fallback=fallback, on_progress=on_progress)
+
+
+def build_reduce_prompt(chunk_summaries, tail_messages, chat_id=DEFAULT_CHAT_ID):
+    """
+    Build the prompt that combines chunk summaries into one summary.
+    
+    The raw tail may use up to half of the token budget and the chunk
+    summaries share the rest: they are trimmed evenly and, when a long day
+    still does not fit, the oldest are left out.
+    
+    Args:
+        chunk_summaries (list): Stored chunk summaries, ordered by thread and window
+        tail_messages (dict): Thread ID -> messages not yet covered by a chunk
+        chat_id (int): The chat being summarized
+        
+    Returns:
+        str: The prompt to send to the model
+    """
+    member_list = ", ".join(get_chat_members(chat_id).values())
+    tail_messages, omitted = shrink_messages(tail_messages, PROMPT_TOKEN_BUDGET // 2)
+    thread_order = list(dict.fromkeys([chunk["thread_id"] for chunk in chunk_summaries] + list(tail_messages)))
+    
+    def render(fitted_chunks):
+        sections = {thread_id: [] for thread_id in thread_order}
+        for chunk, summary in fitted_chunks:
+            sections[chunk["thread_id"]].append(
+                f"{chunk['window_start'].strftime('%H:%M')}-{chunk['window_end'].strftime('%H:%M')}: {summary.strip()}"
+            )
+        for thread_id, messages in tail_messages.items():
+            if messages:
+                sections[thread_id].append(
+                    "Unsummarized messages:\n" + format_message_lines(messages, omitted.get(thread_id, 0))
+                )
+        
+        prompt_sections = [
+            f"[Topic: {get_thread_title(thread_id, chat_id)}]\n" + "\n".join(parts)
+            for thread_id, parts in sections.items()
+            if parts
+        ]
+        left_out = len(chunk_summaries) - len(fitted_chunks)
+        
+        return (
+            "These are partial summaries of a Telegram group's conversation, grouped by topic and time, "
+            "followed by messages that have not been summarized yet.\n\n"
+            "Combine them into one summary. For each topic, list all group members by name. For each member:\n\n"
+            "- If they spoke in that topic, summarize what they said.\n"
+            "- If they didn't speak, write: 'Did not participate.'\n\n"
+            f"Group members: {member_list}\n\n"
+            + (f"({left_out} earlier partial summaries left out for length)\n\n" if left_out else "")
+            + "\n\n".join(prompt_sections)
+        )
+    
+    # Oldest first, so the summaries left out for length are the earliest of the day
+    sections = sorted(((chunk, chunk["summary"]) for chunk in chunk_summaries), key=lambda s: s[0]["window_start"])
+    return fit_sections(render, sections, kind="reduce", drop_oldest=True)
+
+
+def build_extractive_summary(threaded_messages, chat_id=DEFAULT_CHAT_ID, chunk_summaries=()):
+    """
+    Build a summary without the model, for when it is unavailable.
+    
+    Each topic shows its stored chunk summaries followed by the most
+    representative messages of every member who wrote in it.
+    
+    Args:
+        threaded_messages (dict): Thread ID -> messages not covered by a chunk summary
+        chat_id (int): The chat being summarized
+        chunk_summaries (list): Stored chunk summaries, ordered by thread and window
+        
+    Returns:
+        str: The summary
+    """
+    group_members = get_chat_members(chat_id)
+    
+    sections = {}
+    for chunk in chunk_summaries:
+        sections.setdefault(chunk["thread_id"], []).append(
+            f"{chunk['window_start'].strftime('%H:%M')}-{chunk['window_end'].strftime('%H:%M')}: {chunk['summary'].strip()}"
+        )
+    for thread_id, messages in threaded_messages.items():
+        picked = pick_representative(messages, max_per_user=FALLBACK_MESSAGES_PER_USER)
+        quotes = {}
+        for msg in picked:
+            name = group_members.get(str(msg["user_id"])) or msg.get("display_name") or "Unknown User"
+            quotes.setdefault(name, []).append(trim_text(msg["text"], FALLBACK_MESSAGE_CHARS))
+        if quotes:
+            sections.setdefault(thread_id, []).extend(
+                f"- {name}: {' / '.join(texts)}" for name, texts in quotes.items()
+            )
+    
+    lines = ["⚠️ AI Summary unavailable - most representative messages instead:"]
+    for thread_id, parts in sections.items():
+        lines.append("")
+        lines.append(f"[Topic: {get_thread_title(thread_id, chat_id)}]")
+        lines.extend(parts)
+    return "\n".join(lines)
+
+
+def summary_cache_key(fingerprint, kind="range", chat_id=None):
+    """
+    Build the cache key for a summary.
+    
+    Args:
+        fingerprint (list): Per-thread (thread_id, count, max id, max timestamp) tuples
+        kind (str): The kind of summary, so different prompts never share entries
+        chat_id (int): The chat summarized, so chats never share entries
+        
+    Returns:
+        str: A hex SHA-256 digest of everything that determines the summary
+    """
+    payload = {
+        "kind": kind,
+        "chat": chat_id,
+        "threads": [
+            [thread_id, count, max_id, max_time.isoformat() if max_time else None]
+            for thread_id, count, max_id, max_time in fingerprint
+        ],
+        "model": MODEL_NAME,
+        "options": OLLAMA_OPTIONS
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+async def summarize_range_async(start, end, chat_id, notify=None, on_progress=None):
+    """
+    Summarize a chat's time range from stored chunk summaries plus the unsummarized tail.
+    
+    Closed buckets are summarized first if needed, so the final prompt only
+    holds one short summary per thread and bucket and the raw messages of
+    the current bucket. The range is widened to the start of its first
+    bucket. Results are cached for SUMMARY_CACHE_TTL seconds, so repeated
+    requests over an unchanged window return without generating, and
+    concurrent requests for the same window share one generation.
+    Generations are scheduled fairly across chats.
+    
+    Args:
+        start (datetime): Start of the range
+        end (datetime): End of the range
+        chat_id (int): The chat to summarize
+        notify: Optional coroutine function called with a status message
+            when the request has to wait for another generation
+        on_progress: Optional coroutine function called with the partial
+            summary while the final generation streams
+        
+    Returns:
+        str: The generated summary, or None if there are no messages in the range
+    """
+    fingerprint = await run_db(get_window_fingerprint, bucket_start(start), end, chat_id)
+    if not fingerprint:
+        return None
+    
+    cache_key = summary_cache_key(fingerprint, chat_id=chat_id)
+    cached = await run_db(get_cached_summary, cache_key)
+    if cached is not None:
+        SUMMARY_CACHE_LOOKUPS.inc(result="hit")
+        logger.info("Returning cached summary for unchanged message window")
+        return cached
+    SUMMARY_CACHE_LOOKUPS.inc(result="miss")
+    
+    return await get_summary_jobs().run(
+        cache_key, lambda: generate_range_summary(start, end, chat_id, cache_key, on_progress),
+        notify=notify, chat_id=chat_id
+    )
+
+
+async def generate_range_summary(start, end, chat_id, cache_key, on_progress=None):
+    """
+    Generate the summary of a chat's time range and cache it under cache_key.
+    
+    Args:
+        start (datetime): Start of the range
+        end (datetime): End of the range
+        chat_id (int): The chat to summarize
+        cache_key (str): The cache key of the range's contents
+        on_progress: Optional coroutine function called with the partial summary
+        
+    Returns:
+        str: The generated summary, or None if there are no messages in the range
+    """
+    # Remember whether the model failed so fallback text is never cached
+    failed = []
+    
+    # Catching up on a backlog of buckets is left to the background tick;
+    # the buckets not summarized yet are passed on as raw messages, which
+    # still make a complete summary worth caching
+    unsummarized = await refresh_chunk_summaries(start, end, chat_id, max_generations=INLINE_CHUNK_LIMIT)
+    
+    tail_start = bucket_start(end)
+    chunk_summaries = await run_db(get_chunk_summaries, bucket_start(start), tail_start, chat_id)
+    # A bucket passed on as raw messages replaces its outdated stored summary
+    pending = {
+        (thread_id, bucket_start(msg["time"]))
+        for thread_id, messages in unsummarized.items() for msg in messages
+    }
+    chunk_summaries = [
+        chunk for chunk in chunk_summaries if (chunk["thread_id"], chunk["window_start"]) not in pending
+    ]
+    tail_messages = await run_db(get_messages_in_range, tail_start, end, chat_id)
+    
+    # Buckets the model could not summarize are passed on as raw messages
+    for thread_id, messages in unsummarized.items():
+        tail_messages[thread_id] = messages + tail_messages.get(thread_id, [])
+    
+    if not chunk_summaries and not any(tail_messages.values()):
+        return None
+    
+    def fallback(prompt):
+        failed.append(True)
+        return build_extractive_summary(tail_messages, chat_id, chunk_summaries)
+    
+    if not chunk_summaries:
+        # Nothing to reduce yet: summarize the raw tail directly
+        summary = await summarize_messages_async(
+            tail_messages, fallback=fallback, on_progress=on_progress, chat_id=chat_id
+        )
+    else:
+        logger.info(f"Combining {len(chunk_summaries)} chunk summaries and "
+                    f"{sum(len(msgs) for msgs in tail_messages.values())} recent messages")
+        prompt = await run_generation(build_reduce_prompt, chunk_summaries, tail_messages, chat_id)
+        summary = await generate_with_ollama_async(prompt, fallback=fallback, on_progress=on_progress)
+    
+    # Neither fallback text nor a summary cut off by the timeout is worth reusing
+    if not failed and not summary.endswith(TRUNCATED_NOTE):
+        await run_db(save_cached_summary, cache_key, summary, SUMMARY_CACHE_TTL)
+    return summary
+
+
+def build_merge_prompt(summary, tail_messages, chat_id=DEFAULT_CHAT_ID):
+    """
+    Build the prompt that folds late messages into a pre-warmed summary.
+    
+    Args:
+        summary (str): The summary generated ahead of the deadline
+        tail_messages (dict): Thread ID -> messages received since then
+        chat_id (int): The chat being summarized
+        
+    Returns:
+        str: The prompt to send to the model
+    """
+    member_list = ", ".join(get_chat_members(chat_id).values())
+    
+    def render(fitted_messages, omitted):
+        prompt_sections = [
+            f"[Topic: {get_thread_title(thread_id, chat_id)}]\n"
+            + format_message_lines(messages, omitted.get(thread_id, 0))
+            for thread_id, messages in fitted_messages.items()
+            if messages
+        ]
+        
+        return (
+            "This is a summary of a Telegram group's conversation, followed by messages "
+            "sent after it was written.\n\n"
+            "Update the summary with the new messages and return the complete summary in the same format. "
+            "Keep everything from the summary that the new messages do not change.\n\n"
+            f"Group members: {member_list}\n\n"
+            f"Summary:\n{summary.strip()}\n\n"
+            "New messages:\n"
+            + "\n\n".join(prompt_sections)
+        )
+    
+    return fit_prompt(render, tail_messages, kind="merge")
+
+
+def prewarm_cache_key(name):
+    """
+    Build the cache key under which a scheduled job's pre-warmed summary is stored.
+    
+    Args:
+        name (str): The scheduled job's name
+        
+    Returns:
+        str: A hex SHA-256 digest
+    """
+    payload = {"kind": "prewarm", "job": name, "model": MODEL_NAME, "options": OLLAMA_OPTIONS}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+async def prewarm_summary(name, start, cutoff, chat_id):
+    """
+    Generate the bulk of a scheduled summary ahead of its deadline.
+    
+    The range up to cutoff is summarized and cached as usual, and a pointer
+    to it is stored for the job, so the run at the deadline only has to fold
+    in the messages received after cutoff.
+    
+    Args:
+        name (str): The scheduled job's name
+        start (datetime): Start of the range the scheduled summary will cover
+        cutoff (datetime): End of the pre-warmed part, usually now
+        chat_id (int): The chat to summarize
+        
+    Returns:
+        bool: True if a pre-warmed summary was stored
+    """
+    window_start = bucket_start(start)
+    cutoff = to_stored_time(cutoff)
+    fingerprint = await run_db(get_window_fingerprint, window_start, cutoff, chat_id)
+    if not fingerprint:
+        return False
+    
+    cache_key = summary_cache_key(fingerprint, chat_id=chat_id)
+    await summarize_range_async(window_start, cutoff, chat_id)
+    # Only a successful generation is cached, so this also filters out fallback text
+    summary = await run_db(get_cached_summary, cache_key)
+    if summary is None:
+        logger.warning(f"Could not pre-warm summary for {name}")
+        return False
+    
+    payload = {
+        "start": window_start.isoformat(),
+        "cutoff": cutoff.isoformat(),
+        "key": cache_key,
+        "summary": summary
+    }
+    await run_db(save_cached_summary, prewarm_cache_key(name), json.dumps(payload), PREWARM_TTL)
+    logger.info(f"Pre-warmed summary for {name} up to {cutoff}")
+    return True
+
+
+async def summarize_prewarmed_async(name, start, end, chat_id):
+    """
+    Summarize a time range, reusing the job's pre-warmed summary when it still applies.
+    
+    The pre-warmed summary is used if it covers the same range start and
+    the messages up to its cutoff are unchanged; only messages received
+    after the cutoff are then sent to the model. Otherwise the range is
+    summarized from scratch.
+    
+    Args:
+        name (str): The scheduled job's name
+        start (datetime): Start of the range
+        end (datetime): End of the range
+        chat_id (int): The chat to summarize
+        
+    Returns:
+        str: The generated summary, or None if there are no messages in the range
+    """
+    window_start = bucket_start(start)
+    entry = await run_db(get_cached_summary, prewarm_cache_key(name))
+    prewarmed = json.loads(entry) if entry else None
+    
+    if prewarmed and prewarmed["start"] == window_start.isoformat():
+        cutoff = datetime.fromisoformat(prewarmed["cutoff"])
+        fingerprint = await run_db(get_window_fingerprint, window_start, cutoff, chat_id)
+        if summary_cache_key(fingerprint, chat_id=chat_id) == prewarmed["key"]:
+            summary = prewarmed["summary"]
+            # The range query is inclusive, so start just after the cutoff
+            tail_messages = await run_db(
+                get_messages_in_range, cutoff + timedelta(microseconds=1), to_stored_time(end), chat_id
+            )
+            if not any(tail_messages.values()):
+                logger.info(f"Using pre-warmed summary for {name}, no messages since {cutoff}")
+                return summary
+            
+            logger.info(f"Merging {sum(len(msgs) for msgs in tail_messages.values())} "
+                        f"messages since {cutoff} into the pre-warmed summary for {name}")
+            prompt = await run_generation(build_merge_prompt, summary, tail_messages, chat_id)
+            # Posting on time matters more than the last few messages
+            return await generate_with_ollama_async(prompt, fallback=lambda _prompt: summary)
+        
+        logger.info(f"Pre-warmed summary for {name} is stale, summarizing from scratch")
+    
+    return await summarize_range_async(start, end, chat_id)
+
+
+def local_midnight(timestamp):
+    """Get the naive local midnight starting the day of a timestamp."""
+    return to_stored_time(timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def persist_daily_summary(day, chat_id):
+    """
+    Summarize a closed day of a chat and store it, unless it is stored already.
+    
+    The day is summarized from its chunk summaries like any other range;
+    once stored, weekly and monthly summaries only read the stored text.
+    
+    Args:
+        day (datetime): Local midnight starting the day
+        chat_id (int): The chat to summarize
+        
+    Returns:
+        str: The day's summary, or None if it had no messages or the model failed
+    """
+    next_day = day + timedelta(days=1)
+    stored = await run_db(get_daily_summaries, day, next_day, chat_id)
+    if day in stored:
+        return stored[day]
+    
+    fingerprint = await run_db(get_window_fingerprint, bucket_start(day), next_day, chat_id)
+    if not fingerprint:
+        return None
+    
+    await summarize_range_async(day, next_day, chat_id)
+    # Only a successful generation is cached, so fallback text is never stored
+    summary = await run_db(get_cached_summary, summary_cache_key(fingerprint, chat_id=chat_id))
+    if summary is None:
+        logger.warning(f"Could not summarize {day:%Y-%m-%d} of chat {chat_id}, will retry")
+        return None
+    
+    await run_db(save_daily_summary, day, chat_id, summary, sum(row[1] for row in fingerprint))
+    logger.info(f"Stored daily summary of chat {chat_id} for {day:%Y-%m-%d}")
+    return summary
+
+
+def build_period_prompt(sections, chat_id=DEFAULT_CHAT_ID):
+    """
+    Build the prompt that combines summaries of consecutive periods into one.
+    
+    Args:
+        sections (list): (label, summary) pairs, oldest first
+        chat_id (int): The chat being summarized
+        
+    Returns:
+        str: The prompt to send to the model
+    """
+    member_list = ", ".join(get_chat_members(chat_id).values())
+    
+    def render(fitted_sections):
+        return (
+            "These are summaries of consecutive periods of a Telegram group's conversation, oldest first.\n\n"
+            "Combine them into one summary of the whole time. For each topic, give the main threads of "
+            "discussion, decisions and open questions, and say which group members took part in them. "
+            "Leave out details that only mattered on a single day.\n\n"
+            f"Group members: {member_list}\n\n"
+            + "\n\n".join(f"[{label}]\n{text.strip()}" for label, text in fitted_sections)
+        )
+    
+    return fit_sections(render, sections, kind="period")
+
+
+def build_period_fallback(sections):
+    """Show the summaries of the periods themselves, for when the model is unavailable."""
+    lines = ["⚠️ AI Summary unavailable - summaries of each period instead:"]
+    for label, text in sections:
+        lines.append("")
+        lines.append(f"[{label}]")
+        lines.append(trim_text(text.strip(), FALLBACK_SECTION_CHARS))
+    return "\n".join(lines)
+
+
+def period_cache_key(sections, chat_id):
+    """
+    Build the cache key of a combined summary from the summaries it combines.
+    
+    Returns:
+        str: A hex SHA-256 digest
+    """
+    payload = {
+        "kind": "period",
+        "chat": chat_id,
+        "sections": sections,
+        "model": MODEL_NAME,
+        "options": OLLAMA_OPTIONS
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+async def combine_summaries(sections, chat_id, ttl, notify=None, on_progress=None):
+    """
+    Combine summaries of consecutive periods into one, reusing a cached result.
+    
+    Args:
+        sections (list): (label, summary) pairs, oldest first
+        chat_id (int): The chat being summarized
+        ttl (int): Seconds the result is cached for
+        notify: Optional coroutine function called with a status message
+            when the request has to wait for another generation
+        on_progress: Optional coroutine function called with the partial summary
+        
+    Returns:
+        str: The combined summary
+    """
+    cache_key = period_cache_key(sections, chat_id)
+    cached = await run_db(get_cached_summary, cache_key)
+    if cached is not None:
+        SUMMARY_CACHE_LOOKUPS.inc(result="hit")
+        return cached
+    SUMMARY_CACHE_LOOKUPS.inc(result="miss")
+    
+    async def generate():
+        failed = []
+        
+        def fallback(prompt):
+            failed.append(True)
+            return build_period_fallback(sections)
+        
+        prompt = await run_generation(build_period_prompt, sections, chat_id)
+        summary = await generate_with_ollama_async(prompt, fallback=fallback, on_progress=on_progress)
+        if not failed and not summary.endswith(TRUNCATED_NOTE):
+            await run_db(save_cached_summary, cache_key, summary, ttl)
+        return summary
+    
+    return await get_summary_jobs().run(cache_key, generate, notify=notify, chat_id=chat_id)
+
+
+async def summarize_period_async(days, end, chat_id, notify=None, on_progress=None):
+    """
+    Summarize the last days of a chat from its stored daily summaries.
+    
+    Raw messages are never read for closed days: the daily job stores
+    each day's summary, and days it has not stored yet are shown as
+    NO_DAILY_SUMMARY. Periods longer than PERIOD_GROUP_DAYS combine the
+    days of each Monday-to-Sunday week first; the results are cached, and
+    since weeks do not move with the period, only the partial weeks at
+    either end are combined again on a later day. A request then costs
+    about as much as a daily summary: today's summary plus one final
+    combination.
+    
+    Args:
+        days (int): Number of days, including today
+        end (datetime): End of the period, usually now
+        chat_id (int): The chat to summarize
+        notify: Optional coroutine function called with a status message
+            when the request has to wait for another generation
+        on_progress: Optional coroutine function called with the partial
+            summary while the final generation streams
+        
+    Returns:
+        str: The summary, or None if there is nothing to summarize
+    """
+    if days <= 1:
+        return await summarize_range_async(end - timedelta(hours=24), end, chat_id, notify, on_progress)
+    
+    today = local_midnight(end)
+    first_day = today - timedelta(days=days - 1)
+    stored = await run_db(get_daily_summaries, first_day, today, chat_id)
+    
+    # Weeks start on Monday; a period shorter than a group is a single group
+    groups = {}
+    for offset in range(days - 1):
+        day = first_day + timedelta(days=offset)
+        week = day - timedelta(days=day.weekday()) if days - 1 > PERIOD_GROUP_DAYS else first_day
+        groups.setdefault(week, []).append(day)
+    
+    sections = []
+    for group in groups.values():
+        if not any(day in stored for day in group):
+            continue
+        day_sections = [(f"{day:%a %Y-%m-%d}", stored.get(day, NO_DAILY_SUMMARY)) for day in group]
+        if len(groups) == 1 or len(day_sections) == 1:
+            sections.extend(day_sections)
+        else:
+            combined = await combine_summaries(day_sections, chat_id, PERIOD_CACHE_TTL)
+            sections.append((f"{day_sections[0][0]} to {day_sections[-1][0]}", combined))
+    missing = sum(1 for group in groups.values() for day in group if day not in stored)
+    if missing:
+        logger.info(f"{missing} of the last {days - 1} days of chat {chat_id} have no stored summary")
+    
+    today_summary = await summarize_range_async(today, to_stored_time(end), chat_id, notify=notify)
+    if today_summary is not None:
+        sections.append((f"Today until {to_stored_time(end):%H:%M}", today_summary))
+    
+    if not sections:
+        return None
+    if len(sections) == 1:
+        return sections[0][1]
+    return await combine_summaries(sections, chat_id, SUMMARY_CACHE_TTL, notify=notify, on_progress=on_progress)
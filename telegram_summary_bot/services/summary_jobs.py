@@ -0,0 +1,148 @@
+"""
+Coordination of concurrent summary generations.
+
+Requests for the same message window share one in-flight generation, and
+the number of generations running against Ollama at once is bounded.
+Waiting generations are started round-robin across chats, and each chat
+may only run a limited number at once, so a busy chat cannot starve the
+others.
+"""
+
+import os
+import asyncio
+import logging
+import weakref
+from collections import deque
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+# Maximum number of summaries generated at the same time
+MAX_CONCURRENT_SUMMARIES = int(os.environ.get("MAX_CONCURRENT_SUMMARIES", "1"))
+# Maximum number of summaries generated at the same time for one chat
+MAX_CONCURRENT_SUMMARIES_PER_CHAT = int(os.environ.get("MAX_CONCURRENT_SUMMARIES_PER_CHAT", "1"))
+
+
+class SummaryJobs:
+    """Single-flight deduplication with fair, bounded concurrent generations."""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_SUMMARIES, max_per_chat=MAX_CONCURRENT_SUMMARIES_PER_CHAT):
+        """
+        Args:
+            max_concurrent (int): Maximum number of generations running at once
+            max_per_chat (int): Maximum number of generations running at once for one chat
+        """
+        self._max_concurrent = max_concurrent
+        self._max_per_chat = max_per_chat
+        self._flights = {}
+        # Chat ID -> queue of futures waiting for a slot; dict order is the round-robin order
+        self._waiting = {}
+        self._running = {}
+
+    @property
+    def active(self):
+        """Number of distinct generations in flight or queued."""
+        return len(self._flights)
+
+    @property
+    def queued(self):
+        """Number of generations waiting for a slot."""
+        return sum(len(queue) for queue in self._waiting.values())
+
+    async def run(self, key, factory, notify=None, chat_id=None):
+        """
+        Run a generation, or attach to the one already running for the same key.
+
+        Args:
+            key (str): Identifies the requested result; equal keys share a generation
+            factory: Zero-argument coroutine function producing the result
+            notify: Optional coroutine function called with a status message
+                when the request has to wait
+            chat_id (int): The chat the generation is for, used for fair scheduling
+
+        Returns:
+            The result of the generation
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight["requesters"] += 1
+            logger.info(f"Attaching to in-flight summary {key[:12]} as requester #{flight['requesters']}")
+            if notify:
+                await notify(f"⏳ Summary in progress, you are #{flight['requesters']}")
+            # Shield so one requester giving up does not cancel it for the others
+            return await asyncio.shield(flight["task"])
+
+        slot = asyncio.get_running_loop().create_future()
+        queue = self._waiting.setdefault(chat_id, deque())
+        queue.append(slot)
+        position = len(queue)
+        self._dispatch()
+
+        flight = {"requesters": 1, "task": asyncio.create_task(self._run_in_slot(slot, chat_id, factory))}
+        self._flights[key] = flight
+        flight["task"].add_done_callback(lambda _task: self._flights.pop(key, None))
+
+        if not slot.done() and notify:
+            await notify(f"⏳ Summary queued, you are #{position} in line")
+        return await asyncio.shield(flight["task"])
+
+    def _dispatch(self):
+        """Hand free slots to waiting generations, one chat at a time in turn."""
+        while sum(self._running.values()) < self._max_concurrent:
+            eligible = [
+                chat_id for chat_id in self._waiting if self._running.get(chat_id, 0) < self._max_per_chat
+            ]
+            if not eligible:
+                return
+
+            chat_id = eligible[0]
+            queue = self._waiting.pop(chat_id)
+            slot = queue.popleft()
+            # Move the chat to the back of the rotation
+            if queue:
+                self._waiting[chat_id] = queue
+            if slot.cancelled():
+                continue
+
+            self._running[chat_id] = self._running.get(chat_id, 0) + 1
+            slot.set_result(None)
+
+    def _release(self, chat_id):
+        """Free a chat's slot and start the next waiting generation."""
+        self._running[chat_id] -= 1
+        if not self._running[chat_id]:
+            del self._running[chat_id]
+        self._dispatch()
+
+    async def _run_in_slot(self, slot, chat_id, factory):
+        """Wait for a generation slot, then run the factory."""
+        try:
+            await slot
+        except asyncio.CancelledError:
+            # A slot granted just before cancellation must still be returned
+            if slot.done() and not slot.cancelled():
+                self._release(chat_id)
+            raise
+        try:
+            return await factory()
+        finally:
+            self._release(chat_id)
+
+
+# One coordinator per event loop, since asyncio primitives are bound to their loop
+_summary_jobs = weakref.WeakKeyDictionary()
+
+
+def get_summary_jobs():
+    """
+    Get the summary coordinator of the running event loop.
+
+    Returns:
+        SummaryJobs: The coordinator
+    """
+    loop = asyncio.get_running_loop()
+    jobs = _summary_jobs.get(loop)
+    if jobs is None:
+        jobs = SummaryJobs()
+        _summary_jobs[loop] = jobs
+    return jobs
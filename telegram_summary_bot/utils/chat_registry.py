@@ -0,0 +1,156 @@
+"""
+Registry of the chats the bot serves and the members of each chat.
+
+Chats and members live in the database; this module keeps an in-memory copy
+for the per-message checks in the handlers and for prompt building. The
+chats configured in GROUP_CHAT_ID/ACTUAL_GROUP_CHAT_ID and SUMMARY_SCHEDULES
+are registered at startup, and the legacy group_members.json is imported as
+their member list.
+"""
+
+import os
+import json
+import logging
+
+from telegram_summary_bot.config import GROUP_CHAT_ID, ACTUAL_GROUP_CHAT_ID, GROUP_MEMBERS_FILE
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+from telegram_summary_bot.utils.database import (
+    register_chat as db_register_chat,
+    get_chats as db_get_chats,
+    get_chat_members as db_get_chat_members,
+    add_chat_members
+)
+
+# Default time of a chat's scheduled summary; 23:55 Tehran = 20:25 UTC
+SUMMARY_CRON = os.environ.get("SUMMARY_CRON", "55 23 * * *")
+# Per-chat schedules as "chat_id[,chat_id]=cron;..."; listed chats are registered at startup
+SUMMARY_SCHEDULES = os.environ.get("SUMMARY_SCHEDULES", "")
+# Register any group the bot receives messages from, instead of only configured ones
+AUTO_REGISTER_CHATS = os.environ.get("AUTO_REGISTER_CHATS", "false").lower() in ("1", "true", "yes")
+
+# Chat ID -> dict with chat_id, title, summary_cron and enabled
+chats = {}
+
+# Chat ID -> dict of Telegram user ID string -> display name
+chat_members = {}
+
+
+def parse_summary_schedules(value=SUMMARY_SCHEDULES):
+    """
+    Parse the per-chat summary schedules.
+
+    Args:
+        value (str): Schedules as "chat_id[,chat_id]=cron;..."
+
+    Returns:
+        dict: Chat ID -> cron expression
+    """
+    schedules = {}
+    for entry in value.split(";"):
+        if not entry.strip():
+            continue
+        chat_ids, _, expression = entry.partition("=")
+        chat_ids = [int(chat_id) for chat_id in chat_ids.split(",") if chat_id.strip()]
+        if not chat_ids or not expression.strip():
+            raise ValueError(f"Invalid summary schedule: {entry}")
+        for chat_id in chat_ids:
+            schedules[chat_id] = expression.strip()
+    return schedules
+
+
+def load_legacy_members():
+    """Read the legacy group_members.json, or an empty dict if there is none."""
+    try:
+        with open(GROUP_MEMBERS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def load_chat_registry():
+    """
+    Register the configured chats and load all chats and members into memory.
+
+    Returns:
+        int: Number of registered chats
+    """
+    configured = {GROUP_CHAT_ID: None, ACTUAL_GROUP_CHAT_ID: None}
+    configured.update(parse_summary_schedules())
+
+    legacy_members = load_legacy_members()
+    for chat_id, summary_cron in configured.items():
+        db_register_chat(chat_id, summary_cron=summary_cron)
+        # The legacy member list described the configured group
+        if chat_id in (GROUP_CHAT_ID, ACTUAL_GROUP_CHAT_ID) and legacy_members:
+            added = add_chat_members(chat_id, legacy_members)
+            if added:
+                logger.info(f"Imported {added} members of chat {chat_id} from {GROUP_MEMBERS_FILE}")
+
+    reload_chat_registry()
+    logger.info(f"Loaded {len(chats)} chats with {sum(len(m) for m in chat_members.values())} members")
+    return len(chats)
+
+
+def reload_chat_registry():
+    """Replace the in-memory chats and members with the database's, e.g. after another worker changed them."""
+    loaded_chats = {chat["chat_id"]: chat for chat in db_get_chats()}
+    loaded_members = db_get_chat_members()
+    # Swap the entries in place, never leaving the dicts empty for concurrent readers
+    for cache, loaded in ((chats, loaded_chats), (chat_members, loaded_members)):
+        cache.update(loaded)
+        for key in set(cache) - set(loaded):
+            cache.pop(key, None)
+
+
+def is_monitored_chat(chat_id):
+    """Check if a chat is monitored by the bot."""
+    chat = chats.get(chat_id)
+    return chat is not None and chat["enabled"]
+
+
+def register_chat(chat_id, title=None):
+    """
+    Register a chat so its messages are stored and summarized.
+
+    Args:
+        chat_id (int): The Telegram chat ID
+        title (str): The chat's title
+
+    Returns:
+        dict: The registered chat
+    """
+    chat = db_register_chat(chat_id, title=title)
+    chats[chat_id] = chat
+    return chat
+
+
+def get_chat_members(chat_id):
+    """
+    Get the members of a chat.
+
+    Returns:
+        dict: Telegram user ID string -> display name
+    """
+    return chat_members.get(chat_id, {})
+
+
+def note_chat_member(chat_id, user_id, display_name):
+    """
+    Remember that a user spoke in a chat; the database copy is written with their messages.
+
+    Returns:
+        bool: True if the user was not a known member of the chat
+    """
+    members = chat_members.setdefault(chat_id, {})
+    is_new = str(user_id) not in members
+    members[str(user_id)] = display_name
+    return is_new
+
+
+def get_summary_cron(chat_id):
+    """Get the cron expression of a chat's scheduled summary."""
+    chat = chats.get(chat_id)
+    return (chat and chat["summary_cron"]) or SUMMARY_CRON
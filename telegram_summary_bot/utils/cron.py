@@ -0,0 +1,104 @@
+"""
+Minimal five-field cron expressions evaluated in a given timezone.
+"""
+
+from datetime import timedelta
+
+# (lowest, highest) value of each field
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+# How far ahead to look for the next match before giving up
+MAX_LOOKAHEAD_DAYS = 366 * 5
+
+
+def parse_field(field, lowest, highest):
+    """
+    Parse one cron field.
+
+    Supports "*", single values, "a-b" ranges, "a,b,c" lists and "/step"
+    on any of them.
+
+    Args:
+        field (str): The field text
+        lowest (int): Smallest allowed value
+        highest (int): Largest allowed value
+
+    Returns:
+        set: The matching values
+    """
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part == "*":
+            start, end = lowest, highest
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            start = int(part)
+            end = highest if step > 1 else start
+
+        if start < lowest or end > highest or start > end or step < 1:
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """A cron expression ("minute hour day-of-month month day-of-week") in a timezone."""
+
+    def __init__(self, expression, tz):
+        """
+        Args:
+            expression (str): The cron expression; day-of-week 0 is Sunday
+            tz: A pytz timezone the expression is evaluated in
+        """
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+
+        self.expression = expression
+        self.tz = tz
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            parse_field(field, lowest, highest)
+            for field, (lowest, highest) in zip(fields, FIELD_RANGES)
+        )
+        # Cron matches either day field when both are restricted
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, day):
+        day_match = day.day in self.days
+        # Python's Monday is 0, cron's Sunday is 0
+        weekday_match = (day.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return weekday_match
+        if self._any_weekday:
+            return day_match
+        return day_match or weekday_match
+
+    def next_after(self, moment):
+        """
+        Get the first matching time strictly after a moment.
+
+        Args:
+            moment (datetime): An aware datetime
+
+        Returns:
+            datetime: The next matching time, aware in the schedule's timezone
+        """
+        local = moment.astimezone(self.tz)
+        day = local.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+        for _ in range(MAX_LOOKAHEAD_DAYS):
+            if day.month in self.months and self._day_matches(day):
+                for hour in sorted(self.hours):
+                    for minute in sorted(self.minutes):
+                        candidate = self.tz.localize(day.replace(hour=hour, minute=minute))
+                        if candidate > local:
+                            return candidate
+            day += timedelta(days=1)
+
+        raise ValueError(f"Cron expression never matches: {self.expression}")
+
+    def __repr__(self):
+        return f"<CronSchedule '{self.expression}' {self.tz}>"
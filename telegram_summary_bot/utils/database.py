@@ -1,14 +1,37 @@
 """
 Database utilities for storage.
+
+Message times, bucket windows and summary days are stored as naive Tehran
+time, in columns of the LocalDateTime type. Aware datetimes written or
+compared against these columns are converted to Tehran time first, so
+handlers can pass Telegram's aware timestamps and every range bound, day
+boundary and partition bound means the same wall-clock time on SQLite and
+on PostgreSQL's timestamp without time zone. Bookkeeping columns (created_at,
+expires_at, last_run_at) hold naive UTC.
 """
 
 import os
+import json
+import time
 import logging
-from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, inspect
+from datetime import datetime, timedelta
+from sqlalchemy import (
+    create_engine, event, Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey, UniqueConstraint, Index,
+    inspect, insert, select, func, or_
+)
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, scoped_session
 
+from telegram_summary_bot.config import DEFAULT_CHAT_ID, TEHRAN_TZ
+from telegram_summary_bot.utils.identity_cache import user_cache, thread_cache, member_cache
+from telegram_summary_bot.utils.metrics import (
+    DB_INSERT_SECONDS, DB_COMMIT_SECONDS, DB_INSERTED_MESSAGES, RANGE_QUERY_SECONDS
+)
+
 # Get the logger from the config module
 logger = logging.getLogger("telegram_summary_bot.config")
 
@@ -23,14 +46,112 @@ if DB_TYPE == "postgres":
     DB_USER = os.environ.get("DB_USER", "botuser")
     DB_PASSWORD = os.environ.get("DB_PASSWORD", "botpassword")
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # Optional range partitioning of messages by timestamp: "day" or "month"
+    DB_PARTITIONING = os.environ.get("DB_PARTITIONING", "")
 else:
     # SQLite configuration (default)
     DB_PATH = os.environ.get("DB_PATH", "telegram_bot.db")
     DATABASE_URL = f"sqlite:///{DB_PATH}"
     logger.info(f"Using SQLite database at {DB_PATH}")
+    # Partitioning is a PostgreSQL feature
+    DB_PARTITIONING = ""
+
+# Apply the SQLite performance profile: WAL journal, relaxed fsync, larger caches
+SQLITE_TUNING = os.environ.get("SQLITE_TUNING", "true").lower() in ("1", "true", "yes")
+# NORMAL only syncs at checkpoints in WAL mode; a power loss can lose the last commits but never corrupts
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+# Bytes of the database file read through a memory map
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Page cache of each connection, in KiB
+SQLITE_CACHE_SIZE_KIB = int(os.environ.get("SQLITE_CACHE_SIZE_KIB", "32768"))
+# How long a connection waits for the write lock before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+# The WAL file is truncated to this size after checkpoints
+SQLITE_JOURNAL_SIZE_LIMIT = 64 * 1024 * 1024
+
+# Pooled connections: the ingestion writer, the DB executor workers and the scheduler
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "4"))
+
+# Shared in-memory caches whose changes are announced through cache_versions
+CACHE_NAMES = ("chats", "members", "threads")
+
+# Rows fetched per round-trip when streaming large reads
+READ_BATCH_SIZE = int(os.environ.get("DB_READ_BATCH_SIZE", "1000"))
+
+
+def to_stored_time(timestamp):
+    """
+    Convert a timestamp to naive Tehran time, the form stored in the database.
+    
+    Args:
+        timestamp (datetime): An aware or naive (already local) timestamp
+        
+    Returns:
+        datetime: The naive local timestamp
+    """
+    if timestamp is not None and timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(TEHRAN_TZ).replace(tzinfo=None)
+    return timestamp
+
+
+class LocalDateTime(TypeDecorator):
+    """A DateTime holding naive Tehran time; aware values are converted when bound."""
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return to_stored_time(value)
+
+
+def create_db_engine(url=DATABASE_URL):
+    """
+    Create the engine, tuned for one writer and concurrent readers on SQLite.
+    
+    In WAL mode readers never block the writer or each other, so the
+    ingestion thread, the DB executor and the scheduler can share the
+    file; writers still take turns, waiting up to the busy timeout.
+    
+    Args:
+        url (str): The database URL
+        
+    Returns:
+        Engine: The engine
+    """
+    if not url.startswith("sqlite") or ":memory:" in url or not SQLITE_TUNING:
+        return create_engine(url)
+    
+    sqlite_engine = create_engine(
+        url,
+        connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000, "check_same_thread": False},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        # Connections are cheap to keep; reusing them keeps their page caches warm
+        pool_recycle=-1
+    )
+    
+    @event.listens_for(sqlite_engine, "connect")
+    def apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            # The journal mode is stored in the file; the other pragmas apply per connection
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute(f"PRAGMA journal_size_limit={SQLITE_JOURNAL_SIZE_LIMIT}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cursor.close()
+    
+    logger.info(f"SQLite tuned: WAL, synchronous={SQLITE_SYNCHRONOUS}, "
+                f"pool of {DB_POOL_SIZE}+{DB_MAX_OVERFLOW} connections")
+    return sqlite_engine
+
 
 # Create the engine
-engine = create_engine(DATABASE_URL)
+engine = create_db_engine()
 SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 
 Base = declarative_base()
@@ -51,12 +172,45 @@ class User(Base):
         return f"<User {self.display_name}>"
 
 
+class Chat(Base):
+    """A Telegram group the bot stores and summarizes messages for."""
+    __tablename__ = "chats"
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger, unique=True, nullable=False)
+    title = Column(String(255), nullable=True)
+    # Cron expression of the chat's scheduled summary; None uses the default
+    summary_cron = Column(String(100), nullable=True)
+    enabled = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Chat {self.chat_id} {self.title}>"
+
+
+class ChatMember(Base):
+    """A member of a chat, listed in its summaries even when they did not speak."""
+    __tablename__ = "chat_members"
+    __table_args__ = (UniqueConstraint("chat_id", "telegram_user_id", name="uq_chat_members_chat_user"),)
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    telegram_user_id = Column(BigInteger, nullable=False)
+    display_name = Column(String(255), nullable=False)
+
+    def __repr__(self):
+        return f"<ChatMember {self.display_name} in {self.chat_id}>"
+
+
 class Thread(Base):
     """Thread model for Telegram message threads."""
     __tablename__ = "threads"
+    # Topic IDs are only unique within a chat
+    __table_args__ = (UniqueConstraint("chat_id", "thread_id", name="uq_threads_chat_thread"),)
 
     id = Column(Integer, primary_key=True)
-    thread_id = Column(Integer, unique=True, nullable=False)
+    chat_id = Column(BigInteger, nullable=True)
+    thread_id = Column(Integer, nullable=False)
     title = Column(String(255), nullable=False)
     
     # Relationship with messages
@@ -69,12 +223,26 @@ class Thread(Base):
 class Message(Base):
     """Message model for Telegram messages."""
     __tablename__ = "messages"
+    __table_args__ = (
+        # Per-chat range scans, across all threads or within one thread
+        Index("ix_messages_chat_timestamp", "chat_id", "timestamp"),
+        Index("ix_messages_chat_thread_timestamp", "chat_id", "thread_id", "timestamp"),
+        # Telegram message IDs are unique per chat; partitioned tables must include the partition key
+        Index(
+            "ux_messages_chat_message", "chat_id", "telegram_message_id",
+            *(["timestamp"] if DB_PARTITIONING else []), unique=True
+        ),
+        {"postgresql_partition_by": "RANGE (timestamp)"} if DB_PARTITIONING else {}
+    )
 
-    id = Column(Integer, primary_key=True)
+    # Partitioned tables need the partition key in the primary key
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id = Column(BigInteger, nullable=True)
+    telegram_message_id = Column(BigInteger, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     thread_id = Column(Integer, ForeignKey("threads.id"), nullable=False)
     text = Column(Text, nullable=False)
-    timestamp = Column(DateTime, nullable=False, index=True)
+    timestamp = Column(LocalDateTime, nullable=False, index=True, primary_key=bool(DB_PARTITIONING))
     
     # Relationships
     user = relationship("User", back_populates="messages")
@@ -84,6 +252,120 @@ class Message(Base):
         return f"<Message {self.id}: {self.text[:20]}...>"
 
 
+class ChunkSummary(Base):
+    """Partial summary of one thread's messages within a fixed time bucket."""
+    __tablename__ = "chunk_summaries"
+    __table_args__ = (UniqueConstraint("thread_id", "window_start"),)
+
+    id = Column(Integer, primary_key=True)
+    thread_id = Column(Integer, ForeignKey("threads.id"), nullable=False)
+    window_start = Column(LocalDateTime, nullable=False, index=True)
+    window_end = Column(LocalDateTime, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ChunkSummary {self.thread_id} @ {self.window_start}>"
+
+
+class MessageRollup(Base):
+    """Activity of one thread on one day, kept after the day's messages are archived and deleted."""
+    __tablename__ = "message_rollups"
+    __table_args__ = (
+        UniqueConstraint("thread_id", "day", name="uq_message_rollups_thread_day"),
+        Index("ix_message_rollups_chat_day", "chat_id", "day"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    thread_id = Column(Integer, ForeignKey("threads.id"), nullable=False)
+    # Local midnight starting the day
+    day = Column(LocalDateTime, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    # JSON object of Telegram user ID -> messages sent
+    user_counts = Column(Text, nullable=False)
+    first_message_at = Column(LocalDateTime, nullable=False)
+    last_message_at = Column(LocalDateTime, nullable=False)
+    # Highest message ID rolled up; messages of the day stored later are added by the next run
+    last_message_id = Column(Integer, nullable=False)
+    # The day's chunk summaries of the thread, if any were generated
+    summary = Column(Text, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<MessageRollup {self.thread_id} @ {self.day}>"
+
+
+class DailySummary(Base):
+    """Summary of one calendar day of a chat, the building block of weekly and monthly summaries."""
+    __tablename__ = "daily_summaries"
+    __table_args__ = (UniqueConstraint("chat_id", "day", name="uq_daily_summaries_chat_day"),)
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    # Local midnight starting the day
+    day = Column(LocalDateTime, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DailySummary {self.chat_id} @ {self.day}>"
+
+
+class SummaryCacheEntry(Base):
+    """Generated summary cached under a fingerprint of its inputs."""
+    __tablename__ = "summary_cache"
+
+    id = Column(Integer, primary_key=True)
+    key = Column(String(64), unique=True, nullable=False)
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<SummaryCacheEntry {self.key[:12]}>"
+
+
+class JobRun(Base):
+    """Last completed run of a scheduled job, used to catch up after restarts."""
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), unique=True, nullable=False)
+    last_run_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<JobRun {self.name} at {self.last_run_at}>"
+
+
+class Lease(Base):
+    """A named lease held by one worker until it expires, used for leader election."""
+    __tablename__ = "leases"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+    holder = Column(String(255), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<Lease {self.name} held by {self.holder} until {self.expires_at}>"
+
+
+class CacheVersion(Base):
+    """Version counter of a shared cache; workers reload their copy when it changes."""
+    __tablename__ = "cache_versions"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CacheVersion {self.name} v{self.version}>"
+
+
 def init_db():
     """Initialize the database schema."""
     try:
@@ -106,6 +388,40 @@ def get_db():
         raise
 
 
+def bump_cache_version(db, name):
+    """
+    Announce a change to a shared cache as part of the session's transaction.
+    
+    Args:
+        db: The database session
+        name (str): One of CACHE_NAMES
+    """
+    updated = (
+        db.query(CacheVersion)
+        .filter(CacheVersion.name == name)
+        .update({CacheVersion.version: CacheVersion.version + 1}, synchronize_session=False)
+    )
+    if not updated:
+        db.add(CacheVersion(name=name, version=1))
+
+
+def get_cache_versions():
+    """
+    Get the current version of every shared cache.
+    
+    Returns:
+        dict: Cache name -> version
+    """
+    db = get_db()
+    try:
+        return {name: version for name, version in db.query(CacheVersion.name, CacheVersion.version)}
+    except Exception as e:
+        logger.error(f"Error reading cache versions: {e}")
+        return {}
+    finally:
+        db.close()
+
+
 def add_user(telegram_id, display_name):
     """Add a user to the database or get existing user."""
     db = get_db()
@@ -122,6 +438,7 @@ def add_user(telegram_id, display_name):
             user.display_name = display_name
             db.commit()
             logger.info(f"Updated user display name: {display_name} ({telegram_id})")
+        user_cache.set(telegram_id, (user.id, user.display_name))
         return user
     except Exception as e:
         db.rollback()
@@ -131,22 +448,25 @@ def add_user(telegram_id, display_name):
         db.close()
 
 
-def add_thread(thread_id, title):
+def add_thread(thread_id, title, chat_id=DEFAULT_CHAT_ID):
     """Add a thread to the database or get existing thread."""
     db = get_db()
     try:
-        thread = db.query(Thread).filter(Thread.thread_id == thread_id).first()
+        thread = db.query(Thread).filter(Thread.chat_id == chat_id, Thread.thread_id == thread_id).first()
         if not thread:
-            thread = Thread(thread_id=thread_id, title=title)
+            thread = Thread(chat_id=chat_id, thread_id=thread_id, title=title)
             db.add(thread)
+            bump_cache_version(db, "threads")
             db.commit()
             db.refresh(thread)
             logger.info(f"Added new thread: {title} ({thread_id})")
         elif thread.title != title and title != "Main Group Chat":
             # Update title if changed and not default
             thread.title = title
+            bump_cache_version(db, "threads")
             db.commit()
             logger.info(f"Updated thread title: {title} ({thread_id})")
+        thread_cache.set((chat_id, thread_id), (thread.id, thread.title))
         return thread
     except Exception as e:
         db.rollback()
@@ -156,7 +476,8 @@ def add_thread(thread_id, title):
         db.close()
 
 
-def add_message(telegram_user_id, display_name, thread_telegram_id, thread_title, text, timestamp):
+def add_message(telegram_user_id, display_name, thread_telegram_id, thread_title, text, timestamp, chat_id=None,
+                telegram_message_id=None):
     """Add a message to the database."""
     db = get_db()
     try:
@@ -164,10 +485,13 @@ def add_message(telegram_user_id, display_name, thread_telegram_id, thread_title
         user = add_user(telegram_user_id, display_name)
         
         # Get or create thread
-        thread = add_thread(thread_telegram_id, thread_title)
+        chat_id = chat_id or DEFAULT_CHAT_ID
+        thread = add_thread(thread_telegram_id, thread_title, chat_id)
         
         # Create message
         message = Message(
+            chat_id=chat_id,
+            telegram_message_id=telegram_message_id,
             user_id=user.id,
             thread_id=thread.id,
             text=text,
@@ -185,34 +509,328 @@ def add_message(telegram_user_id, display_name, thread_telegram_id, thread_title
         db.close()
 
 
-def get_messages_in_range(start_time, end_time):
-    """Get messages within a specified time range."""
+def _resolve_users(db, user_names):
+    """
+    Map Telegram user IDs to primary keys, creating or renaming users as needed.
+    
+    Identities found in the cache with an unchanged name never touch the
+    database. New primary keys are assigned with a flush, not a commit.
+    
+    Args:
+        db: The database session
+        user_names (dict): Telegram user ID -> current display name
+        
+    Returns:
+        tuple: (dict of Telegram user ID -> users.id,
+                dict of identities to cache once the transaction commits)
+    """
+    user_ids = {}
+    missing = []
+    for telegram_id, display_name in user_names.items():
+        cached = user_cache.get(telegram_id)
+        if cached and cached[1] == display_name:
+            user_ids[telegram_id] = cached[0]
+        else:
+            missing.append(telegram_id)
+    
+    if not missing:
+        return user_ids, {}
+    
+    users = {
+        user.telegram_id: user
+        for user in db.query(User).filter(User.telegram_id.in_(missing))
+    }
+    for telegram_id in missing:
+        display_name = user_names[telegram_id]
+        user = users.get(telegram_id)
+        if not user:
+            user = User(telegram_id=telegram_id, display_name=display_name)
+            db.add(user)
+            users[telegram_id] = user
+            logger.info(f"Added new user: {display_name} ({telegram_id})")
+        elif user.display_name != display_name:
+            user.display_name = display_name
+            logger.info(f"Updated user display name: {display_name} ({telegram_id})")
+    
+    db.flush()
+    resolved = {telegram_id: (user.id, user.display_name) for telegram_id, user in users.items()}
+    user_ids.update({telegram_id: identity[0] for telegram_id, identity in resolved.items()})
+    return user_ids, resolved
+
+
+def _resolve_threads(db, thread_names):
+    """
+    Map Telegram thread IDs to primary keys, creating or renaming threads as needed.
+    
+    Args:
+        db: The database session
+        thread_names (dict): (chat ID, Telegram thread ID) -> current title
+        
+    Returns:
+        tuple: (dict of (chat ID, Telegram thread ID) -> threads.id,
+                dict of identities to cache once the transaction commits)
+    """
+    thread_ids = {}
+    missing = []
+    for key, title in thread_names.items():
+        cached = thread_cache.get(key)
+        # The default title never overrides a real topic name
+        if cached and (cached[1] == title or title == "Main Group Chat"):
+            thread_ids[key] = cached[0]
+        else:
+            missing.append(key)
+    
+    if not missing:
+        return thread_ids, {}
+    
+    candidates = db.query(Thread).filter(
+        Thread.chat_id.in_({chat_id for chat_id, _ in missing}),
+        Thread.thread_id.in_({thread_id for _, thread_id in missing})
+    )
+    threads = {
+        (thread.chat_id, thread.thread_id): thread
+        for thread in candidates
+        if (thread.chat_id, thread.thread_id) in thread_names
+    }
+    changed = False
+    for key in missing:
+        chat_id, thread_id = key
+        title = thread_names[key]
+        thread = threads.get(key)
+        if not thread:
+            thread = Thread(chat_id=chat_id, thread_id=thread_id, title=title)
+            db.add(thread)
+            threads[key] = thread
+            changed = True
+            logger.info(f"Added new thread: {title} ({thread_id}) in chat {chat_id}")
+        elif thread.title != title and title != "Main Group Chat":
+            thread.title = title
+            changed = True
+            logger.info(f"Updated thread title: {title} ({thread_id}) in chat {chat_id}")
+    
+    if changed:
+        bump_cache_version(db, "threads")
+    db.flush()
+    resolved = {key: (thread.id, thread.title) for key, thread in threads.items()}
+    thread_ids.update({key: identity[0] for key, identity in resolved.items()})
+    return thread_ids, resolved
+
+
+def _resolve_members(db, member_names):
+    """
+    Record who has spoken in which chat, adding or renaming chat members as needed.
+    
+    Args:
+        db: The database session
+        member_names (dict): (chat ID, Telegram user ID) -> current display name
+        
+    Returns:
+        dict: Memberships to cache once the transaction commits
+    """
+    missing = [key for key, display_name in member_names.items() if member_cache.get(key) != display_name]
+    if not missing:
+        return {}
+    
+    candidates = db.query(ChatMember).filter(
+        ChatMember.chat_id.in_({chat_id for chat_id, _ in missing}),
+        ChatMember.telegram_user_id.in_({user_id for _, user_id in missing})
+    )
+    members = {
+        (member.chat_id, member.telegram_user_id): member
+        for member in candidates
+        if (member.chat_id, member.telegram_user_id) in member_names
+    }
+    changed = False
+    for key in missing:
+        chat_id, user_id = key
+        member = members.get(key)
+        if not member:
+            member = ChatMember(chat_id=chat_id, telegram_user_id=user_id, display_name=member_names[key])
+            db.add(member)
+            members[key] = member
+            changed = True
+        elif member.display_name != member_names[key]:
+            member.display_name = member_names[key]
+            changed = True
+    
+    if changed:
+        bump_cache_version(db, "members")
+    db.flush()
+    return {key: member.display_name for key, member in members.items()}
+
+
+def insert_ignoring_duplicates():
+    """
+    Build an INSERT into messages that skips rows violating a unique key.
+    
+    Returns:
+        Insert: ON CONFLICT DO NOTHING on PostgreSQL and SQLite, a plain insert elsewhere
+    """
+    if engine.dialect.name == "postgresql":
+        return postgresql_insert(Message).on_conflict_do_nothing()
+    if engine.dialect.name == "sqlite":
+        return sqlite_insert(Message).on_conflict_do_nothing()
+    return insert(Message)
+
+
+def add_messages_bulk(records):
+    """
+    Add a batch of messages to the database in a single transaction.
+    
+    Users and threads are resolved through the identity cache, so a batch
+    from known members in known topics costs a single executemany insert.
+    
+    Args:
+        records (list): Dicts with telegram_user_id, display_name,
+            thread_telegram_id, thread_title, text and timestamp keys and
+            optional chat_id (DEFAULT_CHAT_ID if missing) and telegram_message_id
+        
+    Returns:
+        int: Number of messages inserted; messages already stored under
+            the same chat_id/telegram_message_id are skipped and not counted
+    """
+    if not records:
+        return 0
+    
     db = get_db()
+    started = time.perf_counter()
     try:
-        # Query messages in time range
-        messages = (
-            db.query(Message, User, Thread)
-            .join(User, Message.user_id == User.id)
-            .join(Thread, Message.thread_id == Thread.id)
-            .filter(Message.timestamp >= start_time, Message.timestamp <= end_time)
-            .order_by(Message.timestamp)
-            .all()
+        # Latest display name / title in the batch wins
+        user_ids, new_users = _resolve_users(
+            db, {r["telegram_user_id"]: r["display_name"] for r in records}
+        )
+        thread_ids, new_threads = _resolve_threads(
+            db, {(r.get("chat_id") or DEFAULT_CHAT_ID, r["thread_telegram_id"]): r["thread_title"] for r in records}
+        )
+        new_members = _resolve_members(
+            db, {(r.get("chat_id") or DEFAULT_CHAT_ID, r["telegram_user_id"]): r["display_name"] for r in records}
+        )
+        
+        # Through the connection, so the insert is a plain executemany whose
+        # result counts the rows actually written
+        result = db.connection().execute(insert_ignoring_duplicates(), [
+            {
+                "chat_id": r.get("chat_id") or DEFAULT_CHAT_ID,
+                "telegram_message_id": r.get("telegram_message_id"),
+                "user_id": user_ids[r["telegram_user_id"]],
+                "thread_id": thread_ids[(r.get("chat_id") or DEFAULT_CHAT_ID, r["thread_telegram_id"])],
+                "text": r["text"],
+                "timestamp": r["timestamp"]
+            }
+            for r in records
+        ])
+        # Drivers that cannot count the rows of an executemany report -1
+        inserted = result.rowcount if result.rowcount >= 0 else len(records)
+        with DB_COMMIT_SECONDS.time():
+            db.commit()
+        DB_INSERT_SECONDS.observe(time.perf_counter() - started)
+        DB_INSERTED_MESSAGES.inc(inserted)
+        
+        # Only cache identities once they are committed
+        for telegram_id, identity in new_users.items():
+            user_cache.set(telegram_id, identity)
+        for key, identity in new_threads.items():
+            thread_cache.set(key, identity)
+        for key, display_name in new_members.items():
+            member_cache.set(key, display_name)
+        return inserted
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error adding message batch: {e}")
+        raise
+    finally:
+        db.close()
+
+
+class MessageRecord:
+    """
+    Compact, read-only record of a stored message.
+    
+    Supports item access (record["text"]) like the dicts used elsewhere.
+    """
+    __slots__ = ("id", "time", "user_id", "display_name", "text")
+
+    def __init__(self, id, time, user_id, display_name, text):
+        self.id = id
+        self.time = time
+        self.user_id = user_id
+        self.display_name = display_name
+        self.text = text
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __repr__(self):
+        return f"<MessageRecord {self.id}: {self.text[:20]}...>"
+
+
+def messages_in_range_query(start_time, end_time, chat_id=None):
+    """
+    Build the query for messages within a time range, oldest first.
+    
+    Only the columns needed for summaries are selected.
+    
+    Args:
+        start_time (datetime): Start of the range (inclusive)
+        end_time (datetime): End of the range (inclusive)
+        chat_id (int): Restrict to one chat; None reads all chats
+        
+    Returns:
+        Select: Rows of (id, timestamp, thread_id, telegram_id, display_name, text)
+    """
+    query = (
+        select(
+            Message.id, Message.timestamp, Thread.thread_id,
+            User.telegram_id, User.display_name, Message.text
+        )
+        .join_from(Message, User, Message.user_id == User.id)
+        .join(Thread, Message.thread_id == Thread.id)
+        .where(Message.timestamp >= start_time, Message.timestamp <= end_time)
+    )
+    if chat_id is not None:
+        query = query.where(Message.chat_id == chat_id)
+    return query.order_by(Message.timestamp)
+
+
+def get_messages_in_range(start_time, end_time, chat_id=None):
+    """
+    Get messages within a specified time range, optionally for one chat.
+    
+    Rows are streamed from the cursor in batches of READ_BATCH_SIZE and
+    turned straight into MessageRecords, so memory grows with the number
+    of messages only, not with ORM objects per row.
+    
+    Returns:
+        dict: Telegram thread ID -> list of MessageRecords, oldest first
+    """
+    db = get_db()
+    started = time.perf_counter()
+    try:
+        query = messages_in_range_query(start_time, end_time, chat_id).execution_options(
+            stream_results=True, yield_per=READ_BATCH_SIZE
         )
         
-        # Format results as dict of thread_id -> messages
         threaded_messages = {}
-        for message, user, thread in messages:
-            if thread.thread_id not in threaded_messages:
-                threaded_messages[thread.thread_id] = []
-            
-            threaded_messages[thread.thread_id].append({
-                "time": message.timestamp,
-                "user_id": user.telegram_id,
-                "display_name": user.display_name,
-                "text": message.text
-            })
+        # Share one string object per display name across records
+        names = {}
+        count = 0
+        for message_id, timestamp, thread_id, user_id, display_name, text in db.execute(query):
+            thread_messages = threaded_messages.get(thread_id)
+            if thread_messages is None:
+                thread_messages = threaded_messages[thread_id] = []
+            thread_messages.append(MessageRecord(
+                message_id, timestamp, user_id, names.setdefault(display_name, display_name), text
+            ))
+            count += 1
         
-        logger.info(f"Retrieved {len(messages)} messages between {start_time} and {end_time}")
+        RANGE_QUERY_SECONDS.observe(time.perf_counter() - started)
+        logger.info(f"Retrieved {count} messages between {start_time} and {end_time}")
         return threaded_messages
     except Exception as e:
         logger.error(f"Error getting messages in range: {e}")
@@ -222,11 +840,11 @@ def get_messages_in_range(start_time, end_time):
 
 
 def get_thread_titles():
-    """Get all thread titles."""
+    """Get all thread titles, keyed by (chat ID, Telegram thread ID)."""
     db = get_db()
     try:
         threads = db.query(Thread).all()
-        thread_titles = {thread.thread_id: thread.title for thread in threads}
+        thread_titles = {(thread.chat_id, thread.thread_id): thread.title for thread in threads}
         return thread_titles
     except Exception as e:
         logger.error(f"Error getting thread titles: {e}")
@@ -235,39 +853,665 @@ def get_thread_titles():
         db.close()
 
 
-def migrate_from_json(json_data):
-    """Migrate data from JSON to database."""
+def get_chunk_summaries(start_time, end_time, chat_id=None):
+    """
+    Get the chunk summaries whose window starts within a time range.
+    
+    Args:
+        start_time (datetime): Start of the range
+        end_time (datetime): End of the range (exclusive)
+        chat_id (int): Restrict to one chat; None reads all chats
+    
+    Returns:
+        list: Dicts with thread_id (Telegram thread ID), window_start,
+            window_end, message_count, last_message_id and summary, ordered
+            by thread and window
+    """
+    db = get_db()
+    try:
+        query = (
+            db.query(ChunkSummary, Thread.thread_id)
+            .join(Thread, ChunkSummary.thread_id == Thread.id)
+            .filter(ChunkSummary.window_start >= start_time, ChunkSummary.window_start < end_time)
+        )
+        if chat_id is not None:
+            query = query.filter(Thread.chat_id == chat_id)
+        rows = query.order_by(Thread.thread_id, ChunkSummary.window_start).all()
+        return [
+            {
+                "thread_id": thread_id,
+                "window_start": chunk.window_start,
+                "window_end": chunk.window_end,
+                "message_count": chunk.message_count,
+                "last_message_id": chunk.last_message_id,
+                "summary": chunk.summary
+            }
+            for chunk, thread_id in rows
+        ]
+    except Exception as e:
+        logger.error(f"Error getting chunk summaries: {e}")
+        return []
+    finally:
+        db.close()
+
+
+def save_chunk_summary(thread_telegram_id, window_start, window_end, message_count, last_message_id, summary,
+                       chat_id=DEFAULT_CHAT_ID):
+    """Create or replace the summary of one thread's time bucket."""
+    db = get_db()
+    try:
+        thread = (
+            db.query(Thread)
+            .filter(Thread.chat_id == chat_id, Thread.thread_id == thread_telegram_id)
+            .first()
+        )
+        if not thread:
+            logger.warning(f"Cannot store chunk summary for unknown thread {thread_telegram_id} in chat {chat_id}")
+            return
+        
+        chunk = (
+            db.query(ChunkSummary)
+            .filter(ChunkSummary.thread_id == thread.id, ChunkSummary.window_start == window_start)
+            .first()
+        )
+        if not chunk:
+            chunk = ChunkSummary(thread_id=thread.id, window_start=window_start)
+            db.add(chunk)
+        chunk.window_end = window_end
+        chunk.message_count = message_count
+        chunk.last_message_id = last_message_id
+        chunk.summary = summary
+        chunk.created_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error saving chunk summary: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def get_window_fingerprint(start_time, end_time, chat_id=None):
+    """
+    Get per-thread message statistics that identify the contents of a time range.
+    
+    Args:
+        start_time (datetime): Start of the range
+        end_time (datetime): End of the range
+        chat_id (int): Restrict to one chat; None reads all chats
+    
+    Returns:
+        list: (thread_id, message count, max message id, max timestamp) tuples
+            ordered by Telegram thread ID
+    """
+    db = get_db()
+    try:
+        query = (
+            db.query(Thread.thread_id, func.count(Message.id), func.max(Message.id), func.max(Message.timestamp))
+            .join(Thread, Message.thread_id == Thread.id)
+            .filter(Message.timestamp >= start_time, Message.timestamp <= end_time)
+        )
+        if chat_id is not None:
+            query = query.filter(Message.chat_id == chat_id)
+        rows = query.group_by(Thread.thread_id).order_by(Thread.thread_id).all()
+        return [tuple(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error getting window fingerprint: {e}")
+        return []
+    finally:
+        db.close()
+
+
+def get_cached_summary(key):
+    """Get a cached summary that has not expired yet, or None."""
+    db = get_db()
+    try:
+        entry = (
+            db.query(SummaryCacheEntry)
+            .filter(SummaryCacheEntry.key == key, SummaryCacheEntry.expires_at > datetime.utcnow())
+            .first()
+        )
+        return entry.summary if entry else None
+    except Exception as e:
+        logger.error(f"Error reading summary cache: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def save_cached_summary(key, summary, ttl_seconds):
+    """Cache a summary for ttl_seconds, dropping expired entries."""
+    db = get_db()
+    try:
+        now = datetime.utcnow()
+        db.query(SummaryCacheEntry).filter(SummaryCacheEntry.expires_at <= now).delete()
+        
+        entry = db.query(SummaryCacheEntry).filter(SummaryCacheEntry.key == key).first()
+        if not entry:
+            entry = SummaryCacheEntry(key=key)
+            db.add(entry)
+        entry.summary = summary
+        entry.created_at = now
+        entry.expires_at = now + timedelta(seconds=ttl_seconds)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error writing summary cache: {e}")
+    finally:
+        db.close()
+
+
+def chat_to_dict(chat):
+    """Convert a Chat row to a plain dict."""
+    return {
+        "chat_id": chat.chat_id,
+        "title": chat.title,
+        "summary_cron": chat.summary_cron,
+        "enabled": chat.enabled
+    }
+
+
+def register_chat(chat_id, title=None, summary_cron=None):
+    """
+    Add a chat to the registry or update a registered one.
+    
+    Args:
+        chat_id (int): The Telegram chat ID
+        title (str): The chat's title; None keeps the stored one
+        summary_cron (str): Cron expression of its scheduled summary; None keeps the stored one
+        
+    Returns:
+        dict: The registered chat
+    """
+    db = get_db()
+    try:
+        chat = db.query(Chat).filter(Chat.chat_id == chat_id).first()
+        if not chat:
+            chat = Chat(chat_id=chat_id, enabled=True)
+            db.add(chat)
+            logger.info(f"Registered chat {chat_id} ({title})")
+        if title is not None and chat.title != title:
+            chat.title = title
+        if summary_cron is not None and chat.summary_cron != summary_cron:
+            chat.summary_cron = summary_cron
+        if db.new or db.dirty:
+            bump_cache_version(db, "chats")
+        db.commit()
+        return chat_to_dict(chat)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error registering chat {chat_id}: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def get_chats():
+    """Get all registered chats as dicts."""
+    db = get_db()
+    try:
+        return [chat_to_dict(chat) for chat in db.query(Chat).order_by(Chat.chat_id)]
+    except Exception as e:
+        logger.error(f"Error getting chats: {e}")
+        return []
+    finally:
+        db.close()
+
+
+def get_chat_members():
+    """
+    Get the members of every chat.
+    
+    Returns:
+        dict: Chat ID -> dict of Telegram user ID string -> display name
+    """
+    db = get_db()
+    try:
+        members = {}
+        for chat_id, user_id, display_name in db.query(
+            ChatMember.chat_id, ChatMember.telegram_user_id, ChatMember.display_name
+        ).order_by(ChatMember.id):
+            members.setdefault(chat_id, {})[str(user_id)] = display_name
+        return members
+    except Exception as e:
+        logger.error(f"Error getting chat members: {e}")
+        return {}
+    finally:
+        db.close()
+
+
+def add_chat_members(chat_id, members):
+    """
+    Add members to a chat, keeping the names of members already known.
+    
+    Args:
+        chat_id (int): The Telegram chat ID
+        members (dict): Telegram user ID -> display name
+        
+    Returns:
+        int: Number of members added
+    """
+    db = get_db()
     try:
-        db = get_db()
-        thread_logs = json_data.get("thread_logs", {})
-        thread_titles = json_data.get("thread_titles", {})
+        known = {
+            user_id for (user_id,) in
+            db.query(ChatMember.telegram_user_id).filter(ChatMember.chat_id == chat_id)
+        }
+        added = 0
+        for user_id, display_name in members.items():
+            if int(user_id) not in known:
+                db.add(ChatMember(chat_id=chat_id, telegram_user_id=int(user_id), display_name=display_name))
+                added += 1
+        if added:
+            bump_cache_version(db, "members")
+        db.commit()
+        return added
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error adding members to chat {chat_id}: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def acquire_lease(name, holder, ttl_seconds):
+    """
+    Take or renew a named lease.
+    
+    The lease is granted if it is free, expired or already held by the
+    caller. The conditional update is atomic on PostgreSQL and SQLite, so
+    at most one worker holds a lease at any time.
+    
+    Args:
+        name (str): The lease name
+        holder (str): Identifies the calling worker
+        ttl_seconds (float): How long the lease lasts unless renewed
         
-        # Count for logging
-        total_messages = 0
+    Returns:
+        bool: True if the caller holds the lease
+    """
+    db = get_db()
+    try:
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl_seconds)
+        updated = (
+            db.query(Lease)
+            .filter(Lease.name == name, or_(Lease.holder == holder, Lease.expires_at < now))
+            .update({Lease.holder: holder, Lease.expires_at: expires_at}, synchronize_session=False)
+        )
+        if not updated:
+            if db.query(Lease.id).filter(Lease.name == name).first() is not None:
+                db.rollback()
+                return False
+            db.add(Lease(name=name, holder=holder, expires_at=expires_at))
+        db.commit()
+        return True
+    except IntegrityError:
+        # Another worker created the lease first
+        db.rollback()
+        return False
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error acquiring lease {name}: {e}")
+        return False
+    finally:
+        db.close()
+
+
+def release_lease(name, holder):
+    """Give up a lease held by the caller, so another worker can take over at once."""
+    db = get_db()
+    try:
+        db.query(Lease).filter(Lease.name == name, Lease.holder == holder).delete()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error releasing lease {name}: {e}")
+    finally:
+        db.close()
+
+
+def get_last_job_run(name):
+    """Get the UTC time a scheduled job last completed, or None."""
+    db = get_db()
+    try:
+        run = db.query(JobRun).filter(JobRun.name == name).first()
+        return run.last_run_at if run else None
+    except Exception as e:
+        logger.error(f"Error reading last run of job {name}: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def record_job_run(name, run_at):
+    """Record that a scheduled job completed at the given naive UTC time."""
+    db = get_db()
+    try:
+        run = db.query(JobRun).filter(JobRun.name == name).first()
+        if not run:
+            run = JobRun(name=name)
+            db.add(run)
+        run.last_run_at = run_at
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error recording run of job {name}: {e}")
+    finally:
+        db.close()
+
+
+def get_daily_summaries(start_day, end_day, chat_id):
+    """
+    Get a chat's stored daily summaries.
+    
+    Args:
+        start_day (datetime): First day (inclusive)
+        end_day (datetime): Last day (exclusive)
+        chat_id (int): The chat
         
-        # Process each thread
-        for thread_id_str, messages in thread_logs.items():
-            thread_id = int(thread_id_str)
-            thread_title = thread_titles.get(thread_id_str, "Main Group Chat")
+    Returns:
+        dict: Day -> summary text, oldest first
+    """
+    db = get_db()
+    try:
+        rows = (
+            db.query(DailySummary.day, DailySummary.summary)
+            .filter(DailySummary.chat_id == chat_id, DailySummary.day >= start_day, DailySummary.day < end_day)
+            .order_by(DailySummary.day)
+            .all()
+        )
+        return {day: summary for day, summary in rows}
+    except Exception as e:
+        logger.error(f"Error getting daily summaries of chat {chat_id}: {e}")
+        return {}
+    finally:
+        db.close()
+
+
+def save_daily_summary(day, chat_id, summary, message_count):
+    """Store the summary of a chat's day, unless another worker stored it first."""
+    db = get_db()
+    try:
+        db.add(DailySummary(chat_id=chat_id, day=day, summary=summary, message_count=message_count))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error saving daily summary of chat {chat_id} for {day:%Y-%m-%d}: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def get_retention_candidates(horizon):
+    """
+    Find the chats with messages older than the retention horizon.
+    
+    Args:
+        horizon (datetime): Messages before this naive local time are due
+        
+    Returns:
+        dict: Chat ID -> timestamp of its oldest message
+    """
+    db = get_db()
+    try:
+        rows = (
+            db.query(Message.chat_id, func.min(Message.timestamp))
+            .filter(Message.timestamp < horizon)
+            .group_by(Message.chat_id)
+            .all()
+        )
+        return {chat_id: oldest for chat_id, oldest in rows}
+    except Exception as e:
+        logger.error(f"Error finding messages due for retention: {e}")
+        return {}
+    finally:
+        db.close()
+
+
+def get_rollup_watermark(chat_id, day):
+    """Get the highest message ID already rolled up for a chat's day, or 0."""
+    db = get_db()
+    try:
+        watermark = (
+            db.query(func.max(MessageRollup.last_message_id))
+            .filter(MessageRollup.chat_id == chat_id, MessageRollup.day == day)
+            .scalar()
+        )
+        return watermark or 0
+    finally:
+        db.close()
+
+
+def iter_messages_for_archive(chat_id, start_time, end_time, after_id=0):
+    """
+    Stream the full rows of a chat's messages in a time range for archiving.
+    
+    Args:
+        chat_id (int): The chat
+        start_time (datetime): Start of the range (inclusive)
+        end_time (datetime): End of the range (exclusive)
+        after_id (int): Only messages with a higher ID are returned
+        
+    Yields:
+        dict: One message with its user and thread, oldest ID first
+    """
+    db = get_db()
+    try:
+        query = (
+            select(
+                Message.id, Message.telegram_message_id, Message.timestamp, Message.text, Message.thread_id,
+                Thread.thread_id, Thread.title, User.telegram_id, User.display_name
+            )
+            .join_from(Message, User, Message.user_id == User.id)
+            .join(Thread, Message.thread_id == Thread.id)
+            .where(
+                Message.chat_id == chat_id, Message.timestamp >= start_time, Message.timestamp < end_time,
+                Message.id > after_id
+            )
+            .order_by(Message.id)
+            .execution_options(stream_results=True, yield_per=READ_BATCH_SIZE)
+        )
+        for row in db.execute(query):
+            yield {
+                "id": row[0],
+                "chat_id": chat_id,
+                "telegram_message_id": row[1],
+                "timestamp": row[2],
+                "text": row[3],
+                "thread_pk": row[4],
+                "thread_id": row[5],
+                "thread_title": row[6],
+                "user_id": row[7],
+                "display_name": row[8]
+            }
+    finally:
+        db.close()
+
+
+def save_rollups(chat_id, day, rollups, last_message_id):
+    """
+    Add a day's activity to the rollups of its threads, in one transaction.
+    
+    The day's chunk summaries of each thread are folded into its rollup and
+    deleted.
+    
+    Args:
+        chat_id (int): The chat
+        day (datetime): Local midnight starting the day
+        rollups (dict): Thread row ID -> dict with message_count, user_counts
+            (Telegram user ID -> count), first_message_at and last_message_at
+        last_message_id (int): Highest message ID included
+    """
+    db = get_db()
+    try:
+        next_day = day + timedelta(days=1)
+        for thread_pk, activity in rollups.items():
+            rollup = (
+                db.query(MessageRollup)
+                .filter(MessageRollup.thread_id == thread_pk, MessageRollup.day == day)
+                .first()
+            )
+            if not rollup:
+                rollup = MessageRollup(
+                    chat_id=chat_id, thread_id=thread_pk, day=day, message_count=0, user_counts="{}",
+                    first_message_at=activity["first_message_at"], last_message_at=activity["last_message_at"]
+                )
+                db.add(rollup)
             
-            # Add thread
-            thread = add_thread(thread_id, thread_title)
+            user_counts = json.loads(rollup.user_counts)
+            for user_id, count in activity["user_counts"].items():
+                user_counts[str(user_id)] = user_counts.get(str(user_id), 0) + count
+            rollup.user_counts = json.dumps(user_counts, sort_keys=True)
+            rollup.message_count += activity["message_count"]
+            rollup.first_message_at = min(rollup.first_message_at, activity["first_message_at"])
+            rollup.last_message_at = max(rollup.last_message_at, activity["last_message_at"])
+            rollup.last_message_id = last_message_id
+            rollup.updated_at = datetime.utcnow()
             
-            # Process messages in thread
-            for msg in messages:
-                # Get data
-                user_id = msg.get("user_id")
-                display_name = msg.get("display_name")
-                text = msg.get("text")
-                timestamp = datetime.fromisoformat(msg.get("time"))
-                
-                # Add message
-                add_message(user_id, display_name, thread_id, thread_title, text, timestamp)
-                total_messages += 1
+            chunks = (
+                db.query(ChunkSummary)
+                .filter(
+                    ChunkSummary.thread_id == thread_pk,
+                    ChunkSummary.window_start >= day, ChunkSummary.window_start < next_day
+                )
+                .order_by(ChunkSummary.window_start)
+                .all()
+            )
+            if chunks:
+                summaries = ([rollup.summary] if rollup.summary else []) + [chunk.summary for chunk in chunks]
+                rollup.summary = "\n\n".join(summaries)
+                for chunk in chunks:
+                    db.delete(chunk)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error saving rollups of chat {chat_id} for {day:%Y-%m-%d}: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def delete_messages_batch(chat_id, start_time, end_time, max_id, batch_size):
+    """
+    Delete up to batch_size of a chat's messages in a time range, in a short transaction.
+    
+    Args:
+        chat_id (int): The chat
+        start_time (datetime): Start of the range (inclusive)
+        end_time (datetime): End of the range (exclusive)
+        max_id (int): Only messages up to this ID are deleted
+        batch_size (int): Maximum number of messages deleted
         
-        logger.info(f"Migrated {total_messages} messages from JSON to database")
+    Returns:
+        int: Number of messages deleted; 0 once none are left
+    """
+    db = get_db()
+    try:
+        ids = [
+            message_id for (message_id,) in db.query(Message.id)
+            .filter(
+                Message.chat_id == chat_id, Message.timestamp >= start_time, Message.timestamp < end_time,
+                Message.id <= max_id
+            )
+            .limit(batch_size)
+        ]
+        if ids:
+            db.query(Message).filter(Message.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        return len(ids)
     except Exception as e:
         db.rollback()
-        logger.error(f"Error migrating data: {e}")
+        logger.error(f"Error deleting messages of chat {chat_id}: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def get_activity_stats(start_time, end_time, chat_id):
+    """
+    Count a chat's messages per user and per thread, including archived days.
+    
+    Archived days count whole from their rollups, as soon as the day starts
+    within the range; stored messages count by their exact timestamp.
+    
+    Args:
+        start_time (datetime): Start of the range (inclusive)
+        end_time (datetime): End of the range (exclusive)
+        chat_id (int): The chat
+        
+    Returns:
+        dict: "messages" -> total, "users" -> Telegram user ID -> count,
+            "threads" -> Telegram thread ID -> count
+    """
+    db = get_db()
+    try:
+        users = {}
+        threads = {}
+        
+        rollups = (
+            db.query(Thread.thread_id, MessageRollup.message_count, MessageRollup.user_counts)
+            .join(Thread, MessageRollup.thread_id == Thread.id)
+            .filter(MessageRollup.chat_id == chat_id, MessageRollup.day >= start_time, MessageRollup.day < end_time)
+        )
+        for thread_id, message_count, user_counts in rollups:
+            threads[thread_id] = threads.get(thread_id, 0) + message_count
+            for user_id, count in json.loads(user_counts).items():
+                users[int(user_id)] = users.get(int(user_id), 0) + count
+        
+        stored = (
+            db.query(Thread.thread_id, User.telegram_id, func.count(Message.id))
+            .join(Thread, Message.thread_id == Thread.id)
+            .join(User, Message.user_id == User.id)
+            .filter(Message.chat_id == chat_id, Message.timestamp >= start_time, Message.timestamp < end_time)
+            .group_by(Thread.thread_id, User.telegram_id)
+        )
+        for thread_id, user_id, count in stored:
+            threads[thread_id] = threads.get(thread_id, 0) + count
+            users[user_id] = users.get(user_id, 0) + count
+        
+        return {"messages": sum(threads.values()), "users": users, "threads": threads}
+    except Exception as e:
+        logger.error(f"Error getting activity stats of chat {chat_id}: {e}")
+        return {"messages": 0, "users": {}, "threads": {}}
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+def warm_identity_cache():
+    """
+    Load known users, threads and chat members into the identity cache.
+    
+    Returns:
+        tuple: Number of (users, threads) cached
+    """
+    db = get_db()
+    try:
+        users = db.query(User.telegram_id, User.id, User.display_name).limit(user_cache.max_size).all()
+        for telegram_id, pk, display_name in users:
+            user_cache.set(telegram_id, (pk, display_name))
+        
+        threads = (
+            db.query(Thread.chat_id, Thread.thread_id, Thread.id, Thread.title)
+            .limit(thread_cache.max_size)
+            .all()
+        )
+        for chat_id, thread_id, pk, title in threads:
+            thread_cache.set((chat_id, thread_id), (pk, title))
+        
+        members = (
+            db.query(ChatMember.chat_id, ChatMember.telegram_user_id, ChatMember.display_name)
+            .limit(member_cache.max_size)
+            .all()
+        )
+        for chat_id, user_id, display_name in members:
+            member_cache.set((chat_id, user_id), display_name)
+        
+        return len(users), len(threads)
+    except Exception as e:
+        logger.error(f"Error warming identity cache: {e}")
+        return 0, 0
+    finally:
+        db.close()
@@ -0,0 +1,105 @@
+"""
+Thread pools for running blocking work off the event loop.
+
+Database I/O and CPU-bound prompt preparation run in separate bounded pools,
+so a slow summary never delays the coroutines that handle incoming updates.
+"""
+
+import os
+import asyncio
+import logging
+import weakref
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", "4"))
+GENERATION_EXECUTOR_WORKERS = int(os.environ.get("GENERATION_EXECUTOR_WORKERS", "2"))
+# Calls allowed to wait for a worker before further callers are held back
+EXECUTOR_MAX_PENDING = int(os.environ.get("EXECUTOR_MAX_PENDING", "64"))
+
+
+class BoundedExecutor:
+    """
+    A thread pool that applies backpressure.
+
+    At most max_pending calls are submitted at once; further callers wait
+    on the event loop instead of growing the pool's queue without bound.
+    """
+
+    def __init__(self, name, workers, max_pending=EXECUTOR_MAX_PENDING):
+        """
+        Args:
+            name (str): Thread name prefix
+            workers (int): Number of worker threads
+            max_pending (int): Maximum number of submitted, unfinished calls
+        """
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._max_pending = max_pending
+        self._pending = 0
+        # asyncio semaphores are bound to their loop
+        self._slots = weakref.WeakKeyDictionary()
+
+    @property
+    def pending(self):
+        """Number of submitted calls that have not finished."""
+        return self._pending
+
+    @property
+    def saturated(self):
+        """Whether new calls currently have to wait."""
+        return self._pending >= self._max_pending
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking function in the pool.
+
+        Args:
+            func: The function to call
+            *args: Positional arguments for func
+            **kwargs: Keyword arguments for func
+
+        Returns:
+            The function's return value
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self._max_pending)
+
+        if slots.locked():
+            logger.warning(f"{self.name} executor saturated, waiting for a free slot")
+
+        async with slots:
+            self._pending += 1
+            try:
+                return await loop.run_in_executor(self._pool, partial(func, *args, **kwargs))
+            finally:
+                self._pending -= 1
+
+    def shutdown(self):
+        """Stop accepting work and wait for running calls."""
+        self._pool.shutdown(wait=True)
+
+
+db_executor = BoundedExecutor("db", DB_EXECUTOR_WORKERS)
+generation_executor = BoundedExecutor("generation", GENERATION_EXECUTOR_WORKERS)
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database call in the database pool."""
+    return await db_executor.run(func, *args, **kwargs)
+
+
+async def run_generation(func, *args, **kwargs):
+    """Run CPU-bound summary preparation in the generation pool."""
+    return await generation_executor.run(func, *args, **kwargs)
+
+
+def shutdown_executors():
+    """Shut down all pools."""
+    db_executor.shutdown()
+    generation_executor.shutdown()
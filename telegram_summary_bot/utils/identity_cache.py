@@ -0,0 +1,63 @@
+"""
+In-memory cache of user and thread identities.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+# Maximum number of users / threads kept in memory
+IDENTITY_CACHE_SIZE = int(os.environ.get("IDENTITY_CACHE_SIZE", "4096"))
+
+
+class LRUCache:
+    """A thread-safe mapping that evicts the least recently used entry when full."""
+
+    def __init__(self, max_size=IDENTITY_CACHE_SIZE):
+        """
+        Args:
+            max_size (int): Maximum number of entries to keep
+        """
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Get an entry and mark it as recently used."""
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        """Add or replace an entry, evicting the oldest one if needed."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        """Remove an entry if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# telegram user id -> (users.id, display_name)
+user_cache = LRUCache()
+
+# (chat id, telegram thread id) -> (threads.id, title)
+thread_cache = LRUCache()
+
+# (chat id, telegram user id) -> display name of a known chat member
+member_cache = LRUCache()
@@ -0,0 +1,298 @@
+"""
+Write-behind ingestion queue for incoming messages.
+"""
+
+import os
+import time
+import logging
+import threading
+
+from sqlalchemy.exc import IntegrityError, DataError
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+from telegram_summary_bot.utils.database import add_messages_bulk
+from telegram_summary_bot.utils.metrics import REGISTRY
+
+# Flush when this many messages are buffered...
+BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "100"))
+# ...or when the oldest buffered message is this old
+FLUSH_INTERVAL_MS = int(os.environ.get("INGEST_FLUSH_INTERVAL_MS", "500"))
+# Most messages buffered while the database is unavailable; past it the oldest are dropped
+MAX_BUFFER = int(os.environ.get("INGEST_MAX_BUFFER", "10000"))
+# Wait before retrying a failed flush, doubled on each consecutive failure...
+RETRY_BACKOFF_MS = int(os.environ.get("INGEST_RETRY_BACKOFF_MS", "1000"))
+# ...up to this
+MAX_RETRY_BACKOFF_MS = int(os.environ.get("INGEST_MAX_RETRY_BACKOFF_MS", "60000"))
+# Errors caused by the records themselves; a batch failing with anything else
+# is kept whole and retried, since the database rather than the data is at fault
+RECORD_ERRORS = (IntegrityError, DataError)
+
+
+class IngestionQueue:
+    """
+    Buffers messages in memory and writes them in batches.
+
+    Producers call put(), which never touches the database. A background
+    thread flushes the buffer in one transaction whenever it reaches the
+    batch size or the flush interval elapses.
+
+    A batch rejected because of its records is split in halves until the
+    records that cannot be written are isolated, so one bad record does not
+    cost the rest of its batch. A batch that fails for any other reason, like
+    the database being unavailable, is kept and retried with a growing
+    backoff; while it is, the buffer holds at most max_buffer records and
+    the oldest are dropped to make room for new ones.
+    """
+
+    def __init__(self, flush_func, batch_size=BATCH_SIZE, flush_interval_ms=FLUSH_INTERVAL_MS, on_drop=None,
+                 max_buffer=MAX_BUFFER):
+        """
+        Args:
+            flush_func: Callable that persists a list of records in one transaction
+            batch_size (int): Number of buffered records that triggers a flush
+            flush_interval_ms (int): Maximum time a record waits before being flushed
+            on_drop: Optional callable given the list of records that were dropped
+            max_buffer (int): Most records buffered; the oldest are dropped past it
+        """
+        self._flush_func = flush_func
+        self.on_drop = on_drop
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval_ms / 1000
+        self._max_buffer = max_buffer
+
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._failed_attempts = 0
+        self._retry_at = 0.0
+
+        # Counters
+        self._enqueued = 0
+        self._flushed = 0
+        self._dropped = 0
+        self._overflowed = 0
+        self._flush_count = 0
+        self._flush_errors = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def depth(self):
+        """Number of messages waiting to be written."""
+        return len(self._buffer)
+
+    def put(self, record):
+        """
+        Queue a record for writing.
+
+        Args:
+            record (dict): The message record
+
+        Returns:
+            int: The queue depth after adding the record
+        """
+        with self._lock:
+            self._buffer.append(record)
+            self._enqueued += 1
+            overflow = self._trim_buffer()
+            depth = len(self._buffer)
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name="ingestion-writer", daemon=True)
+                self._thread.start()
+
+        self._drop_overflow(overflow)
+        if depth >= self._batch_size:
+            self._wakeup.set()
+        return depth
+
+    def _trim_buffer(self):
+        """
+        Remove the oldest records past the buffer limit; the caller holds the lock.
+
+        Returns:
+            list: The removed records
+        """
+        excess = len(self._buffer) - self._max_buffer
+        if excess <= 0:
+            return []
+        overflow, self._buffer = self._buffer[:excess], self._buffer[excess:]
+        self._overflowed += len(overflow)
+        return overflow
+
+    def _drop_overflow(self, overflow):
+        """Report records removed from a full buffer."""
+        if not overflow:
+            return
+        logger.error(f"Ingestion buffer is full, dropped the {len(overflow)} oldest messages")
+        if self.on_drop is not None:
+            self.on_drop(overflow)
+
+    def flush(self):
+        """
+        Write everything currently buffered.
+
+        Returns:
+            int: Number of records written
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                self._flush_func(batch)
+            except RECORD_ERRORS as e:
+                self._flush_errors += 1
+                logger.error(f"Failed to flush {len(batch)} messages, writing them in smaller batches: {e}")
+                return self._flush_isolating_failures(batch)
+            except Exception as e:
+                self._flush_errors += 1
+                self._requeue(batch, e)
+                return 0
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._failed_attempts = 0
+            self._flushed += len(batch)
+            self._flush_count += 1
+            self._last_flush_ms = elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+            return len(batch)
+
+    def _requeue(self, batch, error):
+        """
+        Put records back in front of the buffer and delay the next background flush.
+
+        Args:
+            batch (list): The records that were not written
+            error (Exception): Why they were not written
+        """
+        self._failed_attempts += 1
+        backoff_ms = min(RETRY_BACKOFF_MS * 2 ** (self._failed_attempts - 1), MAX_RETRY_BACKOFF_MS)
+        self._retry_at = time.monotonic() + backoff_ms / 1000
+        logger.error(f"Failed to flush {len(batch)} messages {self._failed_attempts} times, "
+                     f"retrying in {backoff_ms} ms: {error}")
+        # In front so ordering is preserved on retry
+        with self._lock:
+            self._buffer[:0] = batch
+            overflow = self._trim_buffer()
+        self._drop_overflow(overflow)
+
+    def _flush_isolating_failures(self, batch):
+        """
+        Write a batch rejected because of its records, dropping only the records that fail on their own.
+
+        Args:
+            batch (list): The records to write
+
+        Returns:
+            int: Number of records written
+        """
+        written, dropped = [], []
+        try:
+            self._write_isolating_failures(batch, written, dropped)
+        except Exception as e:
+            # The database failed while the batch was being split; keep what is left of it
+            handled = {id(r) for r in written} | {id(r) for r in dropped}
+            self._requeue([r for r in batch if id(r) not in handled], e)
+        else:
+            self._failed_attempts = 0
+
+        self._flushed += len(written)
+        if dropped:
+            logger.error(f"Dropping {len(dropped)} messages that could not be written")
+            self._dropped += len(dropped)
+            if self.on_drop is not None:
+                self.on_drop(dropped)
+        return len(written)
+
+    def _write_isolating_failures(self, batch, written, dropped):
+        """
+        Write a batch in halves, recursing into the halves rejected because of their records.
+
+        Args:
+            batch (list): The records to write
+            written (list): Records that are written are appended here
+            dropped (list): Records that fail on their own are appended here
+
+        Raises:
+            Exception: Any error not caused by the records
+        """
+        try:
+            self._flush_func(batch)
+            written.extend(batch)
+            return
+        except RECORD_ERRORS as e:
+            self._flush_errors += 1
+            if len(batch) == 1:
+                logger.error(f"Could not write message {batch[0].get('telegram_message_id')}: {e}")
+                dropped.append(batch[0])
+                return
+
+        middle = len(batch) // 2
+        self._write_isolating_failures(batch[:middle], written, dropped)
+        self._write_isolating_failures(batch[middle:], written, dropped)
+
+    def stop(self, timeout=10):
+        """
+        Stop the background writer and drain the buffer.
+
+        Args:
+            timeout (float): Seconds to wait for the writer thread to exit
+        """
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        written = self.flush()
+        logger.info(f"Ingestion queue drained, {written} pending messages written")
+
+    def stats(self):
+        """
+        Get queue depth and flush latency counters.
+
+        Returns:
+            dict: The current counter values
+        """
+        return {
+            "depth": self.depth,
+            "enqueued": self._enqueued,
+            "flushed": self._flushed,
+            "dropped": self._dropped,
+            "overflowed": self._overflowed,
+            "flush_count": self._flush_count,
+            "flush_errors": self._flush_errors,
+            "last_flush_ms": round(self._last_flush_ms, 2),
+            "max_flush_ms": round(self._max_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self._flush_count, 2) if self._flush_count else 0.0
+        }
+
+    def _run(self):
+        """Background writer loop."""
+        while not self._stopped:
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            if self._stopped:
+                break
+            if time.monotonic() < self._retry_at:
+                # Back off while the database is failing
+                continue
+            self.flush()
+
+
+# Process-wide queue used by the storage layer
+ingestion_queue = IngestionQueue(add_messages_bulk)
+
+REGISTRY.gauge("bot_ingestion_queue_depth", "Messages waiting to be written", lambda: ingestion_queue.depth)
+REGISTRY.gauge("bot_ingestion_dropped_messages", "Messages dropped because the database rejected them",
+               lambda: ingestion_queue.stats()["dropped"])
+REGISTRY.gauge("bot_ingestion_overflowed_messages", "Messages dropped because the buffer was full",
+               lambda: ingestion_queue.stats()["overflowed"])
@@ -0,0 +1,267 @@
+"""
+Bulk import of the legacy JSON message history into the database.
+
+The history file is parsed incrementally, so memory use does not depend on
+its size, and messages are written in large batches with one transaction
+per batch. A checkpoint file records how many messages have been committed,
+so an interrupted import resumes where it stopped.
+
+Every imported message gets a key derived from its place in the file and
+its content, stored as its Telegram message ID, so the messages of a batch
+that was committed but not checkpointed are skipped as duplicates when the
+import is repeated.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+from telegram_summary_bot.utils.database import add_messages_bulk, add_thread
+
+# Messages written per transaction
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "5000"))
+# Characters read from the file at a time
+READ_CHUNK_SIZE = 1 << 16
+
+
+class JsonStreamReader:
+    """Reads JSON values one at a time from a file without loading it whole."""
+
+    def __init__(self, f, chunk_size=READ_CHUNK_SIZE):
+        """
+        Args:
+            f: A text file object
+            chunk_size (int): Characters read per refill
+        """
+        self._file = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Read more of the file, dropping what has been consumed."""
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Get the next non-whitespace character without consuming it, or "" at end of file."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        """Consume the next non-whitespace character, which must be char."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r} in JSON history")
+        self._pos += 1
+
+    def skip_comma(self):
+        """Consume a separating comma if one follows."""
+        if self.peek() == ",":
+            self._pos += 1
+
+    def read_value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A value touching the end of the buffer may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+
+def iter_json_history(path):
+    """
+    Stream the contents of a legacy message_history.json file.
+
+    Args:
+        path (str): Path of the JSON file
+
+    Yields:
+        tuple: ("message", thread ID string, message dict) for every message,
+            and ("titles", None, dict of thread ID string -> title)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        reader = JsonStreamReader(f)
+        reader.expect("{")
+        while reader.peek() != "}":
+            key = reader.read_value()
+            reader.expect(":")
+
+            if key == "thread_logs":
+                reader.expect("{")
+                while reader.peek() != "}":
+                    thread_id = reader.read_value()
+                    reader.expect(":")
+                    reader.expect("[")
+                    while reader.peek() != "]":
+                        yield "message", thread_id, reader.read_value()
+                        reader.skip_comma()
+                    reader.expect("]")
+                    reader.skip_comma()
+                reader.expect("}")
+            elif key == "thread_titles":
+                yield "titles", None, reader.read_value()
+            else:
+                reader.read_value()
+
+            reader.skip_comma()
+
+
+def iter_json_data(json_data):
+    """Produce the same events as iter_json_history from already loaded data."""
+    yield "titles", None, json_data.get("thread_titles", {})
+    for thread_id, messages in json_data.get("thread_logs", {}).items():
+        for msg in messages:
+            yield "message", thread_id, msg
+
+
+def load_checkpoint(checkpoint_path):
+    """Get the number of messages committed by a previous run."""
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("messages", 0)
+
+
+def save_checkpoint(checkpoint_path, messages):
+    """Record the number of committed messages."""
+    if not checkpoint_path:
+        return
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"messages": messages, "updated_at": datetime.now().isoformat()}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def import_key(thread_id, position, msg):
+    """
+    Get the key of an imported message.
+
+    Args:
+        thread_id (str): The thread ID string of the history file
+        position (int): Index of the message in its thread
+        msg (dict): The message
+
+    Returns:
+        int: A negative 63-bit ID, which cannot collide with the positive
+            IDs Telegram assigns
+    """
+    content = json.dumps(
+        [thread_id, position, msg.get("user_id"), msg.get("time"), msg.get("text")], ensure_ascii=False
+    )
+    digest = hashlib.sha256(content.encode("utf-8")).digest()
+    return -(int.from_bytes(digest[:8], "big") >> 1) - 1
+
+
+def import_history(events, checkpoint_path=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Write streamed history events to the database in batches.
+
+    Args:
+        events: Iterable of events as produced by iter_json_history
+        checkpoint_path (str): File used to resume an interrupted import
+        batch_size (int): Messages per transaction
+
+    Returns:
+        int: Number of messages written by this run, not counting ones
+            already stored by an earlier run
+    """
+    skip = load_checkpoint(checkpoint_path)
+    if skip:
+        logger.info(f"Resuming JSON import after {skip} already imported messages")
+
+    titles = {}
+    batch = []
+    # Thread ID string -> messages of the thread seen so far
+    positions = {}
+    processed = 0
+    imported = 0
+    started = time.perf_counter()
+
+    def flush():
+        nonlocal imported
+        imported += add_messages_bulk(batch)
+        save_checkpoint(checkpoint_path, processed)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Imported {processed} messages ({(processed - skip) / elapsed:.0f} messages/s)")
+        batch.clear()
+
+    for kind, thread_id, value in events:
+        if kind == "titles":
+            titles.update(value)
+            continue
+
+        processed += 1
+        position = positions.get(thread_id, 0)
+        positions[thread_id] = position + 1
+        if processed <= skip:
+            continue
+
+        batch.append({
+            "telegram_user_id": value.get("user_id"),
+            "display_name": value.get("display_name"),
+            "thread_telegram_id": int(thread_id),
+            "thread_title": titles.get(thread_id, "Main Group Chat"),
+            "text": value.get("text"),
+            "timestamp": datetime.fromisoformat(value.get("time")),
+            "telegram_message_id": import_key(thread_id, position, value)
+        })
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    # Titles may come after the messages in the file; apply them now
+    for thread_id, title in titles.items():
+        add_thread(int(thread_id), title)
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    logger.info(f"Migrated {imported} messages from JSON to database in {time.perf_counter() - started:.1f}s")
+    return imported
+
+
+def import_json_file(path, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import a legacy message_history.json file, resuming a previous attempt if any.
+
+    Args:
+        path (str): Path of the JSON file
+        batch_size (int): Messages per transaction
+
+    Returns:
+        int: Number of messages imported by this run
+    """
+    return import_history(iter_json_history(path), checkpoint_path=f"{path}.checkpoint", batch_size=batch_size)
+
+
+def migrate_from_json(json_data):
+    """Migrate already loaded JSON data to the database."""
+    return import_history(iter_json_data(json_data))
@@ -0,0 +1,83 @@
+"""
+Leader election between bot workers sharing one database.
+
+Several workers can serve the same bot behind a webhook load balancer, but
+scheduled summaries must be posted once. The workers compete for a lease
+row in the database; the holder renews it every third of its lifetime and
+runs the leader-only jobs. If the leader dies, its lease expires and
+another worker takes over within LEADER_LEASE_SECONDS.
+"""
+
+import os
+import socket
+import asyncio
+import logging
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+from telegram_summary_bot.utils.database import acquire_lease, release_lease
+from telegram_summary_bot.utils.executors import run_db
+
+# Identifies this worker in the leases table
+WORKER_ID = os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+# Seconds a lease lasts unless renewed; bounds the failover time
+LEADER_LEASE_SECONDS = float(os.environ.get("LEADER_LEASE_SECONDS", "60"))
+
+
+class LeaderElection:
+    """Holds or competes for a named lease in the background."""
+
+    def __init__(self, name="scheduler", worker_id=WORKER_ID, lease_seconds=LEADER_LEASE_SECONDS):
+        """
+        Args:
+            name (str): The lease name
+            worker_id (str): Identifies this worker
+            lease_seconds (float): How long the lease lasts unless renewed
+        """
+        self.name = name
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._is_leader = False
+        self._task = None
+
+    @property
+    def is_leader(self):
+        """Whether this worker held the lease at its last renewal."""
+        return self._is_leader
+
+    async def _renew(self):
+        """Take or renew the lease once, logging leadership changes."""
+        try:
+            is_leader = await run_db(acquire_lease, self.name, self.worker_id, self.lease_seconds)
+        except Exception as e:
+            logger.error(f"Failed to renew lease {self.name}: {e}")
+            is_leader = False
+
+        if is_leader != self._is_leader:
+            if is_leader:
+                logger.info(f"Worker {self.worker_id} is now the {self.name} leader")
+            else:
+                logger.warning(f"Worker {self.worker_id} is no longer the {self.name} leader")
+        self._is_leader = is_leader
+
+    async def _renew_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self._renew()
+
+    async def start(self):
+        """Compete for the lease now and keep renewing it in the background."""
+        await self._renew()
+        self._task = asyncio.create_task(self._renew_loop(), name=f"lease:{self.name}")
+
+    async def stop(self):
+        """Stop renewing and hand the lease to another worker if this one holds it."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._is_leader:
+            await run_db(release_lease, self.name, self.worker_id)
+            self._is_leader = False
+            logger.info(f"Worker {self.worker_id} released the {self.name} lease")
@@ -0,0 +1,155 @@
+"""
+Non-blocking logging pipeline.
+
+Records are put on an in-memory queue by a QueueHandler and written by a
+QueueListener thread, so handlers on the event loop never wait for the
+console or the disk. The log file is JSON, one record per line, and
+rotates by size. Per-message lines pass through a rate limiter: log them
+with extra=sampled("key", ...) and at most LOG_SAMPLE_RATE lines a second
+of each key are kept, the next kept line noting how many were dropped.
+
+This module must not import the rest of the package; config.py sets up
+logging with it before anything else is loaded.
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Rotate the log file when it reaches this size
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+# Rotated files kept next to the current one
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
+# Sampled lines kept per second for each key
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1"))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def sampled(key, **fields):
+    """
+    Build the extra argument of a rate-limited log call.
+
+    Args:
+        key (str): Lines with the same key share a rate limit
+        **fields: Structured fields added to the JSON record
+
+    Returns:
+        dict: Pass as extra= to the logging call
+    """
+    return {"sample_key": key, "fields": fields}
+
+
+class RateLimitFilter(logging.Filter):
+    """Keeps at most rate records a second of each sample key; others always pass."""
+
+    def __init__(self, rate=LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+        self._lock = threading.Lock()
+        # Sample key -> [tokens, last refill time, suppressed count]
+        self._buckets = {}
+
+    def filter(self, record):
+        key = getattr(record, "sample_key", None)
+        if key is None:
+            return True
+        if self.rate <= 0:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.rate, now, 0]
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f"{record.getMessage()} ({suppressed} similar lines suppressed)"
+            record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if getattr(record, "suppressed", None):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """A QueueHandler that keeps the structured fields of records for the writer thread."""
+
+    def prepare(self, record):
+        # The base class formats the message and drops exc_info; format
+        # the traceback here too, since the writer formats records again
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def setup_logging(logger, log_file, level=logging.INFO):
+    """
+    Send a logger's records through a queue to the console and a rotating JSON file.
+
+    Args:
+        logger (logging.Logger): The logger to set up
+        log_file (str): Path of the log file
+        level (int): The lowest level logged
+
+    Returns:
+        QueueListener: The started writer; it is stopped at exit
+    """
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    # Unbounded, so putting a record never waits for the writer
+    log_queue = queue.SimpleQueue()
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    # Dropped lines are discarded before they are queued
+    queue_handler.addFilter(RateLimitFilter())
+
+    logger.setLevel(level)
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
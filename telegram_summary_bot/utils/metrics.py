@@ -0,0 +1,339 @@
+"""
+In-process metrics with a Prometheus text endpoint.
+
+Counters, gauges and histograms are kept in memory and are safe to update
+from the event loop and the worker threads alike. Set METRICS_PORT to
+serve them at http://METRICS_HOST:METRICS_PORT/metrics in the Prometheus
+text format; the /stats command shows the same numbers in the chat.
+"""
+
+import os
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+# Port of the metrics endpoint; 0 disables it
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+# Only local scrapers by default
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+
+# Bucket bounds in seconds, from fast DB calls to slow generations
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+
+class Metric:
+    """Base of the metric types: a name, a help text and optional label names."""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.label_names, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def items(self):
+        """Get (label values tuple, value) pairs of every label combination."""
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in self.items()]
+
+
+class Gauge(Metric):
+    """A value read from a callback when the metrics are collected."""
+
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, read):
+        """
+        Args:
+            name (str): The metric name
+            documentation (str): The help text
+            read: Zero-argument callable returning the current value
+        """
+        super().__init__(name, documentation)
+        self._read = read
+
+    def value(self):
+        try:
+            return self._read()
+        except Exception as e:
+            logger.warning(f"Failed to read gauge {self.name}: {e}")
+            return float("nan")
+
+    def render(self):
+        return [f"{self.name} {self.value()}"]
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            entry["counts"][index] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in the with block, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _snapshot(self):
+        with self._lock:
+            return [(key, dict(entry, counts=list(entry["counts"]))) for key, entry in self._values.items()]
+
+    def summary(self):
+        """
+        Summarize the observations of every label combination.
+
+        Returns:
+            dict: Label values tuple -> dict with count, avg, p50 and p95;
+                quantiles are the upper bounds of the buckets they fall in
+        """
+        result = {}
+        for key, entry in self._snapshot():
+            result[key] = {
+                "count": entry["count"],
+                "avg": entry["sum"] / entry["count"] if entry["count"] else 0.0,
+                "p50": self._quantile(entry, 0.5),
+                "p95": self._quantile(entry, 0.95)
+            }
+        return result
+
+    def _quantile(self, entry, quantile):
+        target = quantile * entry["count"]
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), entry["counts"]):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def render(self):
+        lines = []
+        for key, entry in self._snapshot():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {entry['sum']}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {entry['count']}")
+        return lines
+
+
+class Registry:
+    """The set of metrics exposed together."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, read):
+        return self.register(Gauge(name, documentation, read))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    @property
+    def metrics(self):
+        return list(self._metrics.values())
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry and the bot's metrics
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    "bot_handler_seconds", "Time spent handling an update", labels=("handler",)
+)
+DB_INSERT_SECONDS = REGISTRY.histogram(
+    "bot_db_insert_seconds", "Time to write a batch of messages, including the commit"
+)
+DB_COMMIT_SECONDS = REGISTRY.histogram(
+    "bot_db_commit_seconds", "Time to commit a batch of messages"
+)
+DB_INSERTED_MESSAGES = REGISTRY.counter(
+    "bot_db_inserted_messages_total", "Messages written to the database"
+)
+RANGE_QUERY_SECONDS = REGISTRY.histogram(
+    "bot_range_query_seconds", "Time to read the messages of a time range"
+)
+PROMPT_CHARS = REGISTRY.histogram(
+    "bot_prompt_chars", "Characters in prompts sent to the model", labels=("kind",), buckets=SIZE_BUCKETS
+)
+PROMPT_TOKENS = REGISTRY.histogram(
+    "bot_prompt_tokens", "Estimated tokens in prompts sent to the model", labels=("kind",),
+    buckets=tuple(bound // 4 for bound in SIZE_BUCKETS)
+)
+PROMPT_BUILD_SECONDS = REGISTRY.histogram(
+    "bot_prompt_build_seconds", "Time to build and fit a prompt", labels=("kind",)
+)
+OLLAMA_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "bot_ollama_first_token_seconds", "Time until the first streamed token arrives"
+)
+OLLAMA_GENERATION_SECONDS = REGISTRY.histogram(
+    "bot_ollama_generation_seconds", "Time of a successful generation, including retries", labels=("mode",)
+)
+OLLAMA_RETRIES = REGISTRY.counter(
+    "bot_ollama_retries_total", "Ollama requests retried after a failure"
+)
+OLLAMA_FALLBACKS = REGISTRY.counter(
+    "bot_ollama_fallbacks_total", "Generations that gave up and used the fallback"
+)
+SUMMARY_CACHE_LOOKUPS = REGISTRY.counter(
+    "bot_summary_cache_lookups_total", "Summary cache lookups", labels=("result",)
+)
+
+
+def timed(histogram, **labels):
+    """Decorate a coroutine function to observe its run time in a histogram."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves the registry at /metrics."""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """
+    Serve the metrics endpoint from a background thread.
+
+    Args:
+        host (str): Address to listen on
+        port (int): Port to listen on; 0 disables the endpoint
+
+    Returns:
+        ThreadingHTTPServer: The server, or None if disabled or the port is taken
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    except OSError as e:
+        logger.error(f"Could not serve metrics on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics at http://{host}:{port}/metrics")
+    return server
+
+
+def format_stats():
+    """
+    Describe the current metrics as short text lines for the /stats command.
+
+    Returns:
+        str: One line per metric and label combination
+    """
+    lines = []
+    for metric in REGISTRY.metrics:
+        if isinstance(metric, Histogram):
+            seconds = metric.name.endswith("_seconds")
+            for key, stats in metric.summary().items():
+                if not stats["count"]:
+                    continue
+                label = f"{metric.name}{'[' + ','.join(key) + ']' if key else ''}"
+                if seconds:
+                    lines.append(f"{label}: n={stats['count']} avg={stats['avg'] * 1000:.0f}ms "
+                                 f"p50≤{stats['p50'] * 1000:.0f}ms p95≤{stats['p95'] * 1000:.0f}ms")
+                else:
+                    lines.append(f"{label}: n={stats['count']} avg={stats['avg']:.0f} "
+                                 f"p50≤{stats['p50']:.0f} p95≤{stats['p95']:.0f}")
+        elif isinstance(metric, Counter):
+            for key, value in metric.items():
+                lines.append(f"{metric.name}{'[' + ','.join(key) + ']' if key else ''}: {value}")
+        else:
+            lines.append(f"{metric.name}: {metric.value()}")
+    return "\n".join(lines)
@@ -0,0 +1,269 @@
+"""
+Schema migrations for databases created by earlier versions of the bot.
+
+create_all() only creates missing tables, so columns and indexes added to
+existing tables are applied here. Every step is idempotent and runs at
+startup after init_db().
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from telegram_summary_bot.config import TEHRAN_TZ, DEFAULT_CHAT_ID
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+from telegram_summary_bot.utils.database import (
+    engine, get_db, Message, Thread, CacheVersion, CACHE_NAMES, DB_TYPE, DB_PARTITIONING, messages_in_range_query
+)
+
+
+def add_missing_columns(inspector):
+    """Add model columns that are missing from existing tables."""
+    added = []
+    for table in [Message.__table__, Thread.__table__]:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def create_missing_indexes(inspector):
+    """Create model indexes that are missing from existing tables."""
+    created = []
+    for table in [Message.__table__]:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+    return created
+
+
+def scope_thread_ids_to_chats(inspector):
+    """
+    Replace the global unique key on threads.thread_id with one on (chat_id, thread_id).
+
+    PostgreSQL drops the old constraint in place. SQLite cannot drop a
+    constraint, so the table is rebuilt: a copy is created with the new
+    schema, filled, and renamed over the original. Row IDs are kept, so
+    messages and chunk summaries still point at the same threads.
+
+    Returns:
+        bool: True if the key was changed
+    """
+    old_keys = [
+        constraint for constraint in inspector.get_unique_constraints(Thread.__tablename__)
+        if constraint["column_names"] == ["thread_id"]
+    ]
+    if not old_keys:
+        return False
+
+    if engine.dialect.name == "sqlite":
+        rebuilt = Thread.__table__.to_metadata(MetaData(), name="threads_rebuild")
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS threads_rebuild"))
+            rebuilt.create(bind=conn)
+            conn.execute(text(
+                "INSERT INTO threads_rebuild (id, chat_id, thread_id, title) "
+                "SELECT id, chat_id, thread_id, title FROM threads"
+            ))
+            conn.execute(text("DROP TABLE threads"))
+            conn.execute(text("ALTER TABLE threads_rebuild RENAME TO threads"))
+        return True
+
+    with engine.begin() as conn:
+        for constraint in old_keys:
+            conn.execute(text(f'ALTER TABLE threads DROP CONSTRAINT "{constraint["name"]}"'))
+        conn.execute(text(
+            "ALTER TABLE threads ADD CONSTRAINT uq_threads_chat_thread UNIQUE (chat_id, thread_id)"
+        ))
+    return True
+
+
+def backfill_chat_ids():
+    """
+    Assign a chat to messages and threads stored before chats were tracked.
+
+    Messages without a chat belong to DEFAULT_CHAT_ID. A thread takes the
+    chat most of its messages come from, and messages from any other chat
+    are moved to a copy of the thread in their own chat.
+
+    Returns:
+        int: Number of threads copied into another chat
+    """
+    with engine.begin() as conn:
+        threads = conn.execute(text("SELECT COUNT(*) FROM threads WHERE chat_id IS NULL")).scalar()
+        if not threads:
+            # Already done; newer code always stores a chat
+            return 0
+
+        conn.execute(
+            text("UPDATE messages SET chat_id = :chat_id WHERE chat_id IS NULL"), {"chat_id": DEFAULT_CHAT_ID}
+        )
+        conn.execute(text(
+            "UPDATE threads SET chat_id = ("
+            "SELECT m.chat_id FROM messages m WHERE m.thread_id = threads.id "
+            "GROUP BY m.chat_id ORDER BY COUNT(*) DESC LIMIT 1"
+            ") WHERE chat_id IS NULL"
+        ))
+        conn.execute(
+            text("UPDATE threads SET chat_id = :chat_id WHERE chat_id IS NULL"), {"chat_id": DEFAULT_CHAT_ID}
+        )
+
+        strays = conn.execute(text(
+            "SELECT DISTINCT m.chat_id, t.id, t.thread_id, t.title FROM messages m "
+            "JOIN threads t ON m.thread_id = t.id WHERE m.chat_id <> t.chat_id"
+        )).fetchall()
+        for chat_id, old_id, thread_id, title in strays:
+            params = {"chat_id": chat_id, "thread_id": thread_id, "title": title}
+            find = text("SELECT id FROM threads WHERE chat_id = :chat_id AND thread_id = :thread_id")
+            new_id = conn.execute(find, params).scalar()
+            if new_id is None:
+                conn.execute(
+                    text("INSERT INTO threads (chat_id, thread_id, title) VALUES (:chat_id, :thread_id, :title)"),
+                    params
+                )
+                new_id = conn.execute(find, params).scalar()
+            conn.execute(
+                text("UPDATE messages SET thread_id = :new_id WHERE chat_id = :chat_id AND thread_id = :old_id"),
+                {"chat_id": chat_id, "new_id": new_id, "old_id": old_id}
+            )
+    return len(strays)
+
+
+def ensure_cache_versions():
+    """
+    Create the version rows of the shared caches.
+
+    Creating them up front means workers only ever update these rows, so
+    two workers announcing their first change at once cannot collide.
+    """
+    db = get_db()
+    try:
+        existing = {name for (name,) in db.query(CacheVersion.name)}
+        for name in CACHE_NAMES:
+            if name not in existing:
+                db.add(CacheVersion(name=name, version=0))
+        db.commit()
+    except IntegrityError:
+        # Another worker starting at the same time created them
+        db.rollback()
+    finally:
+        db.close()
+
+
+def partition_bounds(day, granularity):
+    """
+    Get the partition containing a day.
+
+    Args:
+        day (datetime): A timestamp inside the partition
+        granularity (str): "day" or "month"
+
+    Returns:
+        tuple: (partition name suffix, start, end)
+    """
+    if granularity == "day":
+        start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start.strftime("%Y%m%d"), start, start + timedelta(days=1)
+
+    start = day.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start.strftime("%Y%m"), start, end
+
+
+def ensure_message_partitions(days_ahead=7):
+    """
+    Create the PostgreSQL partitions of messages around the current time.
+
+    Covers the previous period through days_ahead days from now, plus a
+    default partition so an insert never fails for lack of a partition.
+    Does nothing unless DB_PARTITIONING is configured.
+
+    Args:
+        days_ahead (int): How far ahead partitions are created
+
+    Returns:
+        int: Number of partitions checked
+    """
+    if not DB_PARTITIONING:
+        return 0
+
+    # Timestamps are stored as naive Tehran time
+    now = datetime.now(TEHRAN_TZ).replace(tzinfo=None)
+    first = partition_bounds(now, DB_PARTITIONING)[1] - timedelta(days=1)
+    bounds = {}
+    day = first
+    while day <= now + timedelta(days=days_ahead):
+        suffix, start, end = partition_bounds(day, DB_PARTITIONING)
+        bounds[suffix] = (start, end)
+        day += timedelta(days=1)
+
+    with engine.begin() as conn:
+        for suffix, (start, end) in bounds.items():
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS messages_p{suffix} PARTITION OF messages "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+        conn.execute(text("CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT"))
+
+    return len(bounds)
+
+
+def run_migrations():
+    """Apply all pending schema changes."""
+    try:
+        inspector = inspect(engine)
+        added = add_missing_columns(inspector)
+        rescoped = scope_thread_ids_to_chats(inspect(engine))
+        copied = backfill_chat_ids()
+        created = create_missing_indexes(inspect(engine))
+        ensure_cache_versions()
+        partitions = ensure_message_partitions()
+
+        if added:
+            logger.info(f"Added columns: {', '.join(added)}")
+        if rescoped:
+            logger.info("Made thread IDs unique per chat instead of globally")
+        if copied:
+            logger.info(f"Copied {copied} threads into the other chats their messages belong to")
+        if created:
+            logger.info(f"Created indexes: {', '.join(created)}")
+        if partitions:
+            logger.info(f"Ensured {partitions} {DB_PARTITIONING} partitions of messages")
+    except Exception as e:
+        logger.error(f"Error migrating database schema: {e}")
+        raise
+
+
+def explain_range_query(start_time, end_time, chat_id):
+    """
+    Get the database's query plan for a per-chat message range query.
+
+    Args:
+        start_time (datetime): Start of the range
+        end_time (datetime): End of the range
+        chat_id (int): The chat to read
+
+    Returns:
+        str: The plan, one step per line
+    """
+    db = get_db()
+    try:
+        query = messages_in_range_query(start_time, end_time, chat_id)
+        compiled = query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+        prefix = "EXPLAIN QUERY PLAN" if DB_TYPE != "postgres" else "EXPLAIN"
+        rows = db.execute(text(f"{prefix} {compiled}")).fetchall()
+        return "\n".join(str(row[-1]) for row in rows)
+    finally:
+        db.close()
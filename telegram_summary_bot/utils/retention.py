@@ -0,0 +1,175 @@
+"""
+Retention of old messages.
+
+Summaries only read recent messages, so messages older than RETENTION_DAYS
+are compacted day by day: each day's messages are written to a gzipped
+JSON Lines archive, its activity is added to per-thread rollups (message
+counts per user and the day's chunk summaries), and the messages are then
+deleted in small batches. Every batch is its own short transaction, with a
+pause in between, so incoming messages are never held up for long.
+
+A day is processed in this order so an interrupted run can be repeated:
+the archive is written first, the rollups record the highest message ID
+they include, and only messages up to that ID are deleted. Messages of an
+old day stored later get their own archive part on the next run.
+
+Archives are kept under ARCHIVE_DIR/<chat ID>/<day>-<first message ID>.jsonl.gz.
+"""
+
+import os
+import gzip
+import json
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from telegram_summary_bot.config import TEHRAN_TZ
+
+# Get the logger from the config module
+logger = logging.getLogger("telegram_summary_bot.config")
+
+from telegram_summary_bot.utils.executors import run_db
+from telegram_summary_bot.utils.database import (
+    get_retention_candidates, get_rollup_watermark, iter_messages_for_archive, save_rollups, delete_messages_batch
+)
+
+# Days of messages kept in the database; 0 keeps them forever
+RETENTION_DAYS = int(os.environ.get("RETENTION_DAYS", "0"))
+# Where archived messages are written
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archive")
+# Messages deleted per transaction
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "500"))
+# Seconds between delete batches, leaving the write lock to the ingestion writer
+RETENTION_BATCH_PAUSE = float(os.environ.get("RETENTION_BATCH_PAUSE_SECONDS", "0.05"))
+# When the retention job runs
+RETENTION_CRON = os.environ.get("RETENTION_CRON", "30 4 * * *")
+
+
+def retention_horizon(now=None):
+    """
+    Get the naive local time before which messages are archived.
+
+    Args:
+        now (datetime): The current time; defaults to now
+
+    Returns:
+        datetime: Local midnight RETENTION_DAYS days ago
+    """
+    now = (now or datetime.now(TEHRAN_TZ)).astimezone(TEHRAN_TZ).replace(tzinfo=None)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=RETENTION_DAYS)
+
+
+def archive_path(chat_id, day, first_id):
+    """Get the archive file of a chat's day, starting at a message ID."""
+    return os.path.join(ARCHIVE_DIR, str(chat_id), f"{day:%Y-%m-%d}-{first_id}.jsonl.gz")
+
+
+def archive_day(chat_id, day):
+    """
+    Archive a day of a chat's messages and add them to the rollups.
+
+    Messages already rolled up by an earlier, interrupted run are skipped.
+
+    Args:
+        chat_id (int): The chat
+        day (datetime): Local midnight starting the day
+
+    Returns:
+        int: The highest message ID rolled up for the day, 0 if there is none
+    """
+    watermark = get_rollup_watermark(chat_id, day)
+    next_day = day + timedelta(days=1)
+
+    rollups = {}
+    first_id = None
+    last_id = watermark
+    temporary_path = None
+    handle = None
+    try:
+        for message in iter_messages_for_archive(chat_id, day, next_day, watermark):
+            if handle is None:
+                first_id = message["id"]
+                path = archive_path(chat_id, day, first_id)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temporary_path = f"{path}.tmp"
+                handle = gzip.open(temporary_path, "wt", encoding="utf-8")
+
+            handle.write(json.dumps({
+                key: value.isoformat() if key == "timestamp" else value
+                for key, value in message.items() if key != "thread_pk"
+            }, ensure_ascii=False) + "\n")
+            last_id = message["id"]
+
+            activity = rollups.get(message["thread_pk"])
+            if activity is None:
+                activity = rollups[message["thread_pk"]] = {
+                    "message_count": 0, "user_counts": {},
+                    "first_message_at": message["timestamp"], "last_message_at": message["timestamp"]
+                }
+            activity["message_count"] += 1
+            activity["user_counts"][message["user_id"]] = activity["user_counts"].get(message["user_id"], 0) + 1
+            activity["first_message_at"] = min(activity["first_message_at"], message["timestamp"])
+            activity["last_message_at"] = max(activity["last_message_at"], message["timestamp"])
+
+        if handle is not None:
+            handle.close()
+            handle = None
+            # Only a complete archive gets its final name
+            os.replace(temporary_path, archive_path(chat_id, day, first_id))
+    finally:
+        if handle is not None:
+            handle.close()
+            os.remove(temporary_path)
+
+    if rollups:
+        save_rollups(chat_id, day, rollups, last_id)
+        logger.info(f"Archived {sum(a['message_count'] for a in rollups.values())} messages of chat {chat_id} "
+                    f"from {day:%Y-%m-%d}")
+    return last_id
+
+
+async def delete_archived(chat_id, day, max_id):
+    """
+    Delete a day's archived messages in batches.
+
+    Returns:
+        int: Number of messages deleted
+    """
+    deleted = 0
+    while True:
+        count = await run_db(
+            delete_messages_batch, chat_id, day, day + timedelta(days=1), max_id, RETENTION_BATCH_SIZE
+        )
+        deleted += count
+        if count < RETENTION_BATCH_SIZE:
+            return deleted
+        await asyncio.sleep(RETENTION_BATCH_PAUSE)
+
+
+async def apply_retention(now=None):
+    """
+    Archive, roll up and delete every chat's messages older than the retention horizon.
+
+    Args:
+        now (datetime): The current time; defaults to now
+
+    Returns:
+        int: Number of messages deleted
+    """
+    if RETENTION_DAYS <= 0:
+        return 0
+
+    horizon = retention_horizon(now)
+    candidates = await run_db(get_retention_candidates, horizon)
+    deleted = 0
+    for chat_id, oldest in candidates.items():
+        day = oldest.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < horizon:
+            max_id = await run_db(archive_day, chat_id, day)
+            if max_id:
+                deleted += await delete_archived(chat_id, day, max_id)
+            day += timedelta(days=1)
+
+    if deleted:
+        logger.info(f"Retention deleted {deleted} messages older than {horizon:%Y-%m-%d}")
+    return deleted
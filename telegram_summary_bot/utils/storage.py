@@ -2,87 +2,145 @@
 Storage utilities for saving and loading message history.
 """
 
-import json
 import logging
 from datetime import datetime
-from telegram_summary_bot.config import GROUP_MEMBERS_FILE
+from telegram_summary_bot.config import DEFAULT_CHAT_ID
 from telegram_summary_bot.utils.database import (
-    add_message as db_add_message,
     get_messages_in_range as db_get_messages_in_range,
     get_thread_titles as db_get_thread_titles,
-    init_db,
-    migrate_from_json
+    get_window_fingerprint as db_get_window_fingerprint,
+    get_cache_versions,
+    warm_identity_cache,
+    init_db
 )
+from telegram_summary_bot.utils.ingestion import ingestion_queue
+from telegram_summary_bot.utils.identity_cache import LRUCache
+from telegram_summary_bot.utils.migrations import run_migrations
+from telegram_summary_bot.utils.chat_registry import load_chat_registry, reload_chat_registry, note_chat_member
 
 # Get the logger from the config module
 logger = logging.getLogger("telegram_summary_bot.config")
 
-# Thread titles global variable for backward compatibility
+# (chat ID, thread ID) -> thread title
 thread_titles = {}
 
-# Group members cache
-group_members = {}
+# Cache name -> version this worker's copy was loaded at
+cache_versions = {}
 
+# (chat_id, telegram message id) of recently queued messages, to drop repeat deliveries early
+recent_message_keys = LRUCache(max_size=10000)
 
-def load_group_members():
-    """Load group members from the JSON file."""
-    global group_members
-    try:
-        with open(GROUP_MEMBERS_FILE, "r", encoding="utf-8") as f:
-            group_members = json.load(f)
-            logger.info(f"Loaded {len(group_members)} group members")
-            return group_members
-    except FileNotFoundError:
-        logger.warning(f"Group members file not found: {GROUP_MEMBERS_FILE}")
-        return {}
+
+def forget_dropped_messages(records):
+    """Forget the keys of messages the ingestion queue could not write, so a redelivery is stored."""
+    for record in records:
+        if record.get("telegram_message_id") is not None:
+            recent_message_keys.discard((record["chat_id"], record["telegram_message_id"]))
+
+
+ingestion_queue.on_drop = forget_dropped_messages
 
 
 def load_message_history():
-    """Initialize the database and load thread titles."""
+    """Initialize the database and load thread titles and the chat registry."""
     global thread_titles
     try:
-        # Initialize database tables
+        # Initialize database tables and bring older schemas up to date
         init_db()
+        run_migrations()
+        cache_versions.update(get_cache_versions())
+        
+        # Register the configured chats and load every chat's members
+        load_chat_registry()
         
         # Get thread titles from database
         thread_titles = db_get_thread_titles()
         logger.info(f"Loaded {len(thread_titles)} thread titles from database")
+        
+        # Warm the identity cache so known users/threads skip lookups on insert
+        user_count, thread_count = warm_identity_cache()
+        logger.info(f"Cached {user_count} users and {thread_count} threads")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
 
 
+def sync_shared_caches():
+    """
+    Reload the in-memory caches that other workers have changed since they were loaded.
+    
+    Returns:
+        list: Names of the reloaded caches
+    """
+    versions = get_cache_versions()
+    changed = [name for name, version in versions.items() if cache_versions.get(name) != version]
+    
+    if "threads" in changed:
+        titles = db_get_thread_titles()
+        # Update in place; other modules hold a reference to this dict
+        thread_titles.update(titles)
+    if "chats" in changed or "members" in changed:
+        reload_chat_registry()
+    
+    cache_versions.update(versions)
+    if changed:
+        logger.info(f"Reloaded shared caches changed by other workers: {', '.join(changed)}")
+    return changed
+
+
 def save_message_history():
-    """No-op function for backward compatibility."""
-    # This function does nothing now as messages are saved immediately in the database
-    logger.info("Message history is automatically saved to database")
+    """Drain the ingestion queue so no buffered messages are lost on shutdown."""
+    ingestion_queue.stop()
 
 
-def get_messages_in_range(start, end):
+def get_messages_in_range(start, end, chat_id=None):
     """Get messages within a specified time range from database."""
-    return db_get_messages_in_range(start, end)
+    # Write out buffered messages first so readers see everything received so far
+    ingestion_queue.flush()
+    return db_get_messages_in_range(start, end, chat_id)
 
 
-def add_message(thread_id, user_id, display_name, text, timestamp, thread_title="Main Group Chat"):
-    """Add a message to the database."""
-    # Update thread titles (for backward compatibility)
-    global thread_titles
-    if thread_id not in thread_titles:
-        thread_titles[thread_id] = thread_title
+def get_window_fingerprint(start, end, chat_id=None):
+    """Get per-thread message statistics for a time range from database."""
+    ingestion_queue.flush()
+    return db_get_window_fingerprint(start, end, chat_id)
+
+
+def add_message(thread_id, user_id, display_name, text, timestamp, thread_title="Main Group Chat", chat_id=None,
+                message_id=None):
+    """
+    Queue a message for writing to the database.
+    
+    Delivering the same Telegram message twice is a no-op: recent keys are
+    dropped here, older ones by the unique key in the database. Keys of
+    messages the queue fails to write are forgotten again.
+    
+    Returns:
+        int: Number of messages waiting to be written, or None for a duplicate
+    """
+    chat_id = chat_id or DEFAULT_CHAT_ID
+    if message_id is not None:
+        key = (chat_id, message_id)
+        if recent_message_keys.get(key):
+            return None
+        recent_message_keys.set(key, True)
     
-    # Add message to database
-    db_add_message(
-        telegram_user_id=user_id,
-        display_name=display_name,
-        thread_telegram_id=thread_id,
-        thread_title=thread_title,
-        text=text,
-        timestamp=timestamp
-    )
+    if (chat_id, thread_id) not in thread_titles:
+        thread_titles[(chat_id, thread_id)] = thread_title
+    if note_chat_member(chat_id, user_id, display_name):
+        logger.info(f"New member {display_name} ({user_id}) in chat {chat_id}")
     
-    # Return a dummy count for backward compatibility
-    return 1
+    # Hand the message to the write-behind queue
+    return ingestion_queue.put({
+        "telegram_user_id": user_id,
+        "display_name": display_name,
+        "thread_telegram_id": thread_id,
+        "thread_title": thread_title,
+        "text": text,
+        "timestamp": timestamp,
+        "chat_id": chat_id,
+        "telegram_message_id": message_id
+    })
 
 
 # Initialize by loading data
-load_group_members()
 load_message_history() 
\ No newline at end of file
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Test script to verify that the chunk tick takes turns between chats and shares the generation limit.
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+# Use a throwaway SQLite database unless another database is configured
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "chunk_tick_test.db"))
+os.environ.setdefault("GROUP_CHAT_ID", "0")
+
+from telegram_summary_bot.config import TEHRAN_TZ
+from telegram_summary_bot.services import chunk_summarizer, scheduler
+from telegram_summary_bot.services.summary_jobs import MAX_CONCURRENT_SUMMARIES
+from telegram_summary_bot.utils.chat_registry import chats
+from telegram_summary_bot.utils.database import init_db, add_messages_bulk
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+BUSY_CHAT_ID = -1002000000009
+QUIET_CHAT_ID = -1002000000010
+
+
+def hourly_messages(chat_id, hours):
+    """Build one message in each of the last closed hours."""
+    now = datetime.now(TEHRAN_TZ).replace(tzinfo=None)
+    return [
+        {
+            "telegram_user_id": 1101, "display_name": "user1101", "thread_telegram_id": 0,
+            "thread_title": "Main", "text": f"message {hour} of chat {chat_id}",
+            "timestamp": now - timedelta(hours=hour), "chat_id": chat_id, "telegram_message_id": hour
+        }
+        for hour in range(2, 2 + hours)
+    ]
+
+
+def test_tick_takes_turns_between_chats():
+    """Test that a busy chat's backlog is capped per tick and does not hold up a quiet chat."""
+    init_db()
+    add_messages_bulk(hourly_messages(BUSY_CHAT_ID, 20) + hourly_messages(QUIET_CHAT_ID, 3))
+    saved_chats = dict(chats)
+    chats.clear()
+    chats.update({chat_id: {"enabled": True} for chat_id in (BUSY_CHAT_ID, QUIET_CHAT_ID)})
+
+    order = []
+    running = []
+    peaks = []
+
+    async def fake_generate(prompt, fallback=None, on_progress=None):
+        running.append(True)
+        order.append(BUSY_CHAT_ID if f"of chat {BUSY_CHAT_ID}" in prompt else QUIET_CHAT_ID)
+        peaks.append(len(running))
+        await asyncio.sleep(0.05)
+        running.pop()
+        return "summary"
+
+    saved_generate = chunk_summarizer.generate_with_ollama_async
+    chunk_summarizer.generate_with_ollama_async = fake_generate
+    try:
+        asyncio.run(scheduler.refresh_chunks())
+    finally:
+        chunk_summarizer.generate_with_ollama_async = saved_generate
+        chats.clear()
+        chats.update(saved_chats)
+
+    assert max(peaks) == MAX_CONCURRENT_SUMMARIES
+    assert order.count(BUSY_CHAT_ID) == chunk_summarizer.TICK_CHUNK_LIMIT
+    assert order.count(QUIET_CHAT_ID) == 3
+    # The quiet chat is served in turn, not after the busy chat's backlog
+    assert max(i for i, chat_id in enumerate(order) if chat_id == QUIET_CHAT_ID) < 8, order
+
+
+if __name__ == "__main__":
+    try:
+        test_tick_takes_turns_between_chats()
+        logger.info("✅ The chunk tick takes turns between chats")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
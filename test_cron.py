@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Test script to verify the cron expressions of the scheduler.
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime
+
+import pytz
+
+# config.py reads the chat IDs from the environment before secret.env
+os.environ.setdefault("GROUP_CHAT_ID", "0")
+
+from telegram_summary_bot.config import TEHRAN_TZ
+from telegram_summary_bot.utils.cron import CronSchedule
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+# Wednesday noon in Tehran
+NOON = TEHRAN_TZ.localize(datetime(2026, 3, 18, 12, 0))
+
+
+def next_run(expression, moment=NOON):
+    """Get the next run of an expression as a naive Tehran time."""
+    return CronSchedule(expression, TEHRAN_TZ).next_after(moment).replace(tzinfo=None)
+
+
+def test_next_run():
+    """Test the next run of daily, weekly and stepped expressions."""
+    assert next_run("10 0 * * *") == datetime(2026, 3, 19, 0, 10)
+    # Day-of-week 5 is Friday
+    assert next_run("0 9 * * 5") == datetime(2026, 3, 20, 9, 0)
+    assert next_run("*/15 * * * *", NOON.replace(minute=7)) == datetime(2026, 3, 18, 12, 15)
+    # With both day fields restricted either one matches: the 1st or a Monday
+    assert next_run("0 8 1 * 1") == datetime(2026, 3, 23, 8, 0)
+
+
+def test_next_run_is_strictly_after():
+    """Test that a moment matching the expression gets the following run."""
+    assert next_run("0 12 * * *") == datetime(2026, 3, 19, 12, 0)
+
+
+def test_next_run_in_schedule_timezone():
+    """Test that a moment in another timezone is evaluated in the schedule's."""
+    # 21:00 UTC is 00:30 in Tehran on the next day
+    moment = pytz.utc.localize(datetime(2026, 3, 18, 21, 0))
+    assert next_run("10 0 * * *", moment) == datetime(2026, 3, 20, 0, 10)
+
+
+def test_invalid_expressions():
+    """Test that malformed expressions are rejected."""
+    for expression in ["60 * * * *", "* * *", "0 9 * * 7", "5-1 * * * *"]:
+        try:
+            CronSchedule(expression, TEHRAN_TZ)
+        except ValueError:
+            continue
+        raise AssertionError(f"{expression!r} was accepted")
+
+
+if __name__ == "__main__":
+    try:
+        test_next_run()
+        test_next_run_is_strictly_after()
+        test_next_run_in_schedule_timezone()
+        test_invalid_expressions()
+        logger.info("✅ Cron expressions match the expected runs")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
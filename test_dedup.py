@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Test script to verify that a Telegram message delivered more than once is stored once.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+from datetime import datetime
+
+# Use a throwaway SQLite database unless another database is configured
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "dedup_test.db"))
+os.environ.setdefault("GROUP_CHAT_ID", "0")
+
+from telegram_summary_bot.utils.storage import add_message, get_messages_in_range, recent_message_keys
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+CHAT_ID = -1002000000004
+OTHER_CHAT_ID = -1002000000005
+DAY = datetime(2026, 4, 1)
+
+
+def deliver(chat_id, message_id, text="see you at eight"):
+    """Hand a message to the storage layer as the handlers do."""
+    return add_message(thread_id=0, user_id=701, display_name="user701", text=text,
+                       timestamp=DAY.replace(hour=20), chat_id=chat_id, message_id=message_id)
+
+
+def stored_texts(chat_id):
+    """Get the texts stored for a chat on DAY."""
+    messages = get_messages_in_range(DAY, DAY.replace(hour=23), chat_id)
+    return [m.text for thread in messages.values() for m in thread]
+
+
+def test_duplicate_delivery_is_stored_once():
+    """Test that a redelivery is dropped in memory and, once forgotten there, by the database."""
+    assert deliver(CHAT_ID, 10) is not None
+    assert deliver(CHAT_ID, 10) is None, "a repeat delivery was queued again"
+
+    # A redelivery after a restart, when the in-memory keys are gone
+    get_messages_in_range(DAY, DAY.replace(hour=23), CHAT_ID)
+    recent_message_keys.clear()
+    assert deliver(CHAT_ID, 10) is not None
+
+    assert stored_texts(CHAT_ID) == ["see you at eight"]
+
+
+def test_same_message_id_in_two_chats():
+    """Test that message IDs are only unique within a chat."""
+    deliver(CHAT_ID, 11, "first chat")
+    deliver(OTHER_CHAT_ID, 11, "second chat")
+
+    assert "first chat" in stored_texts(CHAT_ID)
+    assert stored_texts(OTHER_CHAT_ID) == ["second chat"]
+
+
+if __name__ == "__main__":
+    try:
+        test_duplicate_delivery_is_stored_once()
+        test_same_message_id_in_two_chats()
+        logger.info("✅ Repeated deliveries are stored once")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
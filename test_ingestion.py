@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""
+Test script to verify that the ingestion queue only drops the records it cannot write.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+from datetime import datetime
+
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError
+
+# Use a throwaway SQLite database unless another database is configured
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "ingestion_test.db"))
+os.environ.setdefault("GROUP_CHAT_ID", "0")
+
+from telegram_summary_bot.utils.ingestion import IngestionQueue, ingestion_queue
+from telegram_summary_bot.utils.storage import add_message, get_messages_in_range
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+CHAT_ID = -1002000000001
+
+
+def record(message_id, text="hello"):
+    """Build a queued message record."""
+    return {"telegram_message_id": message_id, "text": text, "chat_id": CHAT_ID}
+
+
+def database_error(error_class, message):
+    """Build a SQLAlchemy error as the database layer raises it."""
+    return error_class("INSERT INTO messages", {}, Exception(message))
+
+
+def test_poison_record_is_isolated():
+    """Test that a batch with one unwritable record still writes the others."""
+    written, dropped = [], []
+
+    def flush(batch):
+        if any(r["text"] == "poison" for r in batch):
+            raise database_error(DataError, "cannot write poison")
+        written.extend(batch)
+
+    queue = IngestionQueue(flush, batch_size=1000, on_drop=dropped.extend)
+    for i in range(10):
+        queue.put(record(i, "poison" if i == 6 else "hello"))
+
+    assert queue.flush() == 9
+
+    assert [r["telegram_message_id"] for r in written] == [0, 1, 2, 3, 4, 5, 7, 8, 9]
+    assert [r["telegram_message_id"] for r in dropped] == [6]
+    assert queue.stats()["dropped"] == 1
+    assert queue.stats()["flushed"] == 9
+    assert queue.depth == 0
+
+
+def test_outage_keeps_batch():
+    """Test that a batch failing because the database is unavailable is kept and retried, not dropped."""
+    written, dropped = [], []
+    outage = [True]
+
+    def flush(batch):
+        if outage[0]:
+            raise database_error(OperationalError, "database is locked")
+        written.extend(batch)
+
+    queue = IngestionQueue(flush, batch_size=1000, on_drop=dropped.extend)
+    for i in range(10):
+        queue.put(record(i))
+
+    for _ in range(5):
+        assert queue.flush() == 0
+        assert queue.depth == 10
+    assert dropped == []
+
+    outage[0] = False
+    assert queue.flush() == 10
+    assert [r["telegram_message_id"] for r in written] == list(range(10))
+    assert queue.stats()["dropped"] == 0
+
+
+def test_outage_during_split_keeps_rest():
+    """Test that the records not yet written are kept when the database fails while a batch is split."""
+    written, dropped = [], []
+
+    def flush(batch):
+        if any(r["text"] == "poison" for r in batch):
+            raise database_error(IntegrityError, "NOT NULL constraint failed")
+        if len(written) >= 2:
+            raise database_error(OperationalError, "database is locked")
+        written.extend(batch)
+
+    queue = IngestionQueue(flush, batch_size=1000, on_drop=dropped.extend)
+    for i in range(8):
+        queue.put(record(i, "poison" if i == 0 else "hello"))
+
+    # 0 is dropped, 1 written alone, 2-3 written together, then the database fails
+    assert queue.flush() == 3
+    assert [r["telegram_message_id"] for r in dropped] == [0]
+    assert queue.depth == 4
+
+
+def test_full_buffer_drops_oldest():
+    """Test that a full buffer drops its oldest records and counts them."""
+    dropped = []
+
+    def flush(batch):
+        raise database_error(OperationalError, "database is locked")
+
+    queue = IngestionQueue(flush, batch_size=1000, on_drop=dropped.extend, max_buffer=5)
+    for i in range(3):
+        queue.put(record(i))
+    assert queue.flush() == 0
+    for i in range(3, 7):
+        queue.put(record(i))
+
+    assert [r["telegram_message_id"] for r in dropped] == [0, 1]
+    assert queue.depth == 5
+    assert queue.stats()["overflowed"] == 2
+    assert queue.stats()["dropped"] == 0
+
+
+def test_redelivery_after_drop_is_stored():
+    """Test that a message dropped by the queue is stored when Telegram delivers it again."""
+    day = datetime(2026, 3, 1, 12, 0)
+    saved = ingestion_queue._flush_func
+
+    def failing_flush(batch):
+        raise database_error(IntegrityError, "constraint failed")
+
+    ingestion_queue._flush_func = failing_flush
+    try:
+        add_message(thread_id=0, user_id=501, display_name="user501", text="lost once", timestamp=day,
+                    chat_id=CHAT_ID, message_id=77)
+        ingestion_queue.flush()
+    finally:
+        ingestion_queue._flush_func = saved
+
+    assert add_message(thread_id=0, user_id=501, display_name="user501", text="lost once", timestamp=day,
+                       chat_id=CHAT_ID, message_id=77) is not None, "redelivery was treated as a duplicate"
+    messages = get_messages_in_range(datetime(2026, 3, 1), datetime(2026, 3, 2), CHAT_ID)
+    assert [m.text for thread in messages.values() for m in thread] == ["lost once"]
+
+
+if __name__ == "__main__":
+    try:
+        test_poison_record_is_isolated()
+        test_outage_keeps_batch()
+        test_outage_during_split_keeps_rest()
+        test_full_buffer_drops_oldest()
+        test_redelivery_after_drop_is_stored()
+        logger.info("✅ Ingestion queue drops only the records it cannot write")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Test script to verify the streaming import of a legacy message_history.json file.
+"""
+
+import os
+import sys
+import json
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+# Use a throwaway SQLite database unless another database is configured
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "json_import_test.db"))
+os.environ.setdefault("GROUP_CHAT_ID", "0")
+
+from telegram_summary_bot.config import DEFAULT_CHAT_ID
+from telegram_summary_bot.utils.database import init_db, get_messages_in_range, get_thread_titles
+from telegram_summary_bot.utils.json_import import import_json_file
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+# Enough messages to span several reads of the file
+MESSAGES_PER_THREAD = 600
+
+
+def write_history(path, day):
+    """Write a history of two threads on a day, with the titles after the messages."""
+    history = {
+        "thread_logs": {
+            thread_id: [
+                {
+                    "time": (day + timedelta(seconds=30 * i)).isoformat() + "+03:30",
+                    "user_id": 1001 + i % 3,
+                    "display_name": f"user{1001 + i % 3}",
+                    "text": f"message {i} of thread {thread_id}, with a little more text to fill the line"
+                }
+                for i in range(MESSAGES_PER_THREAD)
+            ]
+            for thread_id in ("0", "42")
+        },
+        "thread_titles": {"42": f"Topic of {day:%Y-%m-%d}"}
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+
+
+def stored_messages(day):
+    """Get the day's stored messages, by thread."""
+    return get_messages_in_range(day, day + timedelta(days=1), DEFAULT_CHAT_ID)
+
+
+def test_import_streams_whole_file():
+    """Test that every message is imported in local time and the titles are applied."""
+    init_db()
+    day = datetime(2025, 6, 1, 8, 0)
+    path = os.path.join(tempfile.mkdtemp(), "message_history.json")
+    write_history(path, day)
+
+    assert import_json_file(path, batch_size=250) == 2 * MESSAGES_PER_THREAD
+    assert not os.path.exists(f"{path}.checkpoint")
+
+    messages = stored_messages(day.replace(hour=0))
+    assert {thread_id: len(thread) for thread_id, thread in messages.items()} == {0: 600, 42: 600}
+    # "+03:30" timestamps are stored as the Tehran time they name
+    assert messages[42][0].time == day
+    assert get_thread_titles()[(DEFAULT_CHAT_ID, 42)] == f"Topic of {day:%Y-%m-%d}"
+
+
+def test_import_resumes_from_checkpoint():
+    """Test that an interrupted import only writes the messages after its checkpoint."""
+    init_db()
+    day = datetime(2025, 6, 2, 8, 0)
+    path = os.path.join(tempfile.mkdtemp(), "message_history.json")
+    write_history(path, day)
+    with open(f"{path}.checkpoint", "w", encoding="utf-8") as f:
+        json.dump({"messages": 500}, f)
+
+    assert import_json_file(path, batch_size=250) == 2 * MESSAGES_PER_THREAD - 500
+    messages = stored_messages(day.replace(hour=0))
+    assert len(messages[0]) == 100
+    assert len(messages[42]) == 600
+
+
+def test_repeated_import_skips_stored_messages():
+    """Test that messages committed but not checkpointed are not stored twice."""
+    init_db()
+    day = datetime(2025, 6, 3, 8, 0)
+    path = os.path.join(tempfile.mkdtemp(), "message_history.json")
+    write_history(path, day)
+    assert import_json_file(path, batch_size=250) == 2 * MESSAGES_PER_THREAD
+
+    # As if the process died after a commit, before its checkpoint was written
+    with open(f"{path}.checkpoint", "w", encoding="utf-8") as f:
+        json.dump({"messages": 750}, f)
+    assert import_json_file(path, batch_size=250) == 0
+    messages = stored_messages(day.replace(hour=0))
+    assert {thread_id: len(thread) for thread_id, thread in messages.items()} == {0: 600, 42: 600}
+
+
+if __name__ == "__main__":
+    try:
+        test_import_streams_whole_file()
+        test_import_resumes_from_checkpoint()
+        test_repeated_import_skips_stored_messages()
+        logger.info("✅ JSON history imported")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Test script to verify that only one worker at a time holds the scheduler lease.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+
+# Use a throwaway SQLite database unless another database is configured
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "leases_test.db"))
+os.environ.setdefault("GROUP_CHAT_ID", "0")
+
+from telegram_summary_bot.utils.database import init_db, acquire_lease, release_lease
+from telegram_summary_bot.utils.leadership import LeaderElection
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+
+def test_lease_is_exclusive():
+    """Test that a held lease is refused to others until it is released."""
+    init_db()
+    assert acquire_lease("test-exclusive", "worker-a", 60)
+    assert not acquire_lease("test-exclusive", "worker-b", 60)
+    # The holder renews its own lease
+    assert acquire_lease("test-exclusive", "worker-a", 60)
+
+    release_lease("test-exclusive", "worker-b")
+    assert not acquire_lease("test-exclusive", "worker-b", 60), "a worker released a lease it did not hold"
+
+    release_lease("test-exclusive", "worker-a")
+    assert acquire_lease("test-exclusive", "worker-b", 60)
+
+
+def test_expired_lease_is_taken_over():
+    """Test that the lease of a worker that stopped renewing passes to another."""
+    init_db()
+    assert acquire_lease("test-expiry", "worker-a", 0.2)
+    assert not acquire_lease("test-expiry", "worker-b", 60)
+    time.sleep(0.3)
+    assert acquire_lease("test-expiry", "worker-b", 60)
+    assert not acquire_lease("test-expiry", "worker-a", 60)
+
+
+def test_leader_election_hands_over_on_stop():
+    """Test that a stopping leader releases the lease to the next worker at once."""
+    init_db()
+
+    async def run():
+        first = LeaderElection("test-election", "worker-a", lease_seconds=60)
+        second = LeaderElection("test-election", "worker-b", lease_seconds=60)
+        await first.start()
+        await second.start()
+        leaders = [first.is_leader, second.is_leader]
+
+        await first.stop()
+        await second._renew()
+        leaders += [first.is_leader, second.is_leader]
+        await second.stop()
+        return leaders
+
+    assert asyncio.run(run()) == [True, False, False, True]
+
+
+if __name__ == "__main__":
+    try:
+        test_lease_is_exclusive()
+        test_expired_lease_is_taken_over()
+        test_leader_election_hands_over_on_stop()
+        logger.info("✅ The lease is held by one worker at a time")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Test script to verify that a database created by the first version of the bot is migrated.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import logging
+import tempfile
+import subprocess
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CHAT_ID = -1002000000006
+OTHER_CHAT_ID = -1002000000007
+
+# The schema before chats, message IDs and composite indexes
+LEGACY_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY, telegram_id INTEGER NOT NULL UNIQUE, display_name VARCHAR(255) NOT NULL
+);
+CREATE TABLE threads (
+    id INTEGER PRIMARY KEY, thread_id INTEGER NOT NULL UNIQUE, title VARCHAR(255) NOT NULL
+);
+CREATE TABLE messages (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+    thread_id INTEGER NOT NULL REFERENCES threads (id), text TEXT NOT NULL, timestamp DATETIME NOT NULL
+);
+CREATE INDEX ix_messages_timestamp ON messages (timestamp);
+INSERT INTO users VALUES (1, 801, 'user801');
+INSERT INTO threads VALUES (1, 0, 'Main Group Chat'), (2, 5, 'Trips');
+INSERT INTO messages VALUES
+    (1, 1, 1, 'hello', '2026-05-01 10:00:00.000000'),
+    (2, 1, 2, 'where to?', '2026-05-01 11:00:00.000000');
+"""
+
+# Runs in a fresh process, since the database is chosen when the bot is imported
+MIGRATE = """
+import json
+from datetime import datetime
+from telegram_summary_bot.utils.database import init_db, add_thread, get_thread_titles, get_messages_in_range
+from telegram_summary_bot.utils.migrations import run_migrations
+
+init_db()
+run_migrations()
+# Every step is idempotent
+run_migrations()
+add_thread(5, "Other chat's trips", chat_id={other})
+messages = get_messages_in_range(datetime(2026, 5, 1), datetime(2026, 5, 2), {default})
+print(json.dumps({{
+    "titles": sorted([chat_id, thread_id, title] for (chat_id, thread_id), title in get_thread_titles().items()),
+    "texts": {{thread_id: [m.text for m in thread] for thread_id, thread in messages.items()}}
+}}))
+"""
+
+
+def test_legacy_database_is_migrated():
+    """Test that chats are backfilled and thread IDs become unique per chat."""
+    path = os.path.join(tempfile.mkdtemp(), "legacy.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+
+    env = dict(os.environ, DB_PATH=path, DEFAULT_CHAT_ID=str(DEFAULT_CHAT_ID), GROUP_CHAT_ID="0")
+    env.pop("DB_TYPE", None)
+    output = subprocess.run(
+        [sys.executable, "-c", MIGRATE.format(default=DEFAULT_CHAT_ID, other=OTHER_CHAT_ID)],
+        env=env, cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result["titles"] == [
+        [OTHER_CHAT_ID, 5, "Other chat's trips"],
+        [DEFAULT_CHAT_ID, 0, "Main Group Chat"],
+        [DEFAULT_CHAT_ID, 5, "Trips"]
+    ], result["titles"]
+    assert result["texts"] == {"0": ["hello"], "5": ["where to?"]}, result["texts"]
+
+    with sqlite3.connect(path) as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(messages)")}
+    assert {"chat_id", "telegram_message_id"} <= columns
+    assert {"ix_messages_chat_timestamp", "ux_messages_chat_message"} <= indexes
+
+
+if __name__ == "__main__":
+    try:
+        test_legacy_database_is_migrated()
+        logger.info("✅ Legacy database migrated")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
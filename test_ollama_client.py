@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Test script to verify the Ollama client's retries and fallbacks against the fake Ollama server.
+"""
+
+import sys
+import asyncio
+import logging
+
+from benchmarks.fake_ollama import FakeOllamaBehavior, start_fake_ollama
+from telegram_summary_bot.services import ai_generator
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+
+def generate(behavior, on_progress=None):
+    """Run one generation against a fake server with the given behavior."""
+    server = start_fake_ollama(behavior)
+    saved = ai_generator.OLLAMA_URL, ai_generator.INITIAL_RETRY_DELAY
+    ai_generator.OLLAMA_URL = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    ai_generator.INITIAL_RETRY_DELAY = 0
+    
+    async def run():
+        try:
+            return await ai_generator.generate_with_ollama_async(
+                "alpha beta gamma", fallback=lambda prompt: "FALLBACK", on_progress=on_progress
+            )
+        finally:
+            await ai_generator.close_async_client()
+    
+    try:
+        return asyncio.run(run()), server.behavior.stats
+    finally:
+        ai_generator.OLLAMA_URL, ai_generator.INITIAL_RETRY_DELAY = saved
+        server.shutdown()
+
+
+async def ignore_progress(text):
+    pass
+
+
+def test_malformed_response_uses_raw_text_parser():
+    """Test that a response cut off mid-JSON still yields its text."""
+    text, stats = generate(FakeOllamaBehavior(response_tokens=3, malformed_rate=1.0))
+    assert text == "alpha beta gamma", text
+    assert stats["requests"] == 1
+
+
+def test_errors_are_retried_then_fall_back():
+    """Test that failing requests are retried before the fallback is used."""
+    text, stats = generate(FakeOllamaBehavior(error_rate=1.0))
+    assert text == "FALLBACK", text
+    assert stats["requests"] == ai_generator.MAX_RETRIES
+
+
+def test_stream_skips_malformed_lines():
+    """Test that a malformed NDJSON line does not abort a streamed response."""
+    text, stats = generate(FakeOllamaBehavior(response_tokens=4, malformed_rate=1.0), on_progress=ignore_progress)
+    # The fake replaces the middle word, "gamma", with the malformed line
+    assert text.split() == ["alpha", "beta", "alpha"], text
+    assert stats["streamed"] == 1
+
+
+def test_hanging_stream_times_out():
+    """Test that a request hanging past the timeout is retried and then falls back."""
+    saved = ai_generator.DEFAULT_TIMEOUT
+    ai_generator.DEFAULT_TIMEOUT = 0.3
+    try:
+        text, stats = generate(FakeOllamaBehavior(timeout_rate=1.0, hang_seconds=1), on_progress=ignore_progress)
+    finally:
+        ai_generator.DEFAULT_TIMEOUT = saved
+    assert text == "FALLBACK", text
+    assert stats["timeouts"] == ai_generator.MAX_RETRIES
+
+
+if __name__ == "__main__":
+    try:
+        test_malformed_response_uses_raw_text_parser()
+        test_errors_are_retried_then_fall_back()
+        test_stream_skips_malformed_lines()
+        test_hanging_stream_times_out()
+        logger.info("✅ Ollama client handles faults from the fake server")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Test script to verify that monthly summaries reuse the combined summaries of past weeks.
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+# Use a throwaway SQLite database unless another database is configured
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "period_summary_test.db"))
+os.environ.setdefault("GROUP_CHAT_ID", "0")
+
+from benchmarks.fake_ollama import start_fake_ollama
+from telegram_summary_bot.config import TEHRAN_TZ
+from telegram_summary_bot.services import ai_generator
+from telegram_summary_bot.services.summarizer import summarize_period_async
+from telegram_summary_bot.utils.database import init_db, save_daily_summary, get_daily_summaries, add_messages_bulk
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+CHAT_ID = -1002000000003
+# Has raw messages but no stored summary
+MISSING_DAY = datetime(2026, 3, 4)
+
+
+def store_days(first_day, last_day):
+    """Store a daily summary for every day in a range, except MISSING_DAY."""
+    day = first_day
+    while day <= last_day:
+        if day != MISSING_DAY:
+            save_daily_summary(day, CHAT_ID, f"On {day:%Y-%m-%d} the group planned the trip.", 10)
+        day += timedelta(days=1)
+
+
+def test_month_reuses_past_weeks():
+    """Test that a month is combined by calendar week and a day later only the partial weeks are regenerated."""
+    init_db()
+    # Wednesday 2026-03-18: the month starts on Tuesday 2026-02-17
+    store_days(datetime(2026, 2, 17), datetime(2026, 3, 17))
+    add_messages_bulk([{
+        "telegram_user_id": 601, "display_name": "user601", "thread_telegram_id": 0, "thread_title": "Main",
+        "text": "a message of a day without a stored summary", "timestamp": MISSING_DAY + timedelta(hours=10),
+        "chat_id": CHAT_ID, "telegram_message_id": 1
+    }])
+
+    server = start_fake_ollama()
+    saved = ai_generator.OLLAMA_URL
+    ai_generator.OLLAMA_URL = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+
+    async def run():
+        try:
+            first = await summarize_period_async(30, TEHRAN_TZ.localize(datetime(2026, 3, 18, 12)), CHAT_ID)
+            first_requests = server.behavior.stats["requests"]
+
+            store_days(datetime(2026, 3, 18), datetime(2026, 3, 18))
+            second = await summarize_period_async(30, TEHRAN_TZ.localize(datetime(2026, 3, 19, 12)), CHAT_ID)
+            return first, second, first_requests, server.behavior.stats["requests"] - first_requests
+        finally:
+            await ai_generator.close_async_client()
+
+    try:
+        first, second, first_requests, second_requests = asyncio.run(run())
+    finally:
+        ai_generator.OLLAMA_URL = saved
+        server.shutdown()
+
+    assert first and second
+    # Five weeks (Feb 17-22, Feb 23-Mar 1, Mar 2-8, Mar 9-15, Mar 16-17) and the final combination
+    assert first_requests == 6, f"first month took {first_requests} requests"
+    # Only the partial weeks at either end (Feb 18-22, Mar 16-18) and the final combination
+    assert second_requests == 3, f"month a day later took {second_requests} requests"
+    # The day without a stored summary is not summarized from its messages
+    assert MISSING_DAY not in get_daily_summaries(MISSING_DAY, MISSING_DAY + timedelta(days=1), CHAT_ID)
+
+
+if __name__ == "__main__":
+    try:
+        test_month_reuses_past_weeks()
+        logger.info("✅ Monthly summaries reuse the combined summaries of past weeks")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
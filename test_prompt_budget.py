@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Test script to verify that the prompt combining a full day of chunk summaries fits the token budget.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+# Use a throwaway SQLite database unless another database is configured
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "prompt_budget_test.db"))
+os.environ.setdefault("GROUP_CHAT_ID", "0")
+
+from telegram_summary_bot.services.summarizer import build_reduce_prompt
+from telegram_summary_bot.services.prompt_builder import PROMPT_TOKEN_BUDGET, estimate_tokens
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+CHAT_ID = -1002000000002
+TOPICS = 5
+
+
+def chunk_summaries(day):
+    """Build a summary for every hourly bucket of every topic of a day, ordered by topic and window."""
+    chunks = []
+    for thread_id in range(TOPICS):
+        for hour in range(24):
+            window_start = day + timedelta(hours=hour)
+            summary = " ".join(
+                f"user{member} talked about item {hour}-{thread_id}-{member} and agreed to follow up later."
+                for member in range(8)
+            )
+            chunks.append({
+                "thread_id": thread_id,
+                "window_start": window_start,
+                "window_end": window_start + timedelta(hours=1),
+                "summary": summary
+            })
+    return chunks
+
+
+def tail_messages(start):
+    """Build the messages of the open bucket."""
+    return {
+        thread_id: [
+            {
+                "id": thread_id * 100 + i,
+                "time": start + timedelta(minutes=i),
+                "user_id": i % 8,
+                "display_name": f"user{i % 8}",
+                "text": f"message {i} in topic {thread_id} about the plans for next week and who brings what"
+            }
+            for i in range(40)
+        ]
+        for thread_id in range(TOPICS)
+    }
+
+
+def test_full_day_fits_budget():
+    """Test that a day of chunk summaries and a busy open bucket fit the budget, keeping the newest summaries."""
+    day = datetime(2026, 3, 2)
+    chunks = chunk_summaries(day)
+    assert sum(estimate_tokens(chunk["summary"]) for chunk in chunks) > 2 * PROMPT_TOKEN_BUDGET
+
+    prompt = build_reduce_prompt(chunks, tail_messages(day + timedelta(hours=24)), CHAT_ID)
+    tokens = estimate_tokens(prompt)
+    logger.info(f"Reduce prompt takes ~{tokens} tokens of {PROMPT_TOKEN_BUDGET}")
+
+    assert tokens <= PROMPT_TOKEN_BUDGET, f"prompt takes ~{tokens} tokens, over the budget of {PROMPT_TOKEN_BUDGET}"
+    assert "23:00-00:00" in prompt, "the newest chunk summaries were left out"
+    assert "earlier partial summaries left out" in prompt
+    assert "Unsummarized messages:" in prompt
+
+
+if __name__ == "__main__":
+    try:
+        test_full_day_fits_budget()
+        logger.info("✅ A full day of chunk summaries fits the prompt budget")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Test script to verify that per-chat message range queries use an index.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+# Use a throwaway SQLite database unless another database is configured
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "query_plan_test.db"))
+os.environ.setdefault("GROUP_CHAT_ID", "0")
+
+from telegram_summary_bot.utils.database import DB_TYPE
+from telegram_summary_bot.utils.storage import add_message, get_messages_in_range
+from telegram_summary_bot.utils.migrations import explain_range_query
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+CHAT_ID = -1001234567890
+
+
+def test_range_query_uses_index():
+    """Test that the message range query is served by the chat/timestamp index."""
+    now = datetime.now()
+    
+    # Spread messages over several chats and days
+    for i in range(500):
+        add_message(
+            thread_id=i % 5,
+            user_id=1000 + i % 20,
+            display_name=f"user{i % 20}",
+            text=f"message {i}",
+            timestamp=now - timedelta(minutes=30 * i),
+            thread_title=f"Topic {i % 5}",
+            chat_id=CHAT_ID - i % 3
+        )
+    get_messages_in_range(now - timedelta(days=1), now)
+    
+    plan = explain_range_query(now - timedelta(days=1), now, CHAT_ID)
+    logger.info(f"Query plan ({DB_TYPE}):\n{plan}")
+    
+    assert "ix_messages_chat" in plan, "range query does not use a chat_id index"
+    if DB_TYPE != "postgres":
+        assert "SCAN messages" not in plan, "range query scans the whole messages table"
+
+
+if __name__ == "__main__":
+    try:
+        test_range_query_uses_index()
+        logger.info("✅ Range query uses the chat/timestamp index")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Test script to verify that retention archives, rolls up and deletes old messages exactly once.
+"""
+
+import os
+import sys
+import gzip
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+# Use a throwaway SQLite database unless another database is configured
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "retention_test.db"))
+os.environ.setdefault("GROUP_CHAT_ID", "0")
+
+from telegram_summary_bot.config import TEHRAN_TZ
+from telegram_summary_bot.utils import retention
+from telegram_summary_bot.utils.database import init_db, add_messages_bulk, get_activity_stats
+
+logger = logging.getLogger("telegram_summary_bot.config")
+
+CHAT_ID = -1002000000008
+FIRST_DAY = datetime(2025, 1, 1)
+# Keeps 2025-01-03 onwards
+NOW = TEHRAN_TZ.localize(datetime(2025, 1, 5, 12, 0))
+
+
+def message(message_id, timestamp):
+    """Build a message record of one of two users."""
+    user_id = 901 + message_id % 2
+    return {
+        "telegram_user_id": user_id, "display_name": f"user{user_id}", "thread_telegram_id": 0,
+        "thread_title": "Main", "text": f"message {message_id}", "timestamp": timestamp,
+        "chat_id": CHAT_ID, "telegram_message_id": message_id
+    }
+
+
+def archived_lines(day):
+    """Count the archived messages of a day, with the number of archive parts."""
+    directory = os.path.join(retention.ARCHIVE_DIR, str(CHAT_ID))
+    parts = [name for name in os.listdir(directory) if name.startswith(f"{day:%Y-%m-%d}-")]
+    lines = 0
+    for name in parts:
+        with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+            lines += sum(1 for _line in f)
+    return lines, len(parts)
+
+
+def test_retention_archives_once():
+    """Test archive counts, rollup counts and repeated and late runs."""
+    init_db()
+    saved = retention.RETENTION_DAYS, retention.ARCHIVE_DIR, retention.RETENTION_BATCH_SIZE
+    retention.RETENTION_DAYS = 2
+    retention.ARCHIVE_DIR = tempfile.mkdtemp()
+    # Small batches, so days are deleted over several transactions
+    retention.RETENTION_BATCH_SIZE = 2
+    try:
+        # Five messages on each of three days
+        add_messages_bulk([
+            message(day * 5 + i, FIRST_DAY + timedelta(days=day, hours=9 + i))
+            for day in range(3) for i in range(5)
+        ])
+        before = get_activity_stats(FIRST_DAY, FIRST_DAY + timedelta(days=3), CHAT_ID)
+
+        assert asyncio.run(retention.apply_retention(NOW)) == 10
+        assert archived_lines(FIRST_DAY) == (5, 1)
+        assert archived_lines(FIRST_DAY + timedelta(days=1)) == (5, 1)
+        assert archived_lines(FIRST_DAY + timedelta(days=2)) == (0, 0)
+        # The rollups keep the counts of the deleted messages
+        assert get_activity_stats(FIRST_DAY, FIRST_DAY + timedelta(days=3), CHAT_ID) == before
+
+        # Nothing is archived twice
+        assert asyncio.run(retention.apply_retention(NOW)) == 0
+        assert archived_lines(FIRST_DAY) == (5, 1)
+
+        # A message of an archived day stored later gets its own archive part
+        add_messages_bulk([message(100, FIRST_DAY + timedelta(hours=22))])
+        assert asyncio.run(retention.apply_retention(NOW)) == 1
+        assert archived_lines(FIRST_DAY) == (6, 2)
+        stats = get_activity_stats(FIRST_DAY, FIRST_DAY + timedelta(days=3), CHAT_ID)
+        assert stats["messages"] == 16
+        assert stats["users"] == {901: 9, 902: 7}, stats["users"]
+    finally:
+        retention.RETENTION_DAYS, retention.ARCHIVE_DIR, retention.RETENTION_BATCH_SIZE = saved
+
+
+if __name__ == "__main__":
+    try:
+        test_retention_archives_once()
+        logger.info("✅ Retention archives every message once and keeps its counts")
+        sys.exit(0)
+    except AssertionError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)